@@ -0,0 +1,163 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+import pygame
+
+from sprites import round_corners
+
+BAKE_VERSION = 1  # bump when process() changes, so old bakes are not reused
+MAGIC = b"FNFB"
+HEADER = struct.Struct("<4s4sHH")  # magic, pixel format, width, height
+HASH_CHUNK = 1 << 20
+
+
+def process(path, size=None, radius=0, alpha=True, colorkey=None, scale=None):
+    # The uncached pipeline: decode, smoothscale, round the corners. Nothing here
+    # needs the display, so it can run on a loader thread; finish() converts.
+    img = pygame.image.load(path)
+    if colorkey is not None:
+        img.set_colorkey(colorkey)
+    if alpha:
+        img = img.convert(32, pygame.SRCALPHA)
+    if scale:
+        size = (round(img.get_width() * scale), round(img.get_height() * scale))
+    if size:
+        img = pygame.transform.smoothscale(img, size)
+    if radius:
+        img = round_corners(img, radius)
+    return img
+
+
+def finish(surf, alpha=True):
+    # Main thread only: copy into the display format for fast blits
+    return surf.convert_alpha() if alpha else surf.convert()
+
+
+# --- Baked asset cache ---
+# Decoding and smoothscaling the images is most of startup. Results are stored
+# under cache_dir as raw pixels named by the source file's hash and the
+# processing parameters, and mapped back with frombuffer on the next start.
+# A source is only processed again when its contents change.
+class AssetBaker:
+    def __init__(self, cache_dir, enabled=True):
+        self.cache_dir = cache_dir
+        self.enabled = enabled
+        self.manifest_path = os.path.join(cache_dir, "sources.json")
+        self.sources = {}  # abs path -> [mtime_ns, size, sha1], so unchanged files are not re-hashed
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.ms = 0.0
+        self.lock = threading.Lock()  # decode() may run on several loader threads
+        if enabled:
+            os.makedirs(cache_dir, exist_ok=True)
+            try:
+                with open(self.manifest_path) as f:
+                    self.sources = json.load(f)
+            except (OSError, ValueError):
+                pass
+
+    def decode(self, path, size=None, radius=0, alpha=True, colorkey=None, scale=None):
+        # A processed surface, not yet in display format (finish() converts it on the main
+        # thread); safe to call from loader threads
+        start = time.perf_counter()
+        if not self.enabled:
+            surf = process(path, size, radius, alpha, colorkey, scale)
+            hit = False
+        else:
+            params = repr((BAKE_VERSION, size, radius, alpha, colorkey, scale)).encode()
+            name = f"{self.source_hash(path)[:16]}-{hashlib.sha1(params).hexdigest()[:16]}.raw"
+            bake = os.path.join(self.cache_dir, name)
+            surf = self.load(bake)
+            hit = surf is not None
+            if not hit:
+                surf = process(path, size, radius, alpha, colorkey, scale)
+                self.store(bake, surf, alpha)
+        with self.lock:
+            if self.enabled:
+                self.hits += hit
+                self.misses += not hit
+            self.ms += (time.perf_counter() - start) * 1000
+        return surf
+
+    # --- Source hashes ---
+    def source_hash(self, path):
+        key = os.path.abspath(path)
+        st = os.stat(path)
+        entry = self.sources.get(key)
+        if entry and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+            return entry[2]
+        h = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        with self.lock:
+            if entry and entry[2] != digest:
+                self.remove_bakes(entry[2])
+            self.sources[key] = [st.st_mtime_ns, st.st_size, digest]
+            self.dirty = True
+        return digest
+
+    def remove_bakes(self, digest):
+        # Bakes of a source's old contents will never be hit again
+        prefix = digest[:16] + "-"
+        for name in os.listdir(self.cache_dir):
+            if name.startswith(prefix):
+                os.remove(os.path.join(self.cache_dir, name))
+
+    def flush(self):
+        # Write the hash manifest if anything was (re)hashed
+        if not self.enabled or not self.dirty:
+            return
+        with self.lock:
+            tmp = self.manifest_path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(self.sources, f)
+            os.replace(tmp, self.manifest_path)
+            self.dirty = False
+
+    # --- Raw pixel files ---
+    def load(self, bake):
+        try:
+            with open(bake, "rb") as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, fmt, w, h = HEADER.unpack_from(data)
+        except (OSError, ValueError, struct.error):
+            return None
+        fmt = fmt.rstrip(b"\0").decode()
+        if magic != MAGIC or len(data) != HEADER.size + w * h * len(fmt):
+            return None
+        # Wraps the mapped pixels without copying; finish() makes the display-format copy
+        return pygame.image.frombuffer(memoryview(data)[HEADER.size:], (w, h), fmt)
+
+    def store(self, bake, surf, alpha):
+        fmt = "RGBA" if alpha else "RGB"
+        tmp = f"{bake}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(HEADER.pack(MAGIC, fmt.encode(), *surf.get_size()))
+            f.write(pygame.image.tobytes(surf, fmt))
+        os.replace(tmp, bake)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "ms": round(self.ms, 1)}
+
+
+# --- Sprite atlas ---
+class SpriteAtlas:
+    # One sheet surface; named regions (in source pixels) are handed out as subsurfaces
+    def __init__(self, sheet, regions, scale=1.0):
+        self.sheet = sheet
+        bounds = sheet.get_rect()
+        self.sprites = {}
+        for name, (x, y, w, h) in regions.items():
+            rect = pygame.Rect(round(x * scale), round(y * scale), round(w * scale), round(h * scale))
+            self.sprites[name] = sheet.subsurface(rect.clip(bounds))
+
+    def __getitem__(self, name):
+        return self.sprites[name]
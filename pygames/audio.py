@@ -0,0 +1,136 @@
+import os
+import time
+
+import numpy as np
+import pygame
+
+HIT_CHANNEL = 0
+MISS_CHANNEL = 1
+MISS_MAX_MS = 1000      # miss.wav is 4 s long, mostly silence; the sting is in the first second
+SILENCE_LEVEL = 500     # int16 amplitude treated as silence when trimming
+FADE_OUT_MS = 40
+MAX_EXTRAPOLATE_MS = 100
+
+
+def trimmed_sound(path, max_ms, threshold=SILENCE_LEVEL, fade_ms=FADE_OUT_MS):
+    # Load a sound, cut trailing silence, cap its length and fade out the end
+    sound = pygame.mixer.Sound(path)
+    samples = pygame.sndarray.array(sound)
+    freq = pygame.mixer.get_init()[0]
+    level = np.abs(samples.astype(np.int32))
+    if level.ndim > 1:
+        level = level.max(axis=1)
+    loud = np.flatnonzero(level > threshold)
+    end = int(loud[-1]) + 1 if len(loud) else len(samples)
+    end = min(end, int(freq * max_ms / 1000))
+    samples = samples[:end].copy()
+    fade = min(end, int(freq * fade_ms / 1000))
+    if fade:
+        ramp = np.linspace(1, 0, fade)
+        if samples.ndim > 1:
+            ramp = ramp[:, None]
+        samples[-fade:] = (samples[-fade:] * ramp).astype(samples.dtype)
+    return pygame.sndarray.make_sound(samples)
+
+
+# --- Song clock ---
+# pygame.mixer.music.get_pos() only moves once per audio buffer, so between
+# updates we extrapolate with the frame clock; the result never runs backwards.
+class SongClock:
+    def __init__(self, offset_ms=0):
+        self.offset_ms = offset_ms
+        self.reset(0)
+
+    def reset(self, now):
+        self.start = now
+        self.last_pos = None
+        self.anchor = now
+        self.time_ms = 0
+        self.wall_ns = time.perf_counter_ns()
+
+    def update(self, now, music_pos):
+        # music_pos < 0 means no music is playing; fall back to wall time
+        if music_pos < 0:
+            t = now - self.start
+        else:
+            if music_pos != self.last_pos:
+                self.last_pos = music_pos
+                self.anchor = now
+            t = music_pos + min(now - self.anchor, MAX_EXTRAPOLATE_MS)
+        # A positive offset means the audio is heard late, so the notes wait for it
+        t -= self.offset_ms
+        self.time_ms = max(self.time_ms, t)
+        self.wall_ns = time.perf_counter_ns()
+        return self.time_ms
+
+    def at(self, time_ns):
+        # Song time of a perf_counter_ns timestamp (e.g. a stamped key press)
+        return self.time_ms + (time_ns - self.wall_ns) / 1e6
+
+
+# --- Audio engine ---
+class AudioEngine:
+    def __init__(self, base_dir):
+        self.base_dir = base_dir
+        self.enabled = pygame.mixer.get_init() is not None
+        self.current = None
+        self.hit_sound = self.miss_sound = None
+        if not self.enabled:
+            return
+        # Sound effects get their own channels so they never steal from each other
+        pygame.mixer.set_reserved(2)
+        self.hit_channel = pygame.mixer.Channel(HIT_CHANNEL)
+        self.miss_channel = pygame.mixer.Channel(MISS_CHANNEL)
+
+    # --- Loading (load_* only decode or read, so they can run on a loader thread) ---
+    def load_effects(self):
+        if not self.enabled:
+            return None, None
+        return (pygame.mixer.Sound(os.path.join(self.base_dir, "hit.wav")),
+                trimmed_sound(os.path.join(self.base_dir, "miss.wav"), MISS_MAX_MS))
+
+    def set_effects(self, sounds):
+        self.hit_sound, self.miss_sound = sounds
+        return sounds
+
+    def load_music(self, name):
+        # Reading the file once pulls it into the OS cache, so play_music() does not wait on the disk
+        with open(os.path.join(self.base_dir, name), "rb") as f:
+            while f.read(1 << 20):
+                pass
+
+    # --- Music (streamed) ---
+    def play_music(self, name, loops=-1, fade_ms=0):
+        if not self.enabled:
+            return
+        if self.current == name and pygame.mixer.music.get_busy():
+            return
+        # Always streamed from the path: a Python file object would be read from SDL's audio
+        # thread, which crashes now and then
+        pygame.mixer.music.load(os.path.join(self.base_dir, name))
+        pygame.mixer.music.play(loops, fade_ms=fade_ms)
+        self.current = name
+
+    def stop_music(self, fade_ms=0):
+        if not self.enabled:
+            return
+        if fade_ms:
+            pygame.mixer.music.fadeout(fade_ms)
+        else:
+            pygame.mixer.music.stop()
+        self.current = None
+
+    def music_pos(self):
+        # Milliseconds since the current song started, or -1 when nothing is playing
+        if not self.enabled or self.current is None:
+            return -1
+        return pygame.mixer.music.get_pos()
+
+    # --- Effects ---
+    def play_hit(self):
+        if self.hit_sound:
+            self.hit_channel.play(self.hit_sound)
+
+    def play_miss(self):
+        if self.miss_sound:
+            self.miss_channel.play(self.miss_sound)
@@ -0,0 +1,359 @@
+"""Song charts: notes placed on the beats a song actually has.
+
+The song is decoded to mono PCM and analysed a block at a time. A short-time
+FFT gives the spectral flux (how much louder each frequency got since the
+previous frame), which peaks where notes and drum hits start. The tempo comes
+from the autocorrelation of that onset envelope; beats are then followed
+through the song, and notes go on the beats and, on harder difficulties, on
+the strongest half and quarter beats between them. The lane follows the pitch
+of what changed: low hits to the left, high ones to the right.
+
+Compiled charts are cached next to the song as <song>.<hash>.<difficulty>.fnfc,
+keyed by a hash of the file's contents, so a changed song gets new charts and
+the old ones are removed. The hash is remembered in <song>.autochart with the
+file's size and modification time, so an unchanged song is not read again on
+every launch:
+
+    python autochart.py game.mp3
+    python autochart.py game.mp3 Hard --json hard.json    # editable source
+    FUNKIN_CHART=song python "funkin_clone (2).py"         # play game.mp3's charts
+"""
+import argparse
+import glob
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pygame
+from numpy.lib.stride_tricks import sliding_window_view
+
+from charts import LANES, LEAD_IN_MS, Chart, compile_chart, load_compiled, save_json
+from simulation import FALL_SPEEDS
+
+ANALYSIS_VERSION = 1   # part of the cache key; bump when the charts would come out different
+ANALYSIS_RATE = 22050
+FFT_SIZE = 1024        # 46 ms frames
+HOP = 256              # 11.6 ms between onset values
+BLOCK_FRAMES = 512     # frames transformed at once, so the spectrum never exceeds a few MB
+DECODE_BLOCK = 1 << 16
+COMPRESSION = 100      # log(1 + C * magnitude) evens out loud and quiet bands
+MIN_BPM, MAX_BPM = 60, 200
+PRIOR_BPM = 120        # tempo estimates are weighted towards this, an octave either way
+SNAP_HOPS = 2          # how far a note may move to sit on its onset peak
+SMOOTHING = np.exp(-0.5 * (np.arange(-6, 7) / 2) ** 2)  # gaussian, 2 hops wide
+
+# steps: most notes per beat (1, 2 or 4). percentiles: how strong the onset on a
+# beat, half beat and quarter beat must be to get a note, as a percentile of that
+# kind over the song. min_gap_ms: closest two notes get. double: share of beat
+# notes that get a second note in the opposite lane
+DENSITY = {
+    "Easy": {"steps": 1, "percentiles": (40,), "min_gap_ms": 400, "double": 0.0},
+    "Normal": {"steps": 2, "percentiles": (25, 75), "min_gap_ms": 250, "double": 0.08},
+    "Hard": {"steps": 4, "percentiles": (15, 55, 85), "min_gap_ms": 110, "double": 0.15},
+}
+
+
+# --- Decoding ---
+def decode(path):
+    # Yields (sample rate, mono float32 block) pairs
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg:
+        yield from _ffmpeg_blocks(ffmpeg, path)
+    else:
+        yield from _pygame_blocks(path)
+
+
+def _ffmpeg_blocks(ffmpeg, path):
+    # A streamed decode: only one block of the song is in memory at a time
+    cmd = [ffmpeg, "-v", "error", "-i", path, "-f", "f32le", "-ac", "1", "-ar", str(ANALYSIS_RATE), "-"]
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE) as proc:
+        while True:
+            data = proc.stdout.read(DECODE_BLOCK * 4)
+            if not data:
+                break
+            yield ANALYSIS_RATE, np.frombuffer(data, np.float32, len(data) // 4)
+    if proc.returncode:
+        raise RuntimeError(f"{path}: ffmpeg exited with {proc.returncode}")
+
+
+def _pygame_blocks(path):
+    # pygame only decodes whole files: in the game that is the mixer's own format,
+    # standalone 22 kHz mono (about 2.6 MB a minute). It is analysed a block at a time
+    own_mixer = pygame.mixer.get_init() is None
+    if own_mixer:
+        pygame.mixer.init(ANALYSIS_RATE, -16, 1)
+    try:
+        freq = pygame.mixer.get_init()[0]
+        samples = pygame.sndarray.samples(pygame.mixer.Sound(path))
+        factor = max(1, freq // ANALYSIS_RATE)  # 44.1/48 kHz are averaged down in pairs
+        scale = 1 / (np.iinfo(samples.dtype).max + 1) if samples.dtype.kind in "iu" else 1.0
+        step = DECODE_BLOCK * factor
+        for start in range(0, len(samples), step):
+            block = samples[start:start + step].astype(np.float32)
+            if block.ndim > 1:
+                block = block.mean(axis=1)
+            if factor > 1:
+                block = block[:len(block) // factor * factor].reshape(-1, factor).mean(axis=1)
+            yield freq // factor, block * scale
+        del samples
+    finally:
+        if own_mixer:
+            pygame.mixer.quit()
+
+
+# --- Onsets ---
+class OnsetDetector:
+    # Streaming spectral flux: feed() takes blocks of any length, frames that
+    # straddle two blocks are carried over in pending
+    def __init__(self, rate):
+        self.rate = rate
+        self.window = np.hanning(FFT_SIZE).astype(np.float32)
+        self.freqs = np.fft.rfftfreq(FFT_SIZE, 1 / rate).astype(np.float32)
+        # Flux rises as an attack enters the window, about a quarter window before it
+        # reaches the middle; frames are timed a quarter past their middle to match
+        self.pending = np.zeros(FFT_SIZE * 3 // 4, np.float32)
+        self.prev = None
+        self.flux = []
+        self.centroid = []
+
+    def feed(self, samples):
+        buf = np.concatenate((self.pending, samples))
+        frames = (len(buf) - FFT_SIZE) // HOP + 1
+        for start in range(0, max(frames, 0), BLOCK_FRAMES):
+            count = min(BLOCK_FRAMES, frames - start)
+            chunk = buf[start * HOP:(start + count - 1) * HOP + FFT_SIZE]
+            windows = sliding_window_view(chunk, FFT_SIZE)[::HOP]
+            spectrum = np.log1p(COMPRESSION * np.abs(np.fft.rfft(windows * self.window, axis=1)))
+            prev = spectrum[:1] if self.prev is None else self.prev[None]
+            rise = np.maximum(np.diff(spectrum, axis=0, prepend=prev), 0)
+            flux = rise.sum(axis=1)
+            self.flux.append(flux)
+            # Frequency centre of what got louder, for the lane
+            self.centroid.append(rise @ self.freqs / np.maximum(flux, 1e-9))
+            self.prev = spectrum[-1]
+        self.pending = buf[max(frames, 0) * HOP:]
+
+    def finish(self):
+        self.feed(np.zeros(FFT_SIZE // 2, np.float32))
+        flux = np.concatenate(self.flux) if self.flux else np.zeros(0, np.float32)
+        centroid = np.concatenate(self.centroid) if self.centroid else np.zeros(0, np.float32)
+        # Only rises above the local average count, so sustained loud parts do not fill every beat
+        width = max(1, int(0.4 * self.rate / HOP))
+        local = np.convolve(flux, np.ones(width) / width, mode="same")
+        onset = np.maximum(flux - local, 0)
+        if onset.max(initial=0) > 0:
+            onset /= onset.max()
+        return onset.astype(np.float32), centroid.astype(np.float32)
+
+
+class SongAnalysis:
+    def __init__(self, onset, centroid, rate):
+        self.onset = onset
+        self.centroid = centroid
+        self.hop_ms = HOP / rate * 1000
+        self.period = estimate_period(onset, self.hop_ms)  # beat length in hops
+        self.beats = track_beats(onset, self.period)
+
+    @property
+    def bpm(self):
+        return 60000 / (self.period * self.hop_ms)
+
+
+def analyse(path):
+    detector = None
+    for rate, block in decode(path):
+        if detector is None:
+            detector = OnsetDetector(rate)
+        detector.feed(block)
+    if detector is None:
+        raise ValueError(f"{path}: no audio")
+    return SongAnalysis(*detector.finish(), detector.rate)
+
+
+# --- Tempo and beats ---
+def estimate_period(onset, hop_ms):
+    lo = int(60000 / MAX_BPM / hop_ms)
+    hi = int(60000 / MIN_BPM / hop_ms) + 1
+    if len(onset) < 4 * hi:
+        raise ValueError("song too short to find a tempo")
+    # Smoothed first, so a period that falls between two lags still shows as one peak
+    x = np.convolve(onset, SMOOTHING, mode="same")
+    x -= x.mean()
+    spectrum = np.fft.rfft(x, 2 * len(x))
+    autocorr = np.fft.irfft(spectrum * spectrum.conj())[:2 * hi + 2]
+    lags = np.arange(lo, hi)
+    # A lag also scores what repeats at twice its length: with only ac(lag), songs
+    # whose beats alternate (kick, snare) come out at half their tempo
+    score = autocorr[lags] + 0.5 * autocorr[2 * lags]
+    bpm = 60000 / (lags * hop_ms)
+    weight = np.exp(-0.5 * np.log2(bpm / PRIOR_BPM) ** 2)
+    best = lo + int(np.argmax(score * weight))
+    # A parabola through the peak gives the period to a fraction of a hop
+    a, b, c = autocorr[best - 1:best + 2]
+    curve = a - 2 * b + c
+    return best + (0.5 * (a - c) / curve if curve < 0 else 0.0)
+
+
+def track_beats(onset, period):
+    # Phase: the offset whose beat grid collects the most onset strength
+    grid = np.arange(0, len(onset) - period, period)
+    phases = np.arange(int(np.ceil(period)))
+    idx = np.minimum(np.rint(phases[:, None] + grid[None, :]).astype(int), len(onset) - 1)
+    pos = float(phases[np.argmax(onset[idx].sum(axis=1))])
+    # Then follow the beat through the song, letting each one settle on a
+    # strong peak within an eighth of a beat so small tempo drift is absorbed
+    strong = np.percentile(onset, 75)
+    reach = max(1, int(period / 8))
+    beats = []
+    while pos < len(onset):
+        i = int(round(pos))
+        lo, hi = max(0, i - reach), min(len(onset), i + reach + 1)
+        peak = lo + int(np.argmax(onset[lo:hi]))
+        beat = peak if onset[peak] >= strong else i
+        beats.append(beat)
+        pos = beat + period
+    return np.array(beats)
+
+
+# --- Charting ---
+def candidates(beats, steps):
+    # (position in hops, level) of every beat (level 0), half beat (1) and quarter beat (2)
+    beats = beats.astype(float)
+    gaps = np.diff(beats)
+    pos, level = [beats], [np.zeros(len(beats), int)]
+    for k in range(1, steps):
+        pos.append(beats[:-1] + gaps * k / steps)
+        level.append(np.full(len(gaps), 1 if 2 * k % steps == 0 else 2))
+    return np.concatenate(pos), np.concatenate(level)
+
+
+def make_chart(analysis, difficulty, title=""):
+    rules = DENSITY[difficulty]
+    onset = analysis.onset
+    pos, level = candidates(analysis.beats, rules["steps"])
+    # Each candidate moves onto the strongest onset within SNAP_HOPS of it
+    padded = np.pad(onset, SNAP_HOPS)
+    windows = sliding_window_view(padded, 2 * SNAP_HOPS + 1)[np.minimum(np.rint(pos).astype(int), len(onset) - 1)]
+    hops = np.rint(pos).astype(int) - SNAP_HOPS + windows.argmax(axis=1)
+    hops = np.clip(hops, 0, len(onset) - 1)
+    strength = windows.max(axis=1)
+
+    keep = np.zeros(len(pos), bool)
+    for lvl, percentile in enumerate(rules["percentiles"]):
+        mine = level == lvl
+        if mine.any():
+            keep |= mine & (strength > 0) & (strength >= np.percentile(strength[mine], percentile))
+    times = hops * analysis.hop_ms
+    keep &= times >= LEAD_IN_MS
+
+    # Closer than min_gap_ms: beats win over half beats over quarters, then the stronger onset
+    chosen = []
+    taken = np.array([], dtype=float)
+    for i in np.lexsort((-strength, level)):
+        if not keep[i]:
+            continue
+        j = np.searchsorted(taken, times[i])
+        if (j and times[i] - taken[j - 1] < rules["min_gap_ms"]) or \
+                (j < len(taken) and taken[j] - times[i] < rules["min_gap_ms"]):
+            continue
+        taken = np.insert(taken, j, times[i])
+        chosen.append(i)
+    chosen = np.sort(np.array(chosen, dtype=int))
+    if not len(chosen):
+        return Chart.from_notes([], fall_speed=FALL_SPEEDS[difficulty], title=title, difficulty=difficulty)
+
+    # Lanes by the pitch of the onset, split at quartiles so every lane gets used
+    centroid = analysis.centroid[hops[chosen]]
+    lanes = np.digitize(centroid, np.quantile(centroid, np.linspace(0, 1, LANES + 1)[1:-1]))
+    ms = times[chosen].astype(int)
+    notes = list(zip(ms.tolist(), lanes.tolist()))
+    beat_notes = np.flatnonzero(level[chosen] == 0)
+    doubles = beat_notes[np.argsort(-strength[chosen][beat_notes], kind="stable")][:int(len(beat_notes) * rules["double"])]
+    notes += [(int(ms[i]), int((lanes[i] + LANES // 2) % LANES)) for i in doubles]
+    return Chart.from_notes(notes, fall_speed=FALL_SPEEDS[difficulty], title=title, difficulty=difficulty)
+
+
+# --- Cache ---
+def song_hash(path):
+    st = os.stat(path)
+    stamp = f"{ANALYSIS_VERSION} {st.st_size} {st.st_mtime_ns}"
+    memo = path + ".autochart"
+    try:
+        with open(memo) as f:
+            saved, _, digest = f.read().strip().rpartition(" ")
+        if saved == stamp:
+            return digest
+    except OSError:
+        pass
+    digest = hashlib.sha1(f"autochart {ANALYSIS_VERSION}".encode())
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    digest = digest.hexdigest()[:16]
+    try:
+        with open(memo, "w") as f:
+            f.write(f"{stamp} {digest}\n")
+    except OSError:
+        pass  # a read-only song folder only costs hashing it again next time
+    return digest
+
+
+def cached_path(path, digest, difficulty):
+    return f"{os.path.splitext(path)[0]}.{digest}.{difficulty}.fnfc"
+
+
+def chart_song(path, difficulties=tuple(DENSITY), force=False):
+    # {difficulty: compiled chart path}; the song is only analysed when a chart is missing
+    digest = song_hash(path)
+    paths = {difficulty: cached_path(path, digest, difficulty) for difficulty in difficulties}
+    missing = [d for d, p in paths.items() if force or not os.path.exists(p)]
+    if missing:
+        analysis = analyse(path)
+        title = os.path.splitext(os.path.basename(path))[0]
+        for difficulty in missing:
+            compile_chart(make_chart(analysis, difficulty, title), paths[difficulty])
+            # Charts of the song's earlier contents are never used again
+            for old in glob.glob(cached_path(glob.escape(path), "[0-9a-f]" * 16, difficulty)):
+                if old != paths[difficulty]:
+                    os.remove(old)
+    return paths
+
+
+# --- Command line ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Chart a song from its onsets and tempo")
+    parser.add_argument("song")
+    parser.add_argument("difficulties", nargs="*", help=f"any of {', '.join(DENSITY)} (default: all)")
+    parser.add_argument("--force", action="store_true", help="analyse again even if cached")
+    parser.add_argument("--json", help="also write the chart as editable JSON (one difficulty)")
+    args = parser.parse_args(argv)
+    difficulties = args.difficulties or list(DENSITY)
+    for difficulty in difficulties:
+        if difficulty not in DENSITY:
+            parser.error(f"unknown difficulty {difficulty!r}")
+    if args.json and len(difficulties) != 1:
+        parser.error("--json needs exactly one difficulty")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")  # decoding only, nothing is played
+
+    start = time.perf_counter()
+    if args.json:
+        analysis = analyse(args.song)
+        chart = make_chart(analysis, difficulties[0], os.path.splitext(os.path.basename(args.song))[0])
+        save_json(chart, args.json)
+        print(f"{analysis.bpm:.1f} BPM, {len(analysis.beats)} beats")
+        print(f"{args.json}: {len(chart)} notes")
+    else:
+        for difficulty, path in chart_song(args.song, difficulties, args.force).items():
+            chart = load_compiled(path)
+            rate = len(chart) / max(chart.duration_ms / 1000, 1)
+            print(f"{difficulty:7} {len(chart):5} notes, {rate:4.1f}/s  {path}")
+    print(f"{time.perf_counter() - start:.2f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
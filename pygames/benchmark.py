@@ -0,0 +1,340 @@
+"""Headless benchmark for every scene of the game.
+
+Runs the real game script under the SDL dummy drivers with an uncapped clock,
+drives it with synthetic input and writes per-scene frame time percentiles,
+allocations per frame and startup time as JSON:
+
+    python benchmark.py --out bench.json
+    python benchmark.py --baseline old.json    # also flag p95 regressions
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import runpy
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+GAME_SCRIPT = os.path.join(BASE_DIR, "funkin_clone (2).py")
+SEED = 1234
+MAX_WAIT_MS = 30000  # give up on a scene that never reaches its state
+STRESS_NOTES_PER_SECOND = 2000
+GAMEPLAY_SPAN_MS = 5000  # song time each gameplay scene covers, so several notes reach the hit line
+
+
+# --- Frame driver ---
+class BenchDriver:
+    fps = 0  # uncapped
+
+    def __init__(self, scene, frames, alloc_frames):
+        self.scene = scene
+        self.frames = frames
+        self.alloc_frames = alloc_frames
+        self.launched = time.perf_counter()
+        self.startup_ms = None
+        self.ns = None
+        self.phase = None  # None, "time" or "alloc"
+        self.frame_ns = []
+        self.notes = []  # notes alive per timed frame
+        self.surfaces = []
+        self.alloc_bytes = []
+        self.last = None
+
+    # --- Hooks called by the game loop ---
+    def start(self, ns):
+        self.startup_ms = (time.perf_counter() - self.launched) * 1000
+        self.ns = ns
+        self.script = SCENES[self.scene](self)
+
+    def before_frame(self):
+        try:
+            self.phase = next(self.script)
+        except StopIteration:
+            self.phase = None
+            pygame.event.post(pygame.event.Event(pygame.QUIT))
+        if self.phase == "alloc":
+            tracemalloc.reset_peak()
+            self.alloc_base = tracemalloc.get_traced_memory()[0]
+        self.surfaces_base = self.surface_count()
+
+    def after_frame(self):
+        t = time.perf_counter_ns()
+        if self.phase == "time" and self.last is not None:
+            self.frame_ns.append(t - self.last)
+            self.notes.append(self.ns["sim"].arrow_count())
+            self.surfaces.append(self.surface_count() - self.surfaces_base)
+        elif self.phase == "alloc":
+            self.alloc_bytes.append(tracemalloc.get_traced_memory()[1] - self.alloc_base)
+        self.last = t
+
+    # --- Helpers for scene scripts ---
+    def surface_count(self):
+        return self.ns["surfaces_built"]()
+
+    def click(self, rect):
+        pos = self.ns["view"].to_window(rect.center)  # buttons are laid out in logical units
+        pygame.event.post(pygame.event.Event(pygame.MOUSEMOTION, pos=pos, rel=(0, 0), buttons=(0, 0, 0)))
+        pygame.event.post(pygame.event.Event(pygame.MOUSEBUTTONDOWN, pos=pos, button=1))
+        yield None
+        pygame.event.post(pygame.event.Event(pygame.MOUSEBUTTONUP, pos=pos, button=1))
+        yield None
+
+    def wait_ms(self, ms):
+        end = pygame.time.get_ticks() + ms
+        while pygame.time.get_ticks() < end:
+            yield None
+
+    def wait_until(self, predicate):
+        end = pygame.time.get_ticks() + MAX_WAIT_MS
+        while pygame.time.get_ticks() < end:
+            if predicate():
+                return
+            yield None
+        raise RuntimeError(f"{self.scene}: scene never reached its state")
+
+    def autoplay(self):
+        # Presses a lane whenever an arrow sits in its hit window
+        sim = self.ns["sim"]
+        keys = self.ns["keys"]
+        for lane_index, queue in enumerate(sim.lane_arrows):
+            for arrow in queue:
+                if sim.hit_top < arrow.y < sim.hit_bottom:
+                    pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=keys[lane_index], mod=0, unicode="", scancode=0))
+                    break
+
+    def measure(self, each_frame=None, until=None, min_ms=0):
+        # Timed frames (at least min_ms of them), then a shorter pass under tracemalloc for allocations
+        for phase, count in (("time", self.frames), ("alloc", self.alloc_frames)):
+            if phase == "alloc":
+                tracemalloc.start()
+            self.last = None
+            end = pygame.time.get_ticks() + (min_ms if phase == "time" else 0)
+            frame = 0
+            while frame < count + (phase == "time") or pygame.time.get_ticks() < end:
+                frame += 1
+                if until and until():
+                    break
+                if each_frame:
+                    each_frame()
+                yield phase
+            if phase == "alloc":
+                tracemalloc.stop()
+
+    # --- Results ---
+    def results(self):
+        times = sorted(ns / 1e6 for ns in self.frame_ns)
+        notes = sum(self.notes) / len(self.notes) if self.notes else 0
+        return {
+            "frames": len(times),
+            "mean_ms": sum(times) / len(times) if times else None,
+            "p50_ms": percentile(times, 50),
+            "p95_ms": percentile(times, 95),
+            "p99_ms": percentile(times, 99),
+            "max_ms": times[-1] if times else None,
+            "notes_per_frame": notes,
+            # Sustained note throughput: sprites drawn per second of frame time
+            "notes_per_second": notes * len(times) / (sum(times) / 1000) if times else None,
+            "surfaces_per_frame": sum(self.surfaces) / len(self.surfaces) if self.surfaces else None,
+            "alloc_bytes_per_frame": sum(self.alloc_bytes) / len(self.alloc_bytes) if self.alloc_bytes else None,
+            "startup_ms": self.startup_ms,
+            "renderer": dict(self.ns["renderer"].stats) if self.ns else None,
+        }
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+# --- Scene scripts ---
+# Each is a generator that yields once per frame; yielding "time"/"alloc" marks measured frames.
+
+def scene_menu(bench):
+    yield from bench.wait_ms(200)
+    yield from bench.measure()
+
+
+def scene_credits(bench):
+    yield from bench.click(bench.ns["credits_button"])
+    yield from bench.wait_ms(600)  # let the fade-in finish
+    yield from bench.measure()
+
+
+def scene_difficulty(bench):
+    yield from bench.click(bench.ns["start_button"])
+    yield from bench.wait_ms(600)
+    yield from bench.measure()
+
+
+def start_game(bench, difficulty):
+    ns = bench.ns
+    yield from bench.click(ns["start_button"])
+    yield from bench.wait_ms(250)  # clicks are ignored for the first 200ms
+    yield from bench.click(ns["difficulty_buttons"][difficulty])
+
+
+def scene_countdown(bench):
+    yield from start_game(bench, "Easy")
+    yield from bench.measure(until=lambda: bench.ns["scenes"].name != "countdown")
+
+
+def scene_gameplay(difficulty):
+    def script(bench):
+        ns = bench.ns
+        yield from start_game(bench, difficulty)
+        yield from bench.wait_until(lambda: ns["scenes"].name != "countdown")
+        # The first note only spawns after the lead-in; an empty playfield measures nothing
+        yield from bench.wait_until(lambda: ns["sim"].arrow_count() > 0)
+        presses = len(ns["sim"].inputs)
+        yield from bench.measure(each_frame=bench.autoplay, min_ms=GAMEPLAY_SPAN_MS)
+        if not any(bench.notes) or len(ns["sim"].inputs) == presses or not ns["sim"].stats.hits:
+            raise RuntimeError(f"{bench.scene}: no notes were drawn and hit while measuring")
+    return script
+
+
+def scene_stress(bench):
+    # Runs with FUNKIN_STRESS (see SCENE_ENV): a no-fail chart with thousands of notes on screen
+    ns = bench.ns
+    yield from start_game(bench, "Easy")
+    yield from bench.wait_until(lambda: ns["scenes"].name != "countdown")
+    yield from bench.wait_ms(2000)  # until the notes fill the screen
+    yield from bench.measure()
+
+
+def scene_game_over(bench):
+    ns = bench.ns
+    yield from start_game(bench, "Hard")
+    yield from bench.wait_until(lambda: ns["sim"].game_over)
+    yield from bench.measure()
+
+
+SCENES = {
+    "menu": scene_menu,
+    "credits": scene_credits,
+    "difficulty": scene_difficulty,
+    "countdown": scene_countdown,
+    "gameplay_easy": scene_gameplay("Easy"),
+    "gameplay_normal": scene_gameplay("Normal"),
+    "gameplay_hard": scene_gameplay("Hard"),
+    "game_over": scene_game_over,
+    "stress": scene_stress,
+}
+# Scenes whose numbers only mean something with notes on screen
+NOTE_SCENES = {"gameplay_easy", "gameplay_normal", "gameplay_hard", "stress"}
+# Environment for scenes that need the game started differently
+SCENE_ENV = {"stress": {"FUNKIN_STRESS": str(STRESS_NOTES_PER_SECOND)}}
+
+
+# --- Runner ---
+def run_scene(scene, frames, alloc_frames):
+    random.seed(SEED)
+    driver = BenchDriver(scene, frames, alloc_frames)
+    # Replays and scores go to a temp dir, so benchmark runs stay out of the repo and the player's scores
+    cwd = os.getcwd()
+    env = dict(SCENE_ENV.get(scene, {}))
+    with tempfile.TemporaryDirectory() as tmp:
+        env["FUNKIN_SCORES"] = os.path.join(tmp, "scores.db")
+        env["FUNKIN_REPLAYS"] = os.path.join(tmp, "replays")
+        saved = {name: os.environ.get(name) for name in env}
+        os.environ.update(env)
+        os.chdir(tmp)
+        try:
+            runpy.run_path(GAME_SCRIPT, init_globals={"FRAME_DRIVER": driver}, run_name="__main__")
+        finally:
+            os.chdir(cwd)
+            for name, value in saved.items():
+                if value is None:
+                    del os.environ[name]
+                else:
+                    os.environ[name] = value
+    return driver.results()
+
+
+def git_revision():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+                             capture_output=True, text=True, timeout=10)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for scene, new in results["scenes"].items():
+        old = baseline.get("scenes", {}).get(scene)
+        if not old or not old.get("p95_ms") or not new.get("p95_ms"):
+            continue
+        if scene in NOTE_SCENES and not old.get("notes_per_frame"):
+            # Older benchmarks timed gameplay before the first note arrived
+            print(f"{scene:16} not compared: the baseline drew no notes")
+            continue
+        change = new["p95_ms"] / old["p95_ms"] - 1
+        print(f"{scene:16} p95 {old['p95_ms']:7.2f} -> {new['p95_ms']:7.2f} ms ({change:+.0%})")
+        if change > threshold:
+            regressions.append(scene)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenes", nargs="*", choices=list(SCENES), default=list(SCENES))
+    parser.add_argument("--frames", type=int, default=600, help="timed frames per scene")
+    parser.add_argument("--alloc-frames", type=int, default=120, help="frames measured under tracemalloc")
+    parser.add_argument("--dirty", action="store_true", help="use the dirty-rect renderer")
+    parser.add_argument("--out", help="write JSON here instead of stdout")
+    parser.add_argument("--baseline", help="previous JSON to compare p95 against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed p95 slowdown")
+    args = parser.parse_args(argv)
+
+    os.environ["FUNKIN_DIRTY"] = "1" if args.dirty else "0"
+    sys.path.insert(0, BASE_DIR)
+
+    results = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "pygame": pygame.version.ver,
+        "renderer": "dirty" if args.dirty else "full",
+        "seed": SEED,
+        "scenes": {},
+    }
+    for scene in args.scenes:
+        results["scenes"][scene] = run_scene(scene, args.frames, args.alloc_frames)
+        r = results["scenes"][scene]
+        line = f"{scene:16} p50 {r['p50_ms']:.2f}  p95 {r['p95_ms']:.2f}  p99 {r['p99_ms']:.2f} ms"
+        if r["notes_per_frame"] or scene in NOTE_SCENES:
+            line += f"  {r['notes_per_frame']:.0f} notes/frame, {r['notes_per_second'] / 1000:.0f}k notes/s"
+        print(line, file=sys.stderr)
+    startups = sorted(r["startup_ms"] for r in results["scenes"].values())
+    results["startup_ms"] = percentile(startups, 50)
+
+    text = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print("p95 regressions:", ", ".join(regressions), file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
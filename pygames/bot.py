@@ -0,0 +1,71 @@
+import numpy as np
+
+from charts import LANES
+
+
+# --- Simulated player ---
+# Plays a chart roughly the way a person would: it aims at each note's hit
+# time with a normally distributed timing error, cannot press before it has
+# seen the note and reacted, needs a moment between two presses in one lane,
+# and now and then misses a note outright. Notes that cross the screen faster
+# than comfort_ms are timed proportionally worse. All times are in ms.
+class Bot:
+    def __init__(self, timing_sd=30.0, bias_ms=0.0, reaction_ms=250.0, reaction_sd=40.0,
+                 repeat_ms=80.0, lapse=0.01, comfort_ms=800.0, seed=None):
+        self.timing_sd = timing_sd      # spread of presses around the hit time, at comfortable speeds
+        self.bias_ms = bias_ms          # positive = presses late on average
+        self.reaction_ms = reaction_ms  # from a note appearing to the earliest press for it
+        self.reaction_sd = reaction_sd
+        self.repeat_ms = repeat_ms      # shortest gap between two presses in one lane
+        self.lapse = lapse              # chance of not pressing for a note at all
+        self.comfort_ms = comfort_ms    # time on screen below which timing gets worse
+        self.rng = np.random.default_rng(seed)
+
+    def plan(self, chart, lookahead_ms, until_ms):
+        # Press times and lanes for the notes due before until_ms, in time order
+        end = chart.find(until_ms)
+        times = chart.times[:end].astype(np.float64)
+        lanes = chart.lanes[:end].astype(np.int64)
+        n = len(times)
+        rng = self.rng
+        timing_sd = self.timing_sd * max(1.0, self.comfort_ms / lookahead_ms)
+        aimed = times + self.bias_ms + rng.normal(0, timing_sd, n)
+        # A note shows up lookahead_ms before its hit time; nothing happens before a reaction
+        earliest = times - lookahead_ms + np.maximum(rng.normal(self.reaction_ms, self.reaction_sd, n), 0)
+        press = np.maximum(aimed, earliest)
+        keep = rng.random(n) >= self.lapse
+        press, lanes = press[keep], lanes[keep]
+        # One finger per lane: a press too soon after the last one in its lane waits
+        for lane in range(LANES):
+            idx = np.flatnonzero(lanes == lane)
+            idx = idx[np.argsort(press[idx], kind="stable")]
+            last = -np.inf
+            for i in idx.tolist():
+                press[i] = last = max(press[i], last + self.repeat_ms)
+        order = np.argsort(press, kind="stable")
+        return press[order], lanes[order]
+
+    def play(self, sim, until_ms, sample_ms):
+        # Runs sim (already reset with its chart) until game over or until_ms.
+        # Returns the score at every multiple of sample_ms that was reached
+        press, lanes = self.plan(sim.chart, sim.lookahead_ms, until_ms)
+        samples = []
+        next_sample = sample_ms
+
+        def advance(to_ms):
+            nonlocal next_sample
+            while sim.time_ms < to_ms and not sim.game_over:
+                sim.step()
+                if sim.time_ms >= next_sample:
+                    samples.append(sim.score)
+                    next_sample += sample_ms
+
+        for time_ms, lane in zip(press.tolist(), lanes.tolist()):
+            if time_ms > until_ms:
+                break
+            advance(time_ms)
+            if sim.game_over:
+                break
+            sim.press(lane, time_ms)
+        advance(until_ms)
+        return samples
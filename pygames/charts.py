@@ -0,0 +1,258 @@
+"""Note charts: data model, JSON source, compiled binary form and streaming.
+
+A chart is a time-sorted list of notes, each a (hit time in ms, lane) pair.
+Charts are authored as JSON:
+
+    {"version": 1, "title": "...", "difficulty": "Hard", "fall_speed": 900,
+     "notes": [[1500, 0], [1850, 2], ...]}
+
+and compiled to a compact binary file (.fnfc) that is memory-mapped on load,
+so a chart with tens of thousands of notes never becomes Python objects:
+
+    header | bucket index (int32 per INDEX_BUCKET_MS) | notes (int32 time, uint8 lane)
+
+    python charts.py generate Hard --seed 7 --out hard.json
+    python charts.py compile hard.json
+    python charts.py info hard.fnfc
+"""
+import argparse
+import json
+import os
+import random
+import struct
+import sys
+
+import numpy as np
+
+LANES = 4
+FORMAT_VERSION = 1
+MAGIC = b"FNFC"
+HEADER = struct.Struct("<4sHBxfIIi")  # magic, version, lanes, fall_speed, notes, buckets, duration
+NOTE_DTYPE = np.dtype([("time", "<i4"), ("lane", "u1")])  # 5 bytes per note
+INDEX_BUCKET_MS = 1000
+
+# Generated charts
+FRAME_MS = 1000 / 60   # the original spawn gaps were counted in 60 FPS frames
+LEAD_IN_MS = 1500      # first hit time, so the first note can fall in from the top
+BURST_GAP_MS = 100     # spacing of the three notes in a Hard burst
+GENERATED_LENGTH_MS = 20 * 60 * 1000
+STRESS_LENGTH_MS = 5 * 60 * 1000
+
+
+# --- Data model ---
+class Chart:
+    def __init__(self, notes, fall_speed=None, title="", difficulty=None, index=None):
+        # notes: structured array of NOTE_DTYPE sorted by time (may be a memmap)
+        self.notes = notes
+        self.times = notes["time"]
+        self.lanes = notes["lane"]
+        self.fall_speed = fall_speed
+        self.title = title
+        self.difficulty = difficulty
+        self.index = build_index(self.times) if index is None else index
+
+    @classmethod
+    def from_notes(cls, notes, **kwargs):
+        # notes: iterable of (time_ms, lane); sorted and validated here
+        notes = sorted((int(t), int(lane)) for t, lane in notes)
+        for i, (t, lane) in enumerate(notes):
+            if not 0 <= lane < LANES:
+                raise ValueError(f"note {i} at {t} ms: lane {lane} out of range")
+            if t < 0:
+                raise ValueError(f"note {i}: negative time {t}")
+            if i and notes[i - 1] == (t, lane):
+                raise ValueError(f"duplicate note at {t} ms in lane {lane}")
+        return cls(np.array(notes, dtype=NOTE_DTYPE), **kwargs)
+
+    def __len__(self):
+        return len(self.notes)
+
+    @property
+    def duration_ms(self):
+        return int(self.times[-1]) if len(self.notes) else 0
+
+    def find(self, time_ms):
+        # Index of the first note at or after time_ms
+        bucket = max(0, int(time_ms) // INDEX_BUCKET_MS)
+        if bucket >= len(self.index):
+            return len(self.notes)
+        lo = int(self.index[bucket])
+        hi = int(self.index[bucket + 1]) if bucket + 1 < len(self.index) else len(self.notes)
+        return lo + int(np.searchsorted(self.times[lo:hi], time_ms, side="left"))
+
+
+def build_index(times):
+    # Position of the first note of every INDEX_BUCKET_MS bucket
+    if not len(times):
+        return np.zeros(0, dtype="<i4")
+    buckets = int(times[-1]) // INDEX_BUCKET_MS + 1
+    edges = np.arange(buckets, dtype="<i4") * INDEX_BUCKET_MS
+    return np.searchsorted(times, edges, side="left").astype("<i4")
+
+
+# --- Streaming ---
+class ChartStream:
+    # Hands out notes in time order, a look-ahead window at a time
+    def __init__(self, chart, start_ms=0):
+        self.chart = chart
+        self.pos = chart.find(start_ms)
+
+    def take_until(self, time_ms):
+        # Notes with hit time < time_ms that have not been handed out yet
+        times = self.chart.times
+        start = self.pos
+        if start >= len(times) or times[start] >= time_ms:
+            return ()
+        end = start + int(np.searchsorted(times[start:start + 64], time_ms, side="left"))
+        if end == start + 64:
+            end = self.chart.find(time_ms)
+        self.pos = end
+        return zip(times[start:end].tolist(), self.chart.lanes[start:end].tolist())
+
+
+# --- JSON source ---
+def load_json(path):
+    with open(path) as f:
+        data = json.load(f)
+    if data.get("version", 1) > FORMAT_VERSION:
+        raise ValueError(f"{path}: chart version {data['version']} is newer than supported")
+    return Chart.from_notes(data["notes"], fall_speed=data.get("fall_speed"),
+                            title=data.get("title", ""), difficulty=data.get("difficulty"))
+
+
+def save_json(chart, path):
+    data = {
+        "version": FORMAT_VERSION,
+        "title": chart.title,
+        "difficulty": chart.difficulty,
+        "fall_speed": chart.fall_speed,
+        "notes": [[t, lane] for t, lane in zip(chart.times.tolist(), chart.lanes.tolist())],
+    }
+    with open(path, "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+
+
+# --- Compiled binary ---
+def compiled_path(path):
+    return os.path.splitext(path)[0] + ".fnfc"
+
+
+def compile_chart(chart, path):
+    # Title and difficulty stay in the JSON source; the binary only holds what playback needs
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, LANES, chart.fall_speed or 0.0,
+                         len(chart), len(chart.index), chart.duration_ms)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        f.write(np.asarray(chart.index, dtype="<i4").tobytes())
+        f.write(np.asarray(chart.notes, dtype=NOTE_DTYPE).tobytes())
+    os.replace(tmp, path)
+
+
+def load_compiled(path):
+    with open(path, "rb") as f:
+        magic, version, lanes, fall_speed, count, buckets, duration = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError(f"{path}: not a compiled chart")
+    if version > FORMAT_VERSION or lanes != LANES:
+        raise ValueError(f"{path}: unsupported chart (version {version}, {lanes} lanes)")
+    index = np.memmap(path, dtype="<i4", mode="r", offset=HEADER.size, shape=(buckets,)) if buckets else np.zeros(0, "<i4")
+    offset = HEADER.size + 4 * buckets
+    if count:
+        notes = np.memmap(path, dtype=NOTE_DTYPE, mode="r", offset=offset, shape=(count,))
+    else:
+        notes = np.zeros(0, dtype=NOTE_DTYPE)
+    return Chart(notes, fall_speed=fall_speed or None, index=index)
+
+
+def load_chart(path):
+    # .fnfc files are mapped directly; .json sources are (re)compiled when the binary is stale
+    if path.endswith(".fnfc"):
+        return load_compiled(path)
+    binary = compiled_path(path)
+    if not os.path.exists(binary) or os.path.getmtime(binary) < os.path.getmtime(path):
+        compile_chart(load_json(path), binary)
+    return load_compiled(binary)
+
+
+# --- Generators ---
+# The old per-difficulty random spawn rules, now producing seeded charts. Gaps
+# are in 60 FPS frames; "double" is the chance of two notes at once (different
+# lanes), "burst" the chance of three in a row in one lane. tuner.py sweeps
+# these to tune the presets.
+SPAWN_RULES = {
+    "Easy": {"gap": (35, 50), "double": 0.0, "burst": 0.0},
+    "Normal": {"gap": (25, 45), "double": 0.1, "burst": 0.0},
+    "Hard": {"gap": (20, 50), "double": 0.2, "burst": 0.1},
+}
+
+
+def generate_chart(difficulty, seed=None, duration_ms=GENERATED_LENGTH_MS, rules=None, fall_speed=None):
+    rng = random.Random(seed)
+    rules = rules or SPAWN_RULES.get(difficulty, SPAWN_RULES["Hard"])
+    gap_lo, gap_hi = rules["gap"]
+    double, burst = rules["double"], rules["burst"]
+    notes = []
+    t = LEAD_IN_MS + rng.randint(20, 50) * FRAME_MS
+    while t < duration_ms:
+        ms = int(t)
+        # Chances of 0 draw nothing, so the presets give the same charts (and replays) as before
+        if double and rng.random() < double:
+            notes.extend((ms, lane) for lane in rng.sample(range(4), 2))
+        elif burst and rng.random() < burst:
+            lane = rng.randint(0, 3)
+            notes.extend((ms + i * BURST_GAP_MS, lane) for i in range(3))
+        else:
+            notes.append((ms, rng.randint(0, 3)))
+        t += rng.randint(gap_lo, gap_hi) * FRAME_MS
+    # A burst can run into the next spawn; drop exact duplicates rather than stacking notes
+    return Chart.from_notes(set(notes), title=f"Generated {difficulty}", difficulty=difficulty, fall_speed=fall_speed)
+
+
+def stress_chart(notes_per_second, duration_ms=STRESS_LENGTH_MS):
+    # Evenly spaced notes cycling through the lanes, for throughput tests. Built
+    # straight into the array; at most 1000 per lane per second (1 ms apart)
+    rate = min(int(notes_per_second), LANES * 1000)
+    count = int(duration_ms / 1000 * rate)
+    notes = np.zeros(count, dtype=NOTE_DTYPE)
+    notes["time"] = LEAD_IN_MS + np.arange(count) * 1000 // rate
+    notes["lane"] = np.arange(count) % LANES
+    return Chart(notes, title=f"Stress {rate}/s")
+
+
+def empty_chart():
+    return Chart(np.zeros(0, dtype=NOTE_DTYPE))
+
+
+# --- Command line ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate, compile and inspect note charts")
+    sub = parser.add_subparsers(dest="command", required=True)
+    gen = sub.add_parser("generate", help="write a seeded random chart as JSON")
+    gen.add_argument("difficulty", choices=["Easy", "Normal", "Hard"])
+    gen.add_argument("--seed", type=int, default=0)
+    gen.add_argument("--minutes", type=float, default=GENERATED_LENGTH_MS / 60000)
+    gen.add_argument("--out", required=True)
+    comp = sub.add_parser("compile", help="compile a JSON chart to .fnfc")
+    comp.add_argument("path")
+    info = sub.add_parser("info", help="print a chart summary")
+    info.add_argument("path")
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        chart = generate_chart(args.difficulty, args.seed, int(args.minutes * 60000))
+        save_json(chart, args.out)
+        print(f"{args.out}: {len(chart)} notes")
+    elif args.command == "compile":
+        out = compiled_path(args.path)
+        compile_chart(load_json(args.path), out)
+        print(f"{out}: {os.path.getsize(out)} bytes")
+    else:
+        chart = load_chart(args.path)
+        per_lane = np.bincount(chart.lanes, minlength=LANES).tolist() if len(chart) else [0] * LANES
+        print(f"{len(chart)} notes, {chart.duration_ms / 1000:.1f} s, fall speed {chart.fall_speed}, per lane {per_lane}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
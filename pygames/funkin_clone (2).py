@@ -2,15 +2,79 @@ import pygame
 import random
 import os
 import math
-
-# Initialize pygame
+import time
+from simulation import ARROW_SIZE, HIT_Y, LANE_X, PLAYFIELD_HEIGHT, GameSimulation
+from charts import load_chart, stress_chart
+from autochart import chart_song
+from text_cache import TextCache
+from sprites import SpriteBank, outlined, scaled
+from assets import AssetBaker, SpriteAtlas
+from loader import AssetLoader
+from scenes import MB, Scene, SceneManager
+from surface_pool import SurfacePool
+from particles import ParticleSystem
+from renderer import Renderer
+from viewport import ScaledCache, Viewport
+from profiler import FrameProfiler
+from transitions import Transition
+from widgets import Button, WidgetGroup
+from audio import AudioEngine, SongClock
+from judge import WINDOWS_MS
+from timed_input import TimedInput
+from replay import REPLAYS_DIR, Replay, ReplayPlayer, load_replay, save_replay
+from scores import ScoreStore, run_from_sim, run_key
+from netplay import PEER_TIMEOUT_MS, open_versus, percentiles
+from rollback import RollbackSim
+
+# Initialize pygame (a small mixer buffer keeps hit sounds and the song clock tight)
+pygame.mixer.pre_init(44100, -16, 2, 512)
 pygame.init()
 
+# Base dir
+BASE_DIR = os.path.dirname(__file__)
+
+# --- Settings ---
+settings_file = os.path.join(BASE_DIR, "settings.txt")
+settings = {"audio_offset": 0}  # ms the notes wait for the audio; [ and ] adjust it in game
+# Judgement windows in ms, editable in the settings file
+settings.update((f"window_{name.lower()}", ms) for name, ms in WINDOWS_MS.items())
+# Display: last window size, fullscreen (F11) and render scale in percent (below 100
+# draws fewer pixels and stretches the frame, for slow machines)
+settings.update(screen_width=600, screen_height=800, fullscreen=0, render_scale=100)
+
+if os.path.exists(settings_file):
+    try:
+        with open(settings_file, "r") as f:
+            for line in f:
+                name, val = line.strip().split(":")
+                settings[name] = int(val)
+    except (OSError, ValueError):
+        pass
+
 # Screen settings
-WIDTH, HEIGHT = 600, 800
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
+# Everything is laid out in logical units on a WIDTH x HEIGHT playfield; the viewport
+# scales it to the window (resizable, or fullscreen with F11) and letterboxes the rest
+WIDTH, HEIGHT = 600, PLAYFIELD_HEIGHT
 pygame.display.set_caption("Mini Funkin Clone")
+view = Viewport((WIDTH, HEIGHT), (settings["screen_width"], settings["screen_height"]),
+                fullscreen=bool(settings["fullscreen"]), render_scale=settings["render_scale"] / 100)
+scaled_cache = ScaledCache()  # surfaces rescaled per output resolution
 clock = pygame.time.Clock()
+timed_input = TimedInput()  # stamps events as they arrive; see timed_input.py
+FPS = 60  # render cap only; 0 = uncapped. Gameplay runs on fixed steps in simulation.py
+
+# Automation hook: benchmark.py runs this script through runpy and passes a driver
+# in init_globals that feeds input events and times every frame
+FRAME_DRIVER = globals().get("FRAME_DRIVER")
+if FRAME_DRIVER:
+    FPS = FRAME_DRIVER.fps
+
+# FUNKIN_SEED=n makes a whole session repeatable, effects and layout included
+if os.environ.get("FUNKIN_SEED"):
+    random.seed(int(os.environ["FUNKIN_SEED"]))
+
+# Dirty-rect rendering only repaints what changed; F3 switches modes at runtime
+renderer = Renderer(view.canvas, dirty=os.environ.get("FUNKIN_DIRTY") == "1", view=view, scaler=scaled_cache)
 
 # Colors
 WHITE = (255, 255, 255)
@@ -22,71 +86,143 @@ BG_COLOR = (30, 30, 30)
 font = pygame.font.SysFont("Arial", 36)
 title_font = pygame.font.SysFont("Arial", 64, bold=True)
 count_font = pygame.font.SysFont("Arial", 96, bold=True)
+text_cache = TextCache()
+surface_pool = SurfacePool()
+
+# Debug counters are printed on exit when FUNKIN_DEBUG=1
+DEBUG = os.environ.get("FUNKIN_DEBUG") == "1"
+debug_frames = 0
+debug_alloc_frames = 0  # frames that had to create a new surface
+
+def surfaces_built():
+    # Every surface the game has created while running: pooled fills, text, scaled copies,
+    # per-frame rescales of volatile surfaces, sprite banks and particle sprites
+    return (surface_pool.created + text_cache.misses + scaled_cache.misses + renderer.stats["rescaled"] +
+            countdown_sprites.built + opponent_sprites.built + blood_particles.built + hit_sparks.built)
+
+# Per-stage frame timing: F2 shows the overlay, FUNKIN_PROFILE=file.csv/.jsonl streams samples
+profiler = FrameProfiler()
+if os.environ.get("FUNKIN_PROFILE"):
+    profiler.open_log(os.environ["FUNKIN_PROFILE"])
+
+# --- Asset loading ---
+# Processed images are baked into .bake/ and reused until the source file changes;
+# FUNKIN_BAKE=0 processes everything from scratch
+assets = AssetBaker(os.path.join(BASE_DIR, ".bake"), enabled=os.environ.get("FUNKIN_BAKE") != "0")
+# Files are decoded on worker threads. Each scene lists the assets it needs (see
+# "Scenes" below) and they are loaded before it opens, then unloaded again once
+# no scene uses them and the memory budget (FUNKIN_MEM_BUDGET_MB) is exceeded
+loader = AssetLoader(assets, scaler=scaled_cache)
+audio = AudioEngine(BASE_DIR)
+MEM_BUDGET_MB = float(os.environ.get("FUNKIN_MEM_BUDGET_MB", 32))
+
+def dimmed(bg, alpha):
+    bg.blit(surface_pool.overlay(bg.get_size(), BLACK, alpha), (0, 0))
+    return bg
+
+arrow_size = ARROW_SIZE
+arrow_names = ["left", "up", "down", "right"]  # up and down are swapped in the lanes
+for name in arrow_names:
+    receptor = os.path.join(BASE_DIR, f"{name}.png")
+    loader.image(None, f"{name}.png", receptor, (arrow_size, arrow_size), 12)
+    # Receptors grow to 1.3x for 150ms on a hit
+    loader.image(None, f"{name}_pop", receptor, (arrow_size, arrow_size), 12, then=lambda img: scaled(img, 1.3))
+    loader.image(None, f"{name}_img.png", os.path.join(BASE_DIR, f"{name}_img.png"), (arrow_size, arrow_size), 12)
+menu_wallpaper = os.path.join(BASE_DIR, "FNF wallpaper.jpg")
+loader.image(None, "menu_bg", menu_wallpaper, (WIDTH, HEIGHT), alpha=False)
+# Dimmed menu backgrounds for the credits and (fully faded in) difficulty screens
+loader.image(None, "credits_bg", menu_wallpaper, (WIDTH, HEIGHT), alpha=False, then=lambda bg: dimmed(bg, 180))
+loader.image(None, "difficulty_bg", menu_wallpaper, (WIDTH, HEIGHT), alpha=False, then=lambda bg: dimmed(bg, 150))
+loader.image(None, "game_bg", os.path.join(BASE_DIR, "game_bg.png"), (WIDTH, HEIGHT), alpha=False)
+loader.add(None, "effects", audio.load_effects, audio.set_effects)
+for song in ("menu.mp3", "game.mp3"):
+    loader.add(None, song, lambda song=song: audio.load_music(song))
+
+# arrows.png holds all four arrows on a grey sheet; FUNKIN_ARROWS=atlas uses it for the notes
+ARROW_ATLAS_REGIONS = {"left": (52, 173, 155, 157), "up": (203, 20, 157, 154),
+                       "down": (206, 306, 157, 154), "right": (338, 168, 154, 157)}
+use_arrow_atlas = os.environ.get("FUNKIN_ARROWS") == "atlas"
+if use_arrow_atlas:
+    loader.image(None, "arrow_atlas", os.path.join(BASE_DIR, "arrows.png"),
+                 colorkey=(153, 153, 153), scale=arrow_size / 157,
+                 then=lambda sheet: SpriteAtlas(sheet, ARROW_ATLAS_REGIONS, arrow_size / 157))
 
-# Base dir
-BASE_DIR = os.path.dirname(__file__)
-
-# --- Image helpers ---
-def round_corners(image, radius=12):
-    size = image.get_size()
-    mask = pygame.Surface(size, pygame.SRCALPHA)
-    pygame.draw.rect(mask, (255, 255, 255, 255), (0, 0, *size), border_radius=radius)
-    result = pygame.Surface(size, pygame.SRCALPHA)
-    result.blit(image, (0, 0))
-    result.blit(mask, (0, 0), special_flags=pygame.BLEND_RGBA_MULT)
-    return result
-
-def load_and_smooth(path, size, radius=12):
-    img = pygame.image.load(path).convert_alpha()
-    img = pygame.transform.smoothscale(img, (size, size))
-    img = round_corners(img, radius)
-    return img
-
-# --- Load images ---
-arrow_size = 80
-arrow_images = [
-    load_and_smooth(os.path.join(BASE_DIR, "left.png"), arrow_size),
-    load_and_smooth(os.path.join(BASE_DIR, "up.png"), arrow_size),    # swapped
-    load_and_smooth(os.path.join(BASE_DIR, "down.png"), arrow_size),  # swapped
-    load_and_smooth(os.path.join(BASE_DIR, "right.png"), arrow_size)
-]
-falling_arrow_images = [
-    load_and_smooth(os.path.join(BASE_DIR, "left_img.png"), arrow_size),
-    load_and_smooth(os.path.join(BASE_DIR, "up_img.png"), arrow_size),    # swapped
-    load_and_smooth(os.path.join(BASE_DIR, "down_img.png"), arrow_size),  # swapped
-    load_and_smooth(os.path.join(BASE_DIR, "right_img.png"), arrow_size)
-]
-
-# --- Main menu background ---
-menu_bg = pygame.image.load(os.path.join(BASE_DIR, "FNF wallpaper.jpg")).convert()
-menu_bg = pygame.transform.smoothscale(menu_bg, (WIDTH, HEIGHT))
-
-# --- Game background ---
-game_bg = pygame.image.load(os.path.join(BASE_DIR, "game_bg.png")).convert()
-game_bg = pygame.transform.smoothscale(game_bg, (WIDTH, HEIGHT))
+credit_img_files = ["img1.jpg", "img2.jpg", "img3.jpg", "img4.jpg", "img5.jpg"]  # Use your actual filenames
+for fname in credit_img_files:
+    loader.image(None, fname, os.path.join(BASE_DIR, fname), (120, 120))  # Adjust size as needed
+
+# FUNKIN_CHART=song plays charts made from game.mp3's beats (autochart.py). They are
+# cached next to the song; a missing or stale one is made on a worker while the loading
+# screen shows. Versus rounds always use generated charts
+chart_from_song = os.environ.get("FUNKIN_CHART") == "song" and not os.environ.get("FUNKIN_VERSUS")
+loader.add(None, "song_charts", lambda: chart_song(os.path.join(BASE_DIR, "game.mp3")))
+
+# The menu and everything that stays loaded start decoding now, behind the loading screen
+loader.group("boot", ["effects", "menu.mp3", "menu_bg"] + ["song_charts"] * chart_from_song)
+loader.preload("boot")
+
+def loading_screen(group):
+    # Runs until the group is loaded, so the window shows up and responds right away
+    loader.preload(group)
+    bar = pygame.Rect(WIDTH//2 - 150, HEIGHT//2 + 20, 300, 16)
+    while not loader.ready(group):
+        if pygame.event.get(pygame.QUIT):
+            loader.shutdown()
+            pygame.quit()
+            raise SystemExit
+        loader.pump(budget_ms=12)
+        renderer.begin(surface_pool.overlay((WIDTH, HEIGHT), BG_COLOR))
+        text = text_cache.render(font, "Loading...", WHITE)
+        renderer.blit(text, text.get_rect(center=(WIDTH//2, HEIGHT//2 - 20)))
+        renderer.rect(WHITE, bar, border_radius=8, width=2)
+        fill = bar.inflate(-6, -6)
+        fill.width = int(fill.width * loader.progress(group))
+        renderer.rect(WHITE, fill, border_radius=5)
+        renderer.present()
+        loader.wait_any(1 / 60)
+
+def arrow_images():
+    return [loader.get(f"{name}.png") for name in arrow_names]
+
+def popped_arrow_images():
+    return [loader.get(f"{name}_pop") for name in arrow_names]
+
+def falling_arrow_images():
+    if use_arrow_atlas:
+        atlas = loader.get("arrow_atlas")
+        return [atlas[name] for name in arrow_names]
+    return [loader.get(f"{name}_img.png") for name in arrow_names]
+
+def credit_imgs():
+    return [loader.get(fname) for fname in credit_img_files]
 
 # --- Game settings ---
-fall_speed = 7
-lanes = [100, 200, 300, 400]
+lanes = list(LANE_X)
 keys = [pygame.K_LEFT, pygame.K_UP, pygame.K_DOWN, pygame.K_RIGHT]  # swapped up and down
 
-score = 0
-health = 5
-
-# --- Highscore per difficulty ---
-highscore_file = "highscore.txt"
+# --- Scores ---
+# Every run goes to scores.db (see scores.py), written in the background; the
+# old highscore.txt and runs.txt in the working directory are imported into a new database.
+# FUNKIN_SCORES=path keeps them somewhere else (the benchmark uses a temp file)
+score_store = ScoreStore(os.environ.get("FUNKIN_SCORES") or os.path.join(BASE_DIR, "scores.db"),
+                         legacy="highscore.txt", legacy_runs="runs.txt")
+# Every run is recorded next to the game (see replay.py); FUNKIN_REPLAYS=dir records them elsewhere
+replays_dir = os.environ.get("FUNKIN_REPLAYS") or REPLAYS_DIR
 difficulties = ["Easy", "Normal", "Hard"]
 highscores = {diff: 0 for diff in difficulties}
+highscores.update(score_store.bests())
+LEADERBOARD_SIZE = 5
+leaderboard = []  # best runs of the difficulty just played, for the game over screen
+last_run = None
 
-# Load highscores from file if it exists
-if os.path.exists(highscore_file):
-    try:
-        with open(highscore_file, "r") as f:
-            for line in f:
-                diff, val = line.strip().split(":")
-                highscores[diff] = int(val)
-    except:
-        pass
+# --- Audio ---
+song_clock = SongClock(settings["audio_offset"])
+offset_shown_time = -10000
+
+# --- Judgement display ---
+judgement_colors = {"Perfect": (255, 230, 120), "Good": (140, 255, 140), "Bad": (200, 200, 255), "Miss": RED}
+last_judgement = None
+judgement_time = -10000
 
 # --- Game over phrases ---
 game_over_phrases = [
@@ -98,37 +234,50 @@ game_over_phrases = [
 ]
 current_game_over_text = "GAME OVER"
 
-# --- Arrow class ---
-class Arrow:
-    def __init__(self, lane, index):
-        self.x = lane
-        self.y = -arrow_size
-        self.index = index
-        self.image = falling_arrow_images[index]
-        self.rect = self.image.get_rect(topleft=(self.x, self.y))
-    def update(self):
-        self.y += fall_speed
-        self.rect.y = self.y
-    def draw(self):
-        screen.blit(self.image, (self.x, self.y))
-
 # --- Game variables ---
-arrows = []
-spawn_timer = 0
-hit_y = HEIGHT - 200 + (arrow_size // 2) - 10
-hit_zone = pygame.Rect(0, hit_y, WIDTH, 20)
-game_over = False
+hit_y = HIT_Y
+# The note stream gets its own RNG, seeded from the global one so a seeded run is reproducible
+windows = {name: settings[f"window_{name.lower()}"] for name in WINDOWS_MS}
+# FUNKIN_STRESS=n plays a no-fail chart of n notes per second, to measure draw throughput
+stress_rate = int(os.environ.get("FUNKIN_STRESS") or 0)
+sim = GameSimulation(lanes, arrow_size, HEIGHT, hit_y, rng=random.Random(random.getrandbits(64)), windows=windows,
+                     no_fail=bool(stress_rate))
+# FUNKIN_CHART=path.json/.fnfc plays an authored chart instead of the generated ones
+# (FUNKIN_CHART=song: see the boot group above)
+custom_chart_path = os.path.abspath(os.environ["FUNKIN_CHART"]) if os.environ.get("FUNKIN_CHART") not in (None, "", "song") else ""
+custom_chart = load_chart(custom_chart_path) if custom_chart_path else None
+if stress_rate:
+    custom_chart = stress_chart(stress_rate)
+replay_player = None  # set when playing back a recorded run
 shake_timer = 0
 pop_timers = [0,0,0,0]
 bg_flash_timer = 0
 
+# --- Versus ---
+# FUNKIN_VERSUS=loopback[:latency[:jitter[:loss %]]] plays against a bot over a
+# simulated network; listen:PORT and HOST:PORT play another copy of the game.
+# Both sides play the same generated chart; the opponent's game is rebuilt here
+# from their inputs (netplay.py, rollback.py) and drawn small on the right
+def make_opponent_sim(their_windows):
+    return GameSimulation(lanes, arrow_size, HEIGHT, hit_y, windows=their_windows)
+
+versus, versus_peer = open_versus(os.environ["FUNKIN_VERSUS"], make_opponent_sim) if os.environ.get("FUNKIN_VERSUS") else (None, None)
+if versus:
+    custom_chart_path, custom_chart = "", None  # the peer only gets a seed
+opponent = RollbackSim(make_opponent_sim(windows))
+opponent_sprites = SpriteBank()
+OPPONENT_SCALE = 0.25
+OPPONENT_X, OPPONENT_Y = WIDTH - 105, 240
+small_font = pygame.font.SysFont("Arial", 18)
+versus_shown = []    # when the opponent presses that arrived this frame were made (our perf_counter_ns)
+versus_latency = []  # ms from an opponent's press to the frame that shows it
+
 # Retry/Menu buttons
-button_width, button_height = 150, 60
-retry_button = pygame.Rect(WIDTH//2 - button_width - 10, HEIGHT//2 + 50, button_width, button_height)
-menu_button = pygame.Rect(WIDTH//2 + 10, HEIGHT//2 + 50, button_width, button_height)
+end_button_width, end_button_height = 150, 60
+retry_button = pygame.Rect(WIDTH//2 - end_button_width - 10, HEIGHT//2 + 50, end_button_width, end_button_height)
+menu_button = pygame.Rect(WIDTH//2 + 10, HEIGHT//2 + 50, end_button_width, end_button_height)
 
 # --- Main menu ---
-menu_active = True
 button_width, button_height = 250, 70
 button_spacing = 40
 total_height = 3 * button_height + 2 * button_spacing
@@ -137,19 +286,16 @@ start_y = HEIGHT//2 - total_height//2 + 100  # Increase 100 to move further down
 start_button = pygame.Rect(WIDTH//2 - button_width//2, start_y, button_width, button_height)
 credits_button = pygame.Rect(WIDTH//2 - button_width//2, start_y + button_height + button_spacing, button_width, button_height)
 quit_button = pygame.Rect(WIDTH//2 - button_width//2, start_y + 2*(button_height + button_spacing), button_width, button_height)
-button_pop = [0,0,0]
 
 # --- Credits ---
-credits_active = False
 credits_animation_start = 0
 credits_text_alpha = 0
 credits_float_speed = 0.002
 credits_float_offset = 0
 credits_back_button = pygame.Rect(WIDTH//2 - 100, HEIGHT - 100, 200, 60)
-credits_back_pop = 0
+dragging_idx = None  # credit image being dragged
 
 # --- Difficulty selection ---
-difficulty_active = False
 difficulty_open_time = 0
 difficulty_fade_alpha = 0
 difficulty_buttons = {
@@ -158,463 +304,625 @@ difficulty_buttons = {
     "Hard": pygame.Rect(WIDTH//2 - 125, HEIGHT//2 + 100, 250, 70),
 }
 difficulty_back_button = pygame.Rect(20, 20, 100, 50)
-difficulty_pop = {key:0 for key in difficulty_buttons}
-difficulty_back_pop = 0
 selected_difficulty = None
 
+# --- Button actions ---
+def open_difficulty():
+    scenes.switch("difficulty")
+
+def close_difficulty():
+    scenes.switch("menu")
+
+def open_credits():
+    scenes.switch("credits")
+
+def close_credits():
+    scenes.switch("menu")
+
+def quit_game():
+    global running
+    pygame.time.delay(100)
+    running = False
+
+def start_game(key):
+    if now - difficulty_open_time <= 200:
+        return  # ignore clicks while the screen is still fading in
+    begin_round(key, now + TRANSITION_MS)  # "3" shows once the crossfade is done
+
+def begin_round(key, countdown_at, seed=None):
+    global selected_difficulty, countdown_start, custom_chart_path, custom_chart, replay_player
+    selected_difficulty = key
+    replay_player = None
+    if chart_from_song and not stress_rate:
+        custom_chart_path = loader.get("song_charts")[key]
+        custom_chart = load_chart(custom_chart_path)
+    countdown_start = countdown_at
+    sim.reset(selected_difficulty, custom_chart, seed=seed)
+    send_start()
+    blood_particles.clear()
+    hit_sparks.clear()
+    transition.crossfade(renderer.screen, now, TRANSITION_MS, warmup=countdown_warmup())
+
+    # --- Stop menu music when starting the game ---
+    audio.stop_music(fade_ms=TRANSITION_MS)
+    scenes.switch("countdown")
+
+def retry():
+    global replay_player, countdown_start
+    replay_player = None
+    sim.reset(selected_difficulty, custom_chart)
+    blood_particles.clear()
+    hit_sparks.clear()
+    countdown_start = now
+    send_start()
+    scenes.switch("countdown")
+
+def back_to_menu():
+    global replay_player
+    transition.crossfade(renderer.screen, now, TRANSITION_MS)
+    replay_player = None
+    sim.reset(None)
+    blood_particles.clear()
+    hit_sparks.clear()
+    scenes.switch("menu")
+
+# --- Scene buttons ---
+# Each scene's buttons are one group; only the active scene's group gets mouse events
+HOVER_COLOR = (200,200,255)
+menu_ui = WidgetGroup(
+    Button(start_button, "Start Game", font, open_difficulty, hover_color=HOVER_COLOR),
+    # Hovering Credits already starts loading its images
+    Button(credits_button, "Credits", font, open_credits, hover_color=HOVER_COLOR,
+           on_hover=lambda: loader.preload("credits")),
+    Button(quit_button, "Quit", font, quit_game, hover_color=HOVER_COLOR),
+)
+credits_ui = WidgetGroup(Button(credits_back_button, "Back", font, close_credits))
+difficulty_ui = WidgetGroup(
+    *(Button(rect, key, font, lambda key=key: start_game(key), hover_color=HOVER_COLOR)
+      for key, rect in difficulty_buttons.items()),
+    Button(difficulty_back_button, "Back", font, close_difficulty, radius=10),
+)
+game_over_ui = WidgetGroup(
+    Button(retry_button, "Retry", font, retry, pop=False),
+    Button(menu_button, "Menu", font, back_to_menu, pop=False),
+)
+
+# --- Title ---
+title_img = outlined(title_font.render("BUTTON SMASHER!!", True, WHITE), 3)
+
 # --- Countdown ---
-countdown_active = False
 countdown_start = 0
 countdown_numbers = ["3","2","1","GO!!"]
-countdown_index = 0
+COUNTDOWN_MS = len(countdown_numbers) * 500
 last_countdown_index = -1
 pop_start_time = 0
+countdown_sprites = SpriteBank()  # (text, scale) -> surface, built on first use
 
 # --- Blood effects ---
-blood_particles = []
+blood_particles = ParticleSystem(RED)
 blood_timer = 0
 
-# --- Fade function ---
-def fade_surface(surface, fade_in=True, speed=15):
-    fade = pygame.Surface((WIDTH, HEIGHT))
-    fade.fill(BLACK)
-    if fade_in:
-        for alpha in reversed(range(0, 255, speed)):
-            fade.set_alpha(alpha)
-            screen.blit(surface, (0,0))
-            screen.blit(fade, (0,0))
-            pygame.display.update()
-            pygame.time.delay(10)
+# --- Hit sparks ---
+hit_sparks = ParticleSystem((255, 230, 140), gravity=900)
+
+def emit_hit_sparks(lane_index, count=12):
+    cx = lanes[lane_index] + arrow_size // 2
+    cy = HEIGHT - 200 + arrow_size // 2
+    angles = [random.uniform(0, 2 * math.pi) for _ in range(count)]
+    speeds = [random.uniform(150, 350) for _ in range(count)]
+    hit_sparks.emit(cx, cy,
+                    [random.randint(2, 5) for _ in range(count)],
+                    vx=[math.cos(a) * v for a, v in zip(angles, speeds)],
+                    vy=[math.sin(a) * v for a, v in zip(angles, speeds)],
+                    fade=600)
+
+def show_press(lane_index, judgement):
+    global shake_timer, bg_flash_timer, last_judgement, judgement_time
+    if judgement and judgement != "Miss":
+        pop_timers[lane_index] = now
+        emit_hit_sparks(lane_index)
+        audio.play_hit()
     else:
-        for alpha in range(0, 255, speed):
-            fade.set_alpha(alpha)
-            screen.blit(surface, (0,0))
-            screen.blit(fade, (0,0))
-            pygame.display.update()
-            pygame.time.delay(10)
-
-# Load credit images
-credit_imgs = []
-credit_img_files = ["img1.jpg", "img2.jpg", "img3.jpg", "img4.jpg", "img5.jpg"]  # Use your actual filenames
-for fname in credit_img_files:
-    img = pygame.image.load(os.path.join(BASE_DIR, fname)).convert_alpha()
-    img = pygame.transform.smoothscale(img, (120, 120))  # Adjust size as needed
-    credit_imgs.append(img)
+        audio.play_miss()
+        shake_timer = now
+        bg_flash_timer = now
+    if judgement:
+        last_judgement, judgement_time = judgement, now
+
+def record_replay():
+    if stress_rate:
+        return  # a stress chart cannot be replayed from a seed
+    os.makedirs(replays_dir, exist_ok=True)
+    name = time.strftime("%Y%m%d-%H%M%S") + f"-{sim.difficulty}.fnfr"
+    save_replay(Replay.from_sim(sim, custom_chart_path), os.path.join(replays_dir, name))
+
+def on_game_over():
+    global current_game_over_text, blood_timer, leaderboard, last_run
+    audio.stop_music(fade_ms=500)
+    if versus:
+        versus.send_end(sim.time_ms, sim.score)
+    current_game_over_text = random.choice(game_over_phrases)
+    blood_timer = pygame.time.get_ticks()
+    blood_particles.emit([random.randint(0, WIDTH) for _ in range(20)],
+                         [random.randint(0, HEIGHT) for _ in range(20)],
+                         [random.randint(10, 30) for _ in range(20)],
+                         alpha=255, fade=180)
+    scenes.switch("game_over")
+    last_run = None
+    if not replay_player:
+        last_run = run_from_sim(sim, "game_over", custom_chart_path)
+        score_store.record(last_run)
+        record_replay()
+    leaderboard = score_store.top(LEADERBOARD_SIZE, sim.difficulty)
+
+# --- Versus updates ---
+def send_start():
+    # The opponent starts their song when ours starts, after the countdown
+    if versus and not replay_player:
+        versus.send_start(sim.seed, sim.difficulty, countdown_start + COUNTDOWN_MS - pygame.time.get_ticks(), windows)
+
+def update_versus():
+    for event in versus.poll():
+        if event[0] == "start":
+            _, seed, difficulty, lead_ms, their_windows, received_ns = event
+            opponent.reset(difficulty, seed, their_windows)
+            versus_shown.clear()
+            if scenes.name not in ("countdown", "gameplay") and not replay_player:
+                # Join their round, timed so both songs start together
+                lead_ms -= versus.one_way_ms + (time.perf_counter_ns() - received_ns) / 1e6
+                begin_round(difficulty, now + int(lead_ms) - COUNTDOWN_MS, seed)
+        elif event[0] == "input":
+            opponent.add(*event[1:5])
+            versus_shown.append(versus.local_ns(event[5]))
+        elif event[0] == "end":
+            opponent.finish(event[1])
+        elif event[0] == "bye":
+            opponent.quit = "left"
+    # A peer that stops answering pings has dropped out: their round ends where it is
+    if opponent.active and not opponent.quit and versus.silent_ms > PEER_TIMEOUT_MS:
+        opponent.quit = "offline"
+        if opponent.end_ms is None:
+            opponent.finish(opponent.sim.time_ms)
+    # Their game runs on our song time; presses that arrive late roll it back
+    if scenes.name in ("gameplay", "game_over"):
+        opponent.advance(song_clock.at(time.perf_counter_ns()))
+
+def draw_opponent():
+    if not opponent.active:
+        return
+    batch = []
+    field_x = lambda x: OPPONENT_X + (x - lanes[0]) * OPPONENT_SCALE
+    for i, (lane, img) in enumerate(zip(lanes, arrow_images())):
+        receptor = opponent_sprites.get(("receptor", i), lambda: scaled(img, OPPONENT_SCALE))
+        batch.append((receptor, (field_x(lane), OPPONENT_Y + (HEIGHT - 200) * OPPONENT_SCALE)))
+    for i, (queue, img) in enumerate(zip(opponent.sim.lane_arrows, falling_arrow_images())):
+        note = opponent_sprites.get(("note", i), lambda: scaled(img, OPPONENT_SCALE))
+        for arrow in queue:
+            if arrow.y < 0:
+                break  # the rest of the lane is above the mini playfield
+            batch.append((note, (field_x(arrow.x), OPPONENT_Y + arrow.y * OPPONENT_SCALE)))
+    renderer.blits(batch)
+    status = opponent.quit or ("KO" if opponent.sim.game_over else f"HP {opponent.sim.health}")
+    lines = [f"P2 {opponent.sim.score}", status, f"RTT {versus.rtt_ms or 0:.0f} ms"]
+    if versus_latency:
+        lines.append(f"lag {versus_latency[-1]:.0f} ms")
+    for i, line in enumerate(lines):
+        renderer.blit(text_cache.render(small_font, line, WHITE), (OPPONENT_X, OPPONENT_Y + 210 + i * 20))
+
+# --- Screen transitions ---
+transition = Transition((WIDTH, HEIGHT), surface_pool)
+TRANSITION_MS = 300
+
+def countdown_warmup():
+    # Pre-render the countdown digits while the crossfade plays
+    jobs = []
+    for text in countdown_numbers:
+        for scale in (1.0, 1.5):
+            jobs.append(lambda text=text, scale=scale: countdown_sprites.get(
+                (text, scale), lambda: scaled(count_font.render(text, True, WHITE), scale)))
+    return jobs
 
 credit_img_positions = []
-for i in range(len(credit_imgs)):
+for i in range(len(credit_img_files)):
     x = random.randint(0, WIDTH - 120)
     y = random.randint(0, HEIGHT - 120)
     credit_img_positions.append((x, y))
 
+# --- Menu scene ---
+def enter_menu():
+    audio.play_music("menu.mp3", fade_ms=TRANSITION_MS)
+
+def draw_menu():
+    renderer.set_background(loader.get("menu_bg"))
+    menu_ui.draw(renderer, now)
+
+    # Draw title image with its pre-baked black outline
+    float_offset = math.sin(pygame.time.get_ticks() * 0.002) * 18  # Floating effect for the title
+    title_rect = title_img.get_rect(center=(WIDTH//2, start_y - 165 + float_offset))
+    renderer.blit(title_img, title_rect)
+
+# --- Credits scene ---
+def enter_credits():
+    global credits_animation_start
+    credits_animation_start = pygame.time.get_ticks()
+
+def credits_event(event):
+    global dragging_idx, drag_offset
+    if event.type == pygame.MOUSEBUTTONDOWN:
+        mx, my = event.pos
+        for idx, (img, (x, y)) in enumerate(zip(credit_imgs(), credit_img_positions)):
+            float_offset = math.sin(pygame.time.get_ticks() * 0.002 + idx) * 20
+            rect = pygame.Rect(x, y + float_offset, img.get_width(), img.get_height())
+            if rect.collidepoint(mx, my):
+                dragging_idx = idx
+                drag_offset = (mx - x, my - (y + float_offset))
+                break
+    elif event.type == pygame.MOUSEBUTTONUP:
+        dragging_idx = None
+    elif event.type == pygame.MOUSEMOTION and dragging_idx is not None:
+        mx, my = event.pos
+        credit_img_positions[dragging_idx] = (mx - drag_offset[0], my - drag_offset[1])
+
+def draw_credits():
+    global credits_text_alpha, credits_float_offset
+    anim_time = pygame.time.get_ticks() - credits_animation_start
+    progress = min(anim_time / 500, 1)
+    credits_text_alpha = int(255 * progress)
+    credits_float_offset = math.sin(anim_time * credits_float_speed) * 10
+
+    renderer.set_background(loader.get("credits_bg"))
+
+    t = pygame.time.get_ticks() * 0.002
+    renderer.blits([(img, (x, y + math.sin(t + idx) * 20))
+                    for idx, (img, (x, y)) in enumerate(zip(credit_imgs(), credit_img_positions))])
+
+    title_surf = text_cache.render(title_font, "Credits", WHITE, alpha=credits_text_alpha)
+    title_rect = title_surf.get_rect(center=(WIDTH//2, HEIGHT//4 + credits_float_offset))
+    renderer.blit(title_surf, title_rect)
+
+    lines = ["Pygames by Rafael", "BSIS-2A"]
+    for i, line in enumerate(lines):
+        text_surf = text_cache.render(font, line, WHITE, alpha=credits_text_alpha)
+        y_pos = HEIGHT//2 - 20 + i*50 + credits_float_offset
+        text_rect = text_surf.get_rect(center=(WIDTH//2, y_pos))
+        renderer.blit(text_surf, text_rect)
+
+    credits_ui.draw(renderer, now)
+
+# --- Difficulty scene ---
+def enter_difficulty():
+    global difficulty_open_time, difficulty_fade_alpha
+    difficulty_open_time = now
+    difficulty_fade_alpha = 0
+
+def draw_difficulty():
+    global difficulty_fade_alpha
+    # Fade-in animation
+    fade_duration = 500
+    progress = min((now - difficulty_open_time) / fade_duration, 1)
+    difficulty_fade_alpha = int(255 * progress)
+
+    # Semi-transparent background
+    if progress < 1:
+        renderer.set_background(loader.get("menu_bg"))
+        bg_surf = surface_pool.overlay((WIDTH, HEIGHT), BLACK, int(150 * progress))
+        renderer.blit(bg_surf, (0,0))
+    else:
+        renderer.set_background(loader.get("difficulty_bg"))
+
+    # Title
+    title_surf = text_cache.render(title_font, "Select Difficulty", WHITE, alpha=difficulty_fade_alpha)
+    title_rect = title_surf.get_rect(center=(WIDTH//2, HEIGHT//4 - 40))
+    renderer.blit(title_surf, title_rect)
+
+    # Difficulty and back buttons
+    difficulty_ui.draw(renderer, now, difficulty_fade_alpha)
+
+# --- Countdown scene ---
+def enter_countdown():
+    global last_countdown_index
+    last_countdown_index = -1
+
+def draw_countdown():
+    global pop_start_time, last_countdown_index
+    renderer.set_background(loader.get("game_bg"))
+    elapsed = (now - countdown_start) // 500  # 500ms per number (was 1000)
+    if elapsed < 0:
+        pass  # still crossfading in
+    elif elapsed < len(countdown_numbers):
+        text = countdown_numbers[elapsed]
+        # Detect when the countdown number changes
+        if elapsed != last_countdown_index:
+            pop_start_time = now
+            last_countdown_index = elapsed
+        # Pop effect only for 150ms after number changes
+        if now - pop_start_time < 150:
+            scale = 1.5
+        else:
+            scale = 1.0
+        surf = countdown_sprites.get((text, scale), lambda: scaled(count_font.render(text, True, WHITE), scale))
+        rect = surf.get_rect(center=(WIDTH//2, HEIGHT//2))
+        renderer.blit(surf, rect)
+    else:
+        scenes.switch("gameplay")
+
+# --- Gameplay scene ---
+def enter_gameplay():
+    # Gameplay time is the song position from here on
+    audio.play_music("game.mp3")
+    song_clock.reset(now)
+
+def gameplay_event(event):
+    if event.type == pygame.KEYDOWN and event.key in keys and not replay_player:
+        i = keys.index(event.key)
+        # Judged at the song time the key was actually pressed
+        judgement = sim.press(i, song_clock.at(event.time_ns))
+        show_press(i, judgement)
+        if versus:
+            versus.send_input(*sim.inputs[-1], judgement, event.time_ns)
+        if sim.game_over:
+            on_game_over()
+
+def draw_flash():
+    if now - bg_flash_timer < 400:
+        alpha = 255 - int((now - bg_flash_timer)/400*255)
+        red_overlay = surface_pool.overlay((WIDTH, HEIGHT), RED, alpha)
+        renderer.blit(red_overlay, (0,0))
+
+def draw_gameplay():
+    global last_judgement, judgement_time
+    renderer.set_background(loader.get("game_bg"))
+    draw_flash()
+
+    # Advance the simulation in fixed steps, then draw between the last two
+    profiler.mark("draw")
+    misses = sim.misses
+    clock_ms = song_clock.update(now, audio.music_pos())
+    if replay_player:
+        for lane_index, judgement in replay_player.advance_to(clock_ms):
+            show_press(lane_index, judgement)
+            misses += judgement == "Miss"
+    else:
+        sim.advance_to(clock_ms)
+    if sim.misses != misses:
+        audio.play_miss()
+        last_judgement, judgement_time = "Miss", now
+    profiler.mark("update")
+    if sim.game_over:
+        on_game_over()
+        draw_game_over()
+        return
+
+    # Notes and receptors go to the renderer as one batch. Each lane's queue runs from the
+    # lowest note up, so the first note above the screen ends that lane (culling the rest)
+    alpha = sim.alpha()
+    batch = []
+    for queue, img in zip(sim.lane_arrows, falling_arrow_images()):
+        for arrow in queue:
+            y = arrow.draw_y(alpha)
+            if y <= -arrow_size:
+                break
+            batch.append((img, (arrow.x, y)))
+
+    if selected_difficulty and not replay_player and sim.score > highscores[selected_difficulty]:
+        highscores[selected_difficulty] = sim.score
+
+    for i, (lane, img, popped) in enumerate(zip(lanes, arrow_images(), popped_arrow_images())):
+        draw_x, draw_y = lane, HEIGHT - 200
+        if now - shake_timer < 150:
+            draw_x += random.randint(-5,5)
+            draw_y += random.randint(-5,5)
+        if now - pop_timers[i] < 150:
+            rect = popped.get_rect(center=(lane+arrow_size//2, HEIGHT-200+arrow_size//2))
+            batch.append((popped, rect.topleft))
+        else:
+            batch.append((img, (draw_x,draw_y)))
+    renderer.blits(batch)
+
+    hit_sparks.update(dt)
+    hit_sparks.draw(renderer)
+    profiler.mark("draw")
+
+    # Cached by text, so these only re-rasterize when the values change
+    score_text = text_cache.render(font, f"Score: {sim.score}", WHITE)
+    if selected_difficulty:
+        highscore_text = text_cache.render(font, f"Highscore ({selected_difficulty}): {highscores[selected_difficulty]}", WHITE)
+    else:
+        highscore_text = text_cache.render(font, "Highscore: 0", WHITE)
+    health_text = text_cache.render(font, f"Health: {sim.health}", WHITE)
+    diff_text = text_cache.render(font, f"Mode: {selected_difficulty}" + (" (replay)" if replay_player else ""), (200,200,255))
+    renderer.blit(score_text, (20,20))
+    renderer.blit(highscore_text, (20,60))
+    renderer.blit(health_text, (20,100))
+    renderer.blit(diff_text, (20,140))
+    counts = sim.stats.counts
+    judge_text = text_cache.render(font, f"P {counts['Perfect']}  G {counts['Good']}  B {counts['Bad']}  M {counts['Miss']}", WHITE)
+    renderer.blit(judge_text, (20,180))
+    if now - judgement_time < 400:
+        popup = last_judgement
+        if last_judgement != "Miss" and sim.stats.hits:
+            popup += f"  {sim.stats.mean_offset:+.0f} ms"
+        popup_text = text_cache.render(font, popup, judgement_colors[last_judgement])
+        renderer.blit(popup_text, popup_text.get_rect(center=(WIDTH//2, HEIGHT - 260)))
+    if now - offset_shown_time < 1500:
+        offset_text = text_cache.render(font, f"Audio offset: {settings['audio_offset']:+d} ms", (200,200,255))
+        renderer.blit(offset_text, (20, HEIGHT - 60))
+    if versus:
+        draw_opponent()
+    profiler.mark("hud")
+
+# --- Game over scene ---
+def draw_game_over():
+    renderer.set_background(loader.get("game_bg"))
+    draw_flash()
+    elapsed = pygame.time.get_ticks() - blood_timer
+    fade_alpha = max(0, 255 - int(elapsed / 2))
+    red_overlay = surface_pool.overlay((WIDTH, HEIGHT), RED, fade_alpha)
+    renderer.blit(red_overlay, (0,0))
+
+    blood_particles.update(dt)
+    blood_particles.draw(renderer)
+
+    game_over_text = text_cache.render(title_font, "GAME OVER", RED)
+    game_over_rect = game_over_text.get_rect(center=(WIDTH//2, HEIGHT//2.5 - 100))
+    renderer.blit(game_over_text, game_over_rect)
+
+    phrase_text = text_cache.render(font, current_game_over_text, WHITE)
+    phrase_rect = phrase_text.get_rect(center=(WIDTH//2, HEIGHT//2.1 - 40))
+    renderer.blit(phrase_text, phrase_rect)
+
+    game_over_ui.draw(renderer, now)
+
+    # Best runs of this difficulty, the one just played highlighted
+    header = text_cache.render(font, f"Top {sim.difficulty}", WHITE)
+    renderer.blit(header, header.get_rect(center=(WIDTH//2, HEIGHT//2 + 150)))
+    for i, run in enumerate(leaderboard):
+        accuracy = f"{run['accuracy']:.0%}" if run["accuracy"] is not None else "--"
+        color = judgement_colors["Perfect"] if last_run and run_key(run) == run_key(last_run) else WHITE
+        line = text_cache.render(font, f"{i + 1}. {run['score']:>5}   {accuracy:>4}", color)
+        renderer.blit(line, line.get_rect(center=(WIDTH//2, HEIGHT//2 + 190 + i * 34)))
+    if versus:
+        draw_opponent()
+
+# --- Scenes ---
+# Each scene loads its assets before it opens and gives up its references when
+# it closes; F4 prints resident memory per scene
+arrow_assets = [f"{name}{suffix}" for name in arrow_names for suffix in (".png", "_pop", "_img.png")]
+if use_arrow_atlas:
+    arrow_assets.append("arrow_atlas")
+scenes = SceneManager(loader, int(MEM_BUDGET_MB * MB), lambda: view.to_logical(pygame.mouse.get_pos()))
+scenes.add(Scene("menu", ["menu_bg"], menu_ui, draw_menu, enter=enter_menu, preload=("difficulty",)))
+scenes.add(Scene("credits", ["credits_bg", *credit_img_files], credits_ui, draw_credits, credits_event,
+                 enter=enter_credits))
+scenes.add(Scene("difficulty", ["menu_bg", "difficulty_bg"], difficulty_ui, draw_difficulty,
+                 enter=enter_difficulty, preload=("countdown", "gameplay")))
+scenes.add(Scene("countdown", ["game_bg"], None, draw_countdown, enter=enter_countdown, preload=("gameplay",)))
+scenes.add(Scene("gameplay", ["game_bg", "game.mp3", *arrow_assets], None, draw_gameplay, gameplay_event,
+                 enter=enter_gameplay))
+# In versus the game over screen still draws the opponent's notes and receptors
+scenes.add(Scene("game_over", ["game_bg", *(arrow_assets if versus else [])], game_over_ui, draw_game_over,
+                 preload=("gameplay", "menu")))
+
+loading_screen("boot")
+scenes.keep(["effects", "menu.mp3"] + ["song_charts"] * chart_from_song)
+
+# --- Replay playback ---
+# FUNKIN_REPLAY=path.fnfr skips the menus and plays a recorded run back
+if os.environ.get("FUNKIN_REPLAY"):
+    replay_player = ReplayPlayer(load_replay(os.environ["FUNKIN_REPLAY"]))
+    sim = replay_player.sim
+    selected_difficulty = sim.difficulty
+    now = countdown_start = pygame.time.get_ticks()
+    scenes.switch("countdown")
+else:
+    scenes.switch("menu")
+assets.flush()
+
 # --- Game loop ---
 running = True
+if FRAME_DRIVER:
+    FRAME_DRIVER.start(globals())
 while running:
+    if FRAME_DRIVER:
+        FRAME_DRIVER.before_frame()
+    profiler.begin_frame()
     now = pygame.time.get_ticks()
-    mouse_pos = pygame.mouse.get_pos()
-    screen.fill(BG_COLOR)
+    dt = clock.get_time()
+    if DEBUG:
+        allocs_before = surfaces_built()
+    renderer.begin()
+    loader.pump()
 
-    for event in pygame.event.get():
+    for event in timed_input.events():
         if event.type == pygame.QUIT:
             running = False
-
-        # --- Menu ---
-        if menu_active and not difficulty_active and not credits_active:
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                if start_button.collidepoint(event.pos):
-                    button_pop[0] = now
-                    difficulty_active = True
-                    difficulty_open_time = now
-                    difficulty_fade_alpha = 0
-                elif credits_button.collidepoint(event.pos):
-                    button_pop[1] = now
-                    credits_active = True
-                    credits_animation_start = pygame.time.get_ticks()
-                elif quit_button.collidepoint(event.pos):
-                    button_pop[2] = now
-                    pygame.time.delay(100)
-                    running = False
-
-        # --- Credits ---
-        if credits_active and event.type == pygame.MOUSEBUTTONDOWN:
-            if credits_back_button.collidepoint(event.pos):
-                credits_back_pop = now
-                credits_active = False
-        if credits_active:
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                mx, my = event.pos
-                for idx, (img, (x, y)) in enumerate(zip(credit_imgs, credit_img_positions)):
-                    float_offset = math.sin(pygame.time.get_ticks() * 0.002 + idx) * 20
-                    rect = pygame.Rect(x, y + float_offset, img.get_width(), img.get_height())
-                    if rect.collidepoint(mx, my):
-                        dragging_idx = idx
-                        drag_offset = (mx - x, my - (y + float_offset))
-                        break
-            elif event.type == pygame.MOUSEBUTTONUP:
-                dragging_idx = None
-            elif event.type == pygame.MOUSEMOTION and dragging_idx is not None:
-                mx, my = event.pos
-                credit_img_positions[dragging_idx] = (mx - drag_offset[0], my - drag_offset[1])
-
-        # --- Difficulty selection ---
-        if difficulty_active and event.type == pygame.MOUSEBUTTONDOWN:
-            if now - difficulty_open_time > 200:
-                for key, rect in difficulty_buttons.items():
-                    if rect.collidepoint(event.pos):
-                        difficulty_pop[key] = now
-                        selected_difficulty = key
-                        if key == "Easy":
-                            fall_speed = 8
-                        elif key == "Normal":
-                            fall_speed = 12
-                        else:
-                            fall_speed = 15
-                        difficulty_active = False
-                        menu_active = False
-                        countdown_active = True
-                        countdown_start = now
-                        countdown_index = 0
-                        last_countdown_index = -1
-                        arrows.clear()
-                        spawn_timer = 0
-                        score = 0
-                        health = 5
-                        fade_surface(screen, fade_in=True)
-
-                        # --- Stop menu music when starting the game ---  # MUSIC ADDED
-                        if pygame.mixer.music.get_busy():
-                            pygame.mixer.music.stop()
-            if difficulty_back_button.collidepoint(event.pos):
-                difficulty_back_pop = now
-                difficulty_active = False
-
-        # --- Gameplay ---
-        if not menu_active and not game_over and not countdown_active:
-            if event.type == pygame.KEYDOWN:
-                if event.key in keys:
-                    i = keys.index(event.key)
-                    hit = False
-                    for arrow in arrows:
-                        wide_rect = arrow.rect.inflate(60,0)
-                        if arrow.index == i and hit_zone.colliderect(wide_rect):
-                            score += 10
-                            arrows.remove(arrow)
-                            pop_timers[i] = now
-                            hit = True
-                            break
-                    if not hit:
-                        shake_timer = now
-                        bg_flash_timer = now
-
-        if not menu_active and game_over:
-            if event.type == pygame.MOUSEBUTTONDOWN:
-                if retry_button.collidepoint(event.pos):
-                    score = 0
-                    health = 5
-                    arrows.clear()
-                    game_over = False
-                    blood_particles.clear()
-                    countdown_active = True
-                    countdown_start = now
-                    countdown_index = 0
-                    last_countdown_index = -1  # <-- Reset here!
-                    spawn_timer = 0
-                elif menu_button.collidepoint(event.pos):
-                    score = 0
-                    health = 5
-                    arrows.clear()
-                    game_over = False
-                    blood_particles.clear()
-                    menu_active = True
-
-    # --- Draw menu ---
-    if menu_active:
-        screen.blit(menu_bg, (0,0))
-        if credits_active:
-            anim_time = pygame.time.get_ticks() - credits_animation_start
-            progress = min(anim_time / 500, 1)
-            credits_text_alpha = int(255 * progress)
-            credits_float_offset = math.sin(anim_time * credits_float_speed) * 10
-
-            bg_surf = pygame.Surface((WIDTH, HEIGHT))
-            bg_surf.fill(BLACK)
-            bg_surf.set_alpha(180)
-            screen.blit(bg_surf, (0,0))
-
-            # --- Add this block here ---
-            for idx, (img, (x, y)) in enumerate(zip(credit_imgs, credit_img_positions)):
-                float_offset = math.sin(pygame.time.get_ticks() * 0.002 + idx) * 20
-                screen.blit(img, (x, y + float_offset))
-            # --- End block ---
-
-            title_surf = title_font.render("Credits", True, WHITE)
-            title_surf.set_alpha(credits_text_alpha)
-            title_rect = title_surf.get_rect(center=(WIDTH//2, HEIGHT//4 + credits_float_offset))
-            screen.blit(title_surf, title_rect)
-
-            lines = ["Pygames by Rafael", "BSIS-2A"]
-            for i, line in enumerate(lines):
-                text_surf = font.render(line, True, WHITE)
-                text_surf.set_alpha(credits_text_alpha)
-                y_pos = HEIGHT//2 - 20 + i*50 + credits_float_offset
-                text_rect = text_surf.get_rect(center=(WIDTH//2, y_pos))
-                screen.blit(text_surf, text_rect)
-
-            draw_rect = credits_back_button.copy()
-            if now - credits_back_pop < 150:
-                scale = 1.1
-                w,h = int(credits_back_button.width*scale), int(credits_back_button.height*scale)
-                draw_rect.width, draw_rect.height = w,h
-                draw_rect.center = credits_back_button.center
-            pygame.draw.rect(screen, WHITE, draw_rect, border_radius=15)
-            back_text = font.render("Back", True, BLACK)
-            screen.blit(back_text, (draw_rect.centerx - back_text.get_width()//2,
-                                    draw_rect.centery - back_text.get_height()//2))
-
-        elif difficulty_active:
-            # Fade-in animation
-            fade_duration = 500
-            progress = min((now - difficulty_open_time) / fade_duration, 1)
-            difficulty_fade_alpha = int(255 * progress)
-
-            # Semi-transparent background
-            bg_surf = pygame.Surface((WIDTH, HEIGHT))
-            bg_surf.fill(BLACK)
-            bg_surf.set_alpha(int(150 * progress))
-            screen.blit(bg_surf, (0,0))
-
-            # Title
-            title_surf = title_font.render("Select Difficulty", True, WHITE)
-            title_surf.set_alpha(difficulty_fade_alpha)
-            title_rect = title_surf.get_rect(center=(WIDTH//2, HEIGHT//4 - 40))
-            screen.blit(title_surf, title_rect)
-
-            # Difficulty buttons
-            for key, rect in difficulty_buttons.items():
-                color = (200,200,255) if rect.collidepoint(mouse_pos) else WHITE
-                draw_rect = rect.copy()
-                if now - difficulty_pop[key] < 150:
-                    scale = 1.1
-                    w,h = int(rect.width*scale), int(rect.height*scale)
-                    draw_rect.width, draw_rect.height = w,h
-                    draw_rect.center = rect.center
-                button_surf = pygame.Surface((draw_rect.width, draw_rect.height), pygame.SRCALPHA)
-                pygame.draw.rect(button_surf, color, button_surf.get_rect(), border_radius=15)
-                button_surf.set_alpha(difficulty_fade_alpha)
-                screen.blit(button_surf, draw_rect.topleft)
-
-                text = font.render(key, True, BLACK)
-                text.set_alpha(difficulty_fade_alpha)
-                text_rect = text.get_rect(center=draw_rect.center)
-                screen.blit(text, text_rect)
-
-            # Back button
-            draw_rect = difficulty_back_button.copy()
-            if now - difficulty_back_pop < 150:
-                scale = 1.1
-                w,h = int(difficulty_back_button.width*scale), int(difficulty_back_button.height*scale)
-                draw_rect.width, draw_rect.height = w,h
-                draw_rect.center = difficulty_back_button.center
-            back_surf = pygame.Surface((draw_rect.width, draw_rect.height), pygame.SRCALPHA)
-            pygame.draw.rect(back_surf, WHITE, back_surf.get_rect(), border_radius=10)
-            back_surf.set_alpha(difficulty_fade_alpha)
-            screen.blit(back_surf, draw_rect.topleft)
-
-            back_text = font.render("Back", True, BLACK)
-            back_text.set_alpha(difficulty_fade_alpha)
-            screen.blit(back_text, (draw_rect.centerx - back_text.get_width()//2,
-                                    draw_rect.centery - back_text.get_height()//2))
-
-        else:
-            for idx, btn in enumerate([start_button, credits_button, quit_button]):
-                color = (200,200,255) if btn.collidepoint(mouse_pos) else WHITE
-                draw_rect = btn.copy()
-                if now - button_pop[idx] < 150:
-                    scale = 1.1
-                    w,h = int(button_width*scale), int(button_height*scale)
-                    draw_rect.width, draw_rect.height = w,h
-                    draw_rect.center = btn.center
-                pygame.draw.rect(screen, color, draw_rect, border_radius=15)
-                text = "Start Game" if idx==0 else ("Credits" if idx==1 else "Quit")
-                text_surf = font.render(text, True, BLACK)
-                text_rect = text_surf.get_rect(center=draw_rect.center)
-                screen.blit(text_surf, text_rect)
-
-            # Draw title image with black outline
-            float_offset = math.sin(pygame.time.get_ticks() * 0.002) * 18  # Floating effect for the title
-            title_img = title_font.render("BUTTON SMASHER!!", True, WHITE)
-            title_rect = title_img.get_rect(center=(WIDTH//2, start_y - 165 + float_offset))
-            for dx in [-3, 0, 3]:
-                for dy in [-3, 0, 3]:
-                    if dx != 0 or dy != 0:
-                        # Draw outline by blitting a black version of the image
-                        black_img = title_img.copy()
-                        black_img.fill((0,0,0,255), special_flags=pygame.BLEND_RGBA_MULT)
-                        screen.blit(black_img, title_rect.move(dx, dy))
-            # Draw main image on top
-            screen.blit(title_img, title_rect)
-
-    # --- Gameplay ---
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+            renderer.toggle()
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_F2:
+            profiler.toggle_overlay()
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_F4:
+            print(scenes.report())
+        if event.type == pygame.VIDEORESIZE:
+            view.resize(event.size)
+            renderer.view_changed()
+            settings["screen_width"], settings["screen_height"] = view.window_size
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_F11:
+            view.toggle_fullscreen()
+            renderer.view_changed()
+            settings["fullscreen"] = int(view.fullscreen)
+        if hasattr(event, "pos"):
+            event.pos = view.to_logical(event.pos)  # buttons and drags work in logical units
+        if event.type == pygame.KEYDOWN and event.key in (pygame.K_LEFTBRACKET, pygame.K_RIGHTBRACKET):
+            # Audio offset calibration, 5ms per press
+            step = 5 if event.key == pygame.K_RIGHTBRACKET else -5
+            settings["audio_offset"] += step
+            song_clock.offset_ms = settings["audio_offset"]
+            offset_shown_time = now
+
+        # --- Buttons and input of the active scene ---
+        scenes.handle(event, now)
+
+    if versus:
+        update_versus()
+    profiler.mark("events")
+
+    scenes.draw()
+
+    transition.draw(renderer, now)
+    profiler.draw(renderer)
+    profiler.mark("draw")
+    renderer.present()
+    if versus_shown:
+        shown_ns = time.perf_counter_ns()
+        versus_latency.extend((shown_ns - pressed_ns) / 1e6 for pressed_ns in versus_shown)
+        versus_shown.clear()
+    profiler.mark("present")
+    timed_input.wait(clock, FPS)
+    profiler.mark("idle")
+    profiler.end_frame()
+    if FRAME_DRIVER:
+        FRAME_DRIVER.after_frame()
+    if DEBUG:
+        debug_frames += 1
+        if surfaces_built() != allocs_before:
+            debug_alloc_frames += 1
+
+# A run that was still going when the game closed is recorded too
+if scenes.name == "gameplay" and not replay_player:
+    if not stress_rate:
+        score_store.record(run_from_sim(sim, "quit", custom_chart_path))
+    record_replay()
+if replay_player:
+    if not replay_player.done():
+        print("replay stopped before the end of the recording")
     else:
-        screen.blit(game_bg, (0, 0))
-        if countdown_active:
-            elapsed = (now - countdown_start) // 500  # 500ms per number (was 1000)
-            if elapsed < len(countdown_numbers):
-                text = countdown_numbers[elapsed]
-                # Detect when the countdown number changes
-                if elapsed != last_countdown_index:
-                    pop_start_time = now
-                    last_countdown_index = elapsed
-                # Pop effect only for 150ms after number changes
-                if now - pop_start_time < 150:
-                    scale = 1.5
-                else:
-                    scale = 1.0
-                surf = count_font.render(text, True, WHITE)
-                surf = pygame.transform.smoothscale(surf, (int(surf.get_width()*scale), int(surf.get_height()*scale)))
-                rect = surf.get_rect(center=(WIDTH//2, HEIGHT//2))
-                screen.blit(surf, rect)
-            else:
-                countdown_active = False
-                last_countdown_index = -1  # Reset for next time
-
-        else:
-            if now - bg_flash_timer < 400:
-                alpha = 255 - int((now - bg_flash_timer)/400*255)
-                red_overlay = pygame.Surface((WIDTH, HEIGHT))
-                red_overlay.fill(RED)
-                red_overlay.set_alpha(alpha)
-                screen.blit(red_overlay, (0,0))
-
-            if not game_over:
-                # Set spawn interval based on difficulty
-                if 'next_spawn' not in locals():
-                    next_spawn = random.randint(20, 50)
-                spawn_timer += 1
-                if spawn_timer > next_spawn:
-                    if selected_difficulty == "Easy":
-                        # Only one arrow at a time, regular interval
-                        lane_index = random.randint(0, 3)
-                        lane = lanes[lane_index]
-                        arrows.append(Arrow(lane, lane_index))
-                        next_spawn = random.randint(35, 50)
-                    elif selected_difficulty == "Normal":
-                        # 10% chance to spawn two arrows at once (different lanes), no bursts
-                        if random.random() < 0.1:
-                            lanes_indices = random.sample(range(4), 2)
-                            for lane_index in lanes_indices:
-                                lane = lanes[lane_index]
-                                arrows.append(Arrow(lane, lane_index))
-                        else:
-                            lane_index = random.randint(0, 3)
-                            lane = lanes[lane_index]
-                            arrows.append(Arrow(lane, lane_index))
-                        next_spawn = random.randint(25, 45)
-                    else:
-                        # Hard: keep complex mechanic
-                        # 20% chance to spawn two arrows at once (different lanes)
-                        if random.random() < 0.2:
-                            lanes_indices = random.sample(range(4), 2)
-                            for lane_index in lanes_indices:
-                                lane = lanes[lane_index]
-                                arrows.append(Arrow(lane, lane_index))
-                        # 10% chance for a burst: 3 arrows in a row (same lane)
-                        elif random.random() < 0.1:
-                            lane_index = random.randint(0, 3)
-                            lane = lanes[lane_index]
-                            for i in range(3):
-                                arrows.append(Arrow(lane, lane_index))
-                        else:
-                            lane_index = random.randint(0, 3)
-                            lane = lanes[lane_index]
-                            arrows.append(Arrow(lane, lane_index))
-                        next_spawn = random.randint(20, 50)
-                    spawn_timer = 0
-
-                for arrow in arrows[:]:
-                    arrow.update()
-                    arrow.draw()
-                    if arrow.y > HEIGHT:
-                        arrows.remove(arrow)
-                        health -=1
-                        if health <=0 and not game_over:
-                            game_over = True
-                            current_game_over_text = random.choice(game_over_phrases)
-                            blood_timer = pygame.time.get_ticks()
-                            for _ in range(20):
-                                x = random.randint(0, WIDTH)
-                                y = random.randint(0, HEIGHT)
-                                radius = random.randint(10, 30)
-                                alpha = 255
-                                blood_particles.append([x, y, radius, alpha])
-
-                if selected_difficulty and score > highscores[selected_difficulty]:
-                    highscores[selected_difficulty] = score
-
-                for i, lane in enumerate(lanes):
-                    img = arrow_images[i]
-                    draw_x, draw_y = lane, HEIGHT - 200
-                    if now - shake_timer < 150:
-                        draw_x += random.randint(-5,5)
-                        draw_y += random.randint(-5,5)
-                    if now - pop_timers[i] < 150:
-                        scale = 1.3
-                        size = int(arrow_size*scale)
-                        popped = pygame.transform.smoothscale(img, (size,size))
-                        rect = popped.get_rect(center=(lane+arrow_size//2, HEIGHT-200+arrow_size//2))
-                        screen.blit(popped, rect.topleft)
-                    else:
-                        screen.blit(img, (draw_x,draw_y))
-
-                score_text = font.render(f"Score: {score}", True, WHITE)
-                if selected_difficulty:
-                    highscore_text = font.render(f"Highscore ({selected_difficulty}): {highscores[selected_difficulty]}", True, WHITE)
-                else:
-                    highscore_text = font.render("Highscore: 0", True, WHITE)
-                health_text = font.render(f"Health: {health}", True, WHITE)
-                diff_text = font.render(f"Mode: {selected_difficulty}", True, (200,200,255))
-                screen.blit(score_text, (20,20))
-                screen.blit(highscore_text, (20,60))
-                screen.blit(health_text, (20,100))
-                screen.blit(diff_text, (20,140))
-
-            if game_over:
-                elapsed = pygame.time.get_ticks() - blood_timer
-                fade_alpha = max(0, 255 - int(elapsed / 2))
-                red_overlay = pygame.Surface((WIDTH, HEIGHT))
-                red_overlay.fill(RED)
-                red_overlay.set_alpha(fade_alpha)
-                screen.blit(red_overlay, (0,0))
-
-                for particle in blood_particles[:]:
-                    x, y, radius, alpha = particle
-                    blood_surf = pygame.Surface((radius*2, radius*2), pygame.SRCALPHA)
-                    pygame.draw.circle(blood_surf, (255, 0, 0, alpha), (radius, radius), radius)
-                    screen.blit(blood_surf, (x-radius, y-radius))
-                    particle[3] -= 3
-                    if particle[3] <= 0:
-                        blood_particles.remove(particle)
-
-                game_over_text = title_font.render("GAME OVER", True, RED)
-                game_over_rect = game_over_text.get_rect(center=(WIDTH//2, HEIGHT//2.5 - 100))
-                screen.blit(game_over_text, game_over_rect)
-
-                phrase_text = font.render(current_game_over_text, True, WHITE)
-                phrase_rect = phrase_text.get_rect(center=(WIDTH//2, HEIGHT//2.1 - 40))
-                screen.blit(phrase_text, phrase_rect)
-
-                for rect, label in [(retry_button,"Retry"),(menu_button,"Menu")]:
-                    pygame.draw.rect(screen, WHITE, rect, border_radius=15)
-                    text = font.render(label, True, BLACK)
-                    text_rect = text.get_rect(center=rect.center)
-                    screen.blit(text, text_rect)
-
-    pygame.display.flip()
-    clock.tick(60)
-
-# --- Save highscores to file ---
-with open(highscore_file, "w") as f:
-    for diff, val in highscores.items():
-        f.write(f"{diff}:{val}\n")
+        mismatches = replay_player.mismatches()
+        print("replay matches the recording" if not mismatches else f"replay mismatch: {mismatches}")
+
+with open(settings_file, "w") as f:
+    for name, val in settings.items():
+        f.write(f"{name}:{val}\n")
+
+if versus:
+    if versus_peer:
+        versus_peer.stop()
+        versus_peer.session.close()
+    versus.close()
+    if versus_latency:
+        print(f"versus: opponent input to display ms {percentiles(versus_latency)} over {len(versus_latency)} presses")
+    print("versus:", versus.stats(), opponent.stats())
+
+profiler.close()
+score_store.close()
+loader.shutdown()
+assets.flush()
+if DEBUG:
+    print("assets:", assets.stats())
+    print("text cache:", text_cache.stats())
+    print("surface pool:", surface_pool.stats())
+    print("scaled surfaces:", scaled_cache.stats())
+    print("renderer:", renderer.stats)
+    print(f"frames that allocated surfaces: {debug_alloc_frames} of {debug_frames}")
+    print("scenes:\n" + scenes.report())
 
 pygame.quit()
@@ -0,0 +1,58 @@
+import math
+
+# --- Judgement windows ---
+# Distance in ms from a note's hit time. Inside "Bad" it is a hit; between
+# "Bad" and "Miss" the press uses up the note as a miss; further out the
+# press does not touch any note.
+JUDGEMENTS = ("Perfect", "Good", "Bad", "Miss")
+WINDOWS_MS = {"Perfect": 45, "Good": 90, "Bad": 135, "Miss": 180}
+SCORES = {"Perfect": 10, "Good": 7, "Bad": 3, "Miss": 0}
+
+
+def judge(offset_ms, windows=WINDOWS_MS):
+    distance = abs(offset_ms)
+    for name in JUDGEMENTS:
+        if distance <= windows[name]:
+            return name
+    return None
+
+
+# --- Per-run statistics ---
+class RunStats:
+    def __init__(self):
+        self.counts = dict.fromkeys(JUDGEMENTS, 0)
+        self.hits = 0
+        self.mean_offset = 0.0  # ms, positive = late; running (Welford) mean of hits
+        self._m2 = 0.0
+
+    def add(self, judgement, offset_ms=None):
+        self.counts[judgement] += 1
+        if judgement != "Miss" and offset_ms is not None:
+            self.hits += 1
+            delta = offset_ms - self.mean_offset
+            self.mean_offset += delta / self.hits
+            self._m2 += delta * (offset_ms - self.mean_offset)
+
+    def copy(self):
+        other = RunStats()
+        other.counts = dict(self.counts)
+        other.hits, other.mean_offset, other._m2 = self.hits, self.mean_offset, self._m2
+        return other
+
+    @property
+    def stddev(self):
+        return math.sqrt(self._m2 / self.hits) if self.hits else 0.0
+
+    @property
+    def accuracy(self):
+        # Share of the best possible score over all judged notes
+        judged = sum(self.counts.values())
+        if not judged:
+            return 1.0
+        return sum(SCORES[j] * n for j, n in self.counts.items()) / (judged * SCORES["Perfect"])
+
+    def as_dict(self):
+        data = {name.lower(): n for name, n in self.counts.items()}
+        data.update(mean_offset=round(self.mean_offset, 2), stddev=round(self.stddev, 2),
+                    accuracy=round(self.accuracy, 4))
+        return data
@@ -0,0 +1,139 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import pygame
+
+from assets import finish
+from viewport import scaled_size
+
+PUMP_BUDGET_MS = 4
+
+
+def asset_bytes(asset):
+    # Roughly how much memory a loaded asset holds
+    if isinstance(asset, pygame.Surface):
+        # Subsurfaces share their parent's pixels
+        return 0 if asset.get_parent() else asset.get_width() * asset.get_height() * asset.get_bytesize()
+    if isinstance(asset, (bytes, bytearray)):
+        return len(asset)
+    if isinstance(asset, pygame.mixer.Sound):
+        return len(asset.get_raw())
+    if isinstance(asset, (list, tuple)):
+        return sum(asset_bytes(a) for a in asset)
+    if hasattr(asset, "sheet"):  # SpriteAtlas
+        return asset_bytes(asset.sheet)
+    return 0
+
+
+# --- Background asset loading ---
+# Reading and decoding files runs on a small thread pool. Anything that needs
+# the display (convert/convert_alpha) or touches game state runs on the main
+# thread in pump(), a few ms per frame. Assets are requested by name and
+# grouped per scene, so a scene can preload its group before it opens.
+class AssetLoader:
+    def __init__(self, baker, workers=4, scaler=None):
+        self.baker = baker
+        self.scaler = scaler  # a viewport ScaledCache; images tell it how to rebuild themselves
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix="assets")
+        self.groups = {}   # group -> [names]
+        self.jobs = {}     # name -> (load, finish, unload); load runs on a worker
+        self.pending = {}  # name -> future
+        self.assets = {}   # name -> finished asset
+        self.sizes = {}    # name -> asset_bytes() of the finished asset
+
+    # --- Registering ---
+    def add(self, group, name, load, finish=None, unload=None):
+        # group may be None for assets that are only listed by a scene (see group())
+        if group:
+            self.groups.setdefault(group, []).append(name)
+        self.jobs[name] = (load, finish, unload)
+
+    def group(self, group, names):
+        self.groups[group] = list(names)
+
+    def image(self, group, name, path, size=None, radius=0, alpha=True, colorkey=None, scale=None, then=None):
+        # then(surface) can wrap the converted surface, e.g. into an atlas
+        def done(surf):
+            base = surf.get_size()
+            surf = finish(surf, alpha)
+            result = then(surf) if then else surf
+            if self.scaler is not None and scale is None and isinstance(result, pygame.Surface):
+                self.scaler.register(result, self._rebuilder(path, base, result.get_width(), radius, alpha, colorkey, then))
+            return result
+        self.add(group, name, lambda: self.baker.decode(path, size, radius, alpha, colorkey, scale), done)
+
+    def _rebuilder(self, path, base, width, radius, alpha, colorkey, then):
+        # Decodes the source again straight at an output size, sharper than scaling the
+        # logical-size surface up. Bakes land in the same cache, one per resolution
+        def rebuild(size):
+            factor = size[0] / width
+            surf = finish(self.baker.decode(path, scaled_size(base, factor), round(radius * factor), alpha, colorkey), alpha)
+            surf = then(surf) if then else surf
+            return surf if surf.get_size() == size else pygame.transform.smoothscale(surf, size)
+        return rebuild
+
+    # --- Loading ---
+    def preload(self, group):
+        # Start loading a group in the background; safe to call every frame
+        for name in self.groups[group]:
+            if name not in self.assets and name not in self.pending:
+                self.pending[name] = self.pool.submit(self.jobs[name][0])
+
+    def pump(self, budget_ms=PUMP_BUDGET_MS):
+        # Complete finished loads on the main thread; returns how many
+        if not self.pending:
+            return 0
+        deadline = time.perf_counter() + budget_ms / 1000
+        count = 0
+        for name, future in list(self.pending.items()):
+            if future.done():
+                self.complete(name)
+                count += 1
+                if time.perf_counter() > deadline:
+                    break
+        return count
+
+    def wait_any(self, timeout):
+        # Sleep until some pending load completes, or timeout seconds
+        if self.pending:
+            wait(list(self.pending.values()), timeout, return_when=FIRST_COMPLETED)
+
+    def complete(self, name):
+        result = self.pending.pop(name).result()  # a failed load raises here, on the main thread
+        done = self.jobs[name][1]
+        asset = self.assets[name] = done(result) if done else result
+        self.sizes[name] = asset_bytes(asset)
+        return asset
+
+    def require(self, name):
+        # Blocking: the asset now, loading it first if nobody asked for it yet
+        if name in self.assets:
+            return self.assets[name]
+        if name not in self.pending:
+            self.pending[name] = self.pool.submit(self.jobs[name][0])
+        return self.complete(name)
+
+    # --- Queries ---
+    def get(self, name, default=None):
+        return self.assets.get(name, default)
+
+    def ready(self, group):
+        return all(name in self.assets for name in self.groups[group])
+
+    def progress(self, group):
+        names = self.groups[group]
+        return sum(name in self.assets for name in names) / len(names) if names else 1.0
+
+    def resident_bytes(self):
+        return sum(self.sizes.values())
+
+    def unload(self, name):
+        # Forget a finished asset; the next preload() or require() loads it again
+        del self.assets[name]
+        del self.sizes[name]
+        unload = self.jobs[name][2]
+        if unload:
+            unload()
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,428 @@
+"""Versus networking: two players on one seeded note stream, over UDP.
+
+Each side sends a START when it begins a round (seed, difficulty, when its song
+starts, its judgement windows) and then every press as it happens: the step
+and song time it was made at, the lane, its judgement and when it happened.
+Those records go out on one reliable, ordered stream: each packet carries every
+record the peer has not acknowledged yet (up to MAX_RECORDS), and every packet
+acknowledges what arrived, so a lost packet only costs a resend. Pings measure
+the round trip and the offset between the two clocks.
+
+The session runs its own asyncio loop on a background thread; the game only
+queues records and drains received ones, so a slow or silent peer never
+blocks a frame. rollback.py turns the opponent's presses into their game.
+
+For testing on one machine, a loopback pair links two sessions through a
+simulated network (latency, jitter, loss) and a bot (bot.py) plays the other
+side. This measures input-to-display latency, rollbacks and whether the
+opponent's game is rebuilt exactly:
+
+    python netplay.py --latency 80 --jitter 20 --loss 2 --seconds 30
+    FUNKIN_VERSUS=loopback:80:20 python "funkin_clone (2).py"
+"""
+import argparse
+import asyncio
+import queue
+import random
+import struct
+import sys
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from bot import Bot
+from judge import JUDGEMENTS, WINDOWS_MS
+from simulation import STEP_MS
+
+MAGIC = b"FNFV"
+PROTOCOL_VERSION = 1
+HEADER = struct.Struct("<4sBBI")    # magic, version, packet type, records received so far (the ack)
+RECORD = struct.Struct("<IBB")      # seq, record type, payload length
+START = struct.Struct("<Ii4H8s")    # seed, ms until its song starts, windows, difficulty
+INPUT = struct.Struct("<idBBq")     # step ms, press ms, lane, judgement code, perf_counter_ns of the press
+END = struct.Struct("<ii")          # time ms, score
+PING = struct.Struct("<q")          # sender's perf_counter_ns
+PONG = struct.Struct("<qq")         # the ping's time, the answering side's perf_counter_ns
+DATA, PING_PACKET, PONG_PACKET, BYE = range(1, 5)
+R_START, R_INPUT, R_END = range(1, 4)
+JUDGEMENT_CODES = (None,) + JUDGEMENTS  # code 0: the press touched no note
+
+MAX_RECORDS = 32    # per packet, about 900 bytes of inputs
+TICK_MS = 10
+RESEND_MS = 40      # unacknowledged records are sent again this often, or after 1.25 round trips
+PING_MS = 200
+CLOCK_SAMPLES = 16  # the clock offset comes from the fastest of the last pings
+PEER_TIMEOUT_MS = 5000  # a peer silent this long (25 missed pings) has dropped out
+
+
+# --- Session ---
+class NetSession(asyncio.DatagramProtocol):
+    def __init__(self, bind=("0.0.0.0", 0), remote=None, latency_ms=0, jitter_ms=0, loss=0.0, seed=None):
+        self.bind = bind
+        self.remote = remote  # learned from the first packet when listening
+        # Simulated network on the way out: delay (ms) and share of packets lost
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.loss = loss
+        self.shaping = random.Random(seed)
+        self.inbox = queue.SimpleQueue()
+        self.next_seq = 0
+        self.unacked = deque()  # (seq, record bytes)
+        self.received = 0       # records taken in order so far
+        self.last_data_ns = 0
+        self.last_ping_ns = 0
+        self.last_heard_ns = 0  # when anything last arrived from the peer
+        self.rtt_ms = None
+        self.clock = deque(maxlen=CLOCK_SAMPLES)  # (rtt ns, offset ns)
+        self.offset_ns = 0      # peer clock minus ours
+        self.sent = self.resent = self.dropped = 0
+        self.loop = None
+        self.error = None
+        self.ready = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=asyncio.run, args=(self._main(),), name="netplay", daemon=True)
+        self.thread.start()
+        self.ready.wait()
+        if self.error:
+            raise self.error
+        return self
+
+    async def _main(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopping = asyncio.Event()
+        try:
+            self.transport, _ = await self.loop.create_datagram_endpoint(lambda: self, local_addr=self.bind)
+        except OSError as e:
+            self.error = e
+            self.ready.set()
+            return
+        self.address = self.transport.get_extra_info("sockname")
+        self.ready.set()
+        ticker = asyncio.create_task(self._tick())
+        await self.stopping.wait()
+        ticker.cancel()
+        self.transport.close()
+
+    async def _tick(self):
+        while True:
+            await asyncio.sleep(TICK_MS / 1000)
+            if self.remote is None:
+                continue
+            now = time.perf_counter_ns()
+            resend_ms = max(RESEND_MS, 1.25 * (self.rtt_ms or 0))  # not while the ack may still be on its way
+            if self.unacked and now - self.last_data_ns >= resend_ms * 1_000_000:
+                self.resent += 1
+                self._send_data()
+            if now - self.last_ping_ns >= PING_MS * 1_000_000:
+                self.last_ping_ns = now
+                self._sendto(HEADER.pack(MAGIC, PROTOCOL_VERSION, PING_PACKET, self.received) + PING.pack(now))
+
+    # --- Sending (network thread) ---
+    def _sendto(self, packet):
+        if self.loss and self.shaping.random() < self.loss:
+            self.dropped += 1
+            return
+        self.sent += 1
+        delay = self.latency_ms + self.shaping.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            self.loop.call_later(delay / 1000, self.transport.sendto, packet, self.remote)
+        else:
+            self.transport.sendto(packet, self.remote)
+
+    def _send_data(self):
+        self.last_data_ns = time.perf_counter_ns()
+        records = b"".join(record for _, record in list(self.unacked)[:MAX_RECORDS])
+        self._sendto(HEADER.pack(MAGIC, PROTOCOL_VERSION, DATA, self.received) + records)
+
+    def _queue(self, kind, payload):
+        self.unacked.append((self.next_seq, RECORD.pack(self.next_seq, kind, len(payload)) + payload))
+        self.next_seq += 1
+        if self.remote is not None:
+            self._send_data()
+
+    # --- Receiving (network thread) ---
+    def datagram_received(self, data, addr):
+        try:
+            magic, version, packet, ack = HEADER.unpack_from(data)
+        except struct.error:
+            return
+        if magic != MAGIC or version != PROTOCOL_VERSION:
+            return
+        if self.remote is None:
+            self.remote = addr
+        now = time.perf_counter_ns()
+        self.last_heard_ns = now
+        while self.unacked and self.unacked[0][0] < ack:
+            self.unacked.popleft()
+        if packet == DATA:
+            if self._take_records(data, HEADER.size, now):
+                self._sendto(HEADER.pack(MAGIC, PROTOCOL_VERSION, DATA, self.received))  # a bare ack
+        elif packet == PING_PACKET:
+            self._sendto(HEADER.pack(MAGIC, PROTOCOL_VERSION, PONG_PACKET, self.received) +
+                         PONG.pack(PING.unpack_from(data, HEADER.size)[0], now))
+        elif packet == PONG_PACKET:
+            sent, theirs = PONG.unpack_from(data, HEADER.size)
+            rtt = now - sent
+            self.rtt_ms = rtt / 1e6 if self.rtt_ms is None else 0.875 * self.rtt_ms + 0.125 * rtt / 1e6
+            self.clock.append((rtt, theirs - (sent + now) // 2))
+            self.offset_ns = min(self.clock)[1]
+        elif packet == BYE:
+            self.inbox.put(("bye",))
+
+    def _take_records(self, data, pos, now):
+        # Records arrive in seq order; repeats are skipped and anything after a gap
+        # waits for the resend. Returns whether the packet had any records
+        any_records = False
+        while pos + RECORD.size <= len(data):
+            any_records = True
+            seq, kind, length = RECORD.unpack_from(data, pos)
+            payload = data[pos + RECORD.size:pos + RECORD.size + length]
+            pos += RECORD.size + length
+            if seq < self.received:
+                continue
+            if seq > self.received:
+                break
+            self.received += 1
+            if kind == R_START:
+                seed, lead_ms, perfect, good, bad, miss, difficulty = START.unpack(payload)
+                windows = dict(zip(JUDGEMENTS, (perfect, good, bad, miss)))
+                self.inbox.put(("start", seed, difficulty.rstrip(b"\0").decode(), lead_ms, windows, now))
+            elif kind == R_INPUT:
+                step, time_ms, lane, code, pressed_ns = INPUT.unpack(payload)
+                self.inbox.put(("input", step, time_ms, lane, JUDGEMENT_CODES[code], pressed_ns))
+            elif kind == R_END:
+                self.inbox.put(("end",) + END.unpack(payload))
+        return any_records
+
+    # --- Game thread ---
+    def send_start(self, seed, difficulty, lead_ms, windows):
+        payload = START.pack(seed, int(lead_ms), *(windows[name] for name in JUDGEMENTS), difficulty.encode())
+        self.loop.call_soon_threadsafe(self._queue, R_START, payload)
+
+    def send_input(self, step, time_ms, lane, judgement, pressed_ns):
+        payload = INPUT.pack(step, time_ms, lane, JUDGEMENT_CODES.index(judgement), pressed_ns)
+        self.loop.call_soon_threadsafe(self._queue, R_INPUT, payload)
+
+    def send_end(self, time_ms, score):
+        self.loop.call_soon_threadsafe(self._queue, R_END, END.pack(time_ms, score))
+
+    def poll(self):
+        # Everything received since the last call
+        events = []
+        while True:
+            try:
+                events.append(self.inbox.get_nowait())
+            except queue.Empty:
+                return events
+
+    def local_ns(self, remote_ns):
+        # A peer perf_counter_ns timestamp on our clock
+        return remote_ns - self.offset_ns
+
+    @property
+    def one_way_ms(self):
+        return self.rtt_ms / 2 if self.rtt_ms is not None else 0
+
+    @property
+    def silent_ms(self):
+        # How long the peer has been quiet; 0 until it has been heard from at all
+        return (time.perf_counter_ns() - self.last_heard_ns) / 1e6 if self.last_heard_ns else 0
+
+    def stats(self):
+        return {"rtt_ms": round(self.rtt_ms or 0, 1), "sent": self.sent, "resent": self.resent,
+                "dropped": self.dropped, "unacked": len(self.unacked)}
+
+    def close(self):
+        if self.loop is None or not self.thread.is_alive():
+            return
+        def shutdown():
+            if self.remote is not None:
+                self.transport.sendto(HEADER.pack(MAGIC, PROTOCOL_VERSION, BYE, self.received), self.remote)
+            self.stopping.set()
+        self.loop.call_soon_threadsafe(shutdown)
+        self.thread.join(1)
+
+
+def loopback_pair(latency_ms=0, jitter_ms=0, loss=0.0, seed=0):
+    # Two sessions on 127.0.0.1, both sending through the same simulated network
+    host = NetSession(("127.0.0.1", 0), latency_ms=latency_ms, jitter_ms=jitter_ms, loss=loss, seed=seed).start()
+    guest = NetSession(("127.0.0.1", 0), remote=host.address, latency_ms=latency_ms, jitter_ms=jitter_ms,
+                       loss=loss, seed=seed + 1).start()
+    return host, guest
+
+
+# --- Loopback opponent ---
+# Stands in for the second player: a bot on its own session that joins every
+# round it is sent and plays it in real time, sending its presses and
+# judgements the way the game does.
+class BotPeer:
+    def __init__(self, session, make_sim, bot_options=None):
+        self.session = session
+        self.make_sim = make_sim  # windows -> a GameSimulation with the game's geometry
+        self.bot_options = bot_options or {}
+        self.sim = None
+        self.playing = False
+        self.stopping = False
+        self.thread = threading.Thread(target=self._run, name="bot peer", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        # Ends the round being played (sending its END) and the thread
+        self.stopping = True
+        self.thread.join(1)
+
+    def _run(self):
+        while not self.stopping:
+            for event in self.session.poll():
+                if event[0] == "start":
+                    self._begin(*event[1:])
+            wait_ms = self._play() if self.playing else 5
+            time.sleep(max(wait_ms, 0.5) / 1000)
+        if self.playing:
+            self._step_to((time.perf_counter_ns() - self.start_ns) / 1e6)
+            self._end()
+
+    def _begin(self, seed, difficulty, lead_ms, windows, received_ns):
+        self.sim = self.make_sim(windows)
+        self.sim.reset(difficulty, None, seed=seed)
+        self.press, self.lanes = Bot(seed=seed, **self.bot_options).plan(
+            self.sim.chart, self.sim.lookahead_ms, self.sim.chart.duration_ms)
+        self.press, self.lanes = self.press.tolist(), self.lanes.tolist()
+        self.pos = 0
+        # Our song starts with theirs: the START spent about half a round trip on the way
+        self.start_ns = received_ns + int((lead_ms - self.session.one_way_ms) * 1e6)
+        self.session.send_start(seed, difficulty, (self.start_ns - time.perf_counter_ns()) / 1e6, windows)
+        self.playing = True
+
+    def _step_to(self, time_ms):
+        sim = self.sim
+        while sim.time_ms + STEP_MS <= time_ms and not sim.game_over:
+            sim.step()
+
+    def _play(self):
+        # Presses everything due by now; returns ms until the next press
+        sim = self.sim
+        song_ms = (time.perf_counter_ns() - self.start_ns) / 1e6
+        while self.pos < len(self.press) and self.press[self.pos] <= song_ms and not sim.game_over:
+            press_ms, lane = self.press[self.pos], self.lanes[self.pos]
+            self._step_to(press_ms)  # on the step a live game would be on at press_ms
+            if sim.game_over:
+                break
+            judgement = sim.press(lane, press_ms)
+            step, time_ms, lane = sim.inputs[-1]
+            self.session.send_input(step, time_ms, lane, judgement, time.perf_counter_ns())
+            self.pos += 1
+        self._step_to(song_ms)
+        if sim.game_over or self.pos >= len(self.press):
+            self._end()
+            return 5
+        return self.press[self.pos] - song_ms
+
+    def _end(self):
+        self.session.send_end(self.sim.time_ms, self.sim.score)
+        self.playing = False
+
+
+def open_versus(spec, make_sim):
+    # FUNKIN_VERSUS: loopback[:latency[:jitter[:loss %]]], listen:PORT or HOST:PORT.
+    # Returns (session, bot peer or None)
+    kind, _, rest = spec.partition(":")
+    if kind == "loopback":
+        latency, jitter, loss = ([float(x) for x in rest.split(":")] + [0, 0, 0])[:3] if rest else (0, 0, 0)
+        session, guest = loopback_pair(latency, jitter, loss / 100)
+        return session, BotPeer(guest, make_sim).start()
+    if kind == "listen":
+        return NetSession(("0.0.0.0", int(rest))).start(), None
+    return NetSession(remote=(kind, int(rest))).start(), None
+
+
+def percentiles(values, points=(50, 95, 99)):
+    if not len(values):
+        return dict.fromkeys(points, 0.0)
+    return dict(zip(points, np.percentile(values, points).round(1).tolist()))
+
+
+# --- Command line ---
+def main(argv=None):
+    from rollback import RollbackSim
+    from simulation import ARROW_SIZE, HIT_Y, LANE_X, PLAYFIELD_HEIGHT, GameSimulation
+
+    parser = argparse.ArgumentParser(description="Measure versus play against a bot over a simulated network")
+    parser.add_argument("--latency", type=float, default=60, help="one-way delay, ms")
+    parser.add_argument("--jitter", type=float, default=15, help="delay varies by up to this much, ms")
+    parser.add_argument("--loss", type=float, default=1, help="packets lost, %%")
+    parser.add_argument("--seconds", type=float, default=30, help="song time to play")
+    parser.add_argument("--difficulty", default="Hard", choices=["Easy", "Normal", "Hard"])
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--fps", type=int, default=60)
+    args = parser.parse_args(argv)
+
+    def make_sim(windows=WINDOWS_MS):
+        return GameSimulation(LANE_X, ARROW_SIZE, PLAYFIELD_HEIGHT, HIT_Y, windows=windows)
+
+    session, guest = loopback_pair(args.latency, args.jitter, args.loss / 100, args.seed)
+    peer = BotPeer(guest, make_sim).start()
+    opponent = RollbackSim(make_sim())
+    lead_ms = 500
+    song_start = time.perf_counter_ns() + lead_ms * 1_000_000
+    session.send_start(args.seed, args.difficulty, lead_ms, WINDOWS_MS)
+
+    # A stand-in frame loop: take what arrived, roll the opponent forward, "present"
+    frame_ns = 1_000_000_000 // args.fps
+    latencies, frame_work = [], []
+    shown = []
+    end_ms = None
+    deadline = song_start + int((args.seconds + 5) * 1e9)
+    next_frame = time.perf_counter_ns()
+    while time.perf_counter_ns() < deadline:
+        work = time.perf_counter_ns()
+        song_ms = (work - song_start) / 1e6
+        for event in session.poll():
+            if event[0] == "start":
+                opponent.reset(event[2], event[1], event[4])
+            elif event[0] == "input":
+                opponent.add(*event[1:5])
+                shown.append(session.local_ns(event[5]))
+            elif event[0] == "end":
+                opponent.finish(event[1])
+                end_ms = event[1]
+        opponent.advance(song_ms)
+        present = time.perf_counter_ns()
+        frame_work.append((present - work) / 1e6)
+        latencies += [(present - pressed) / 1e6 for pressed in shown]
+        shown.clear()
+        if song_ms >= args.seconds * 1000 and peer.playing:
+            peer.stop()
+        if end_ms is not None and opponent.sim.time_ms + STEP_MS > end_ms and not opponent.rollback_to:
+            break
+        if session.silent_ms > PEER_TIMEOUT_MS:
+            print(f"peer silent for {session.silent_ms / 1000:.1f} s, giving up")
+            break
+        next_frame += frame_ns
+        time.sleep(max(0, next_frame - time.perf_counter_ns()) / 1e9)
+    peer.stop()
+
+    mine, theirs = opponent.sim, peer.sim
+    fields = ("time_ms", "score", "health", "misses")
+    match = all(getattr(mine, f) == getattr(theirs, f) for f in fields) and mine.stats.counts == theirs.stats.counts
+    print(f"link: {args.latency:.0f} ms +- {args.jitter:.0f} ms, {args.loss:.1f}% loss; "
+          f"network {session.stats()}")
+    print(f"opponent: {len(opponent.inputs)} presses, {opponent.stats()}")
+    print(f"input-to-display ms: {percentiles(latencies)}")
+    print(f"frame work ms: {percentiles(frame_work)}")
+    print("rebuilt run " + ("matches" if match else "DIFFERS from") + " the bot's own: " +
+          ", ".join(f"{f} {getattr(mine, f)}/{getattr(theirs, f)}" for f in fields))
+    session.close()
+    guest.close()
+    return 0 if match else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+import numpy as np
+import pygame
+
+ALPHA_LEVELS = 16  # sprites are cached per radius at this many alpha levels
+
+
+# --- Particle system ---
+# Particle state lives in NumPy arrays and is updated in bulk; drawing goes
+# through one Surface.blits call using pre-rendered circle sprites.
+class ParticleSystem:
+    def __init__(self, color, capacity=256, gravity=0.0):
+        self.color = tuple(color[:3])
+        self.gravity = gravity  # px/s^2, added to vy
+        self.count = 0
+        self.sprites = {}
+        self.built = 0  # sprites created, for the allocation counters
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        old = self.count
+        fields = {}
+        for name in ("x", "y", "vx", "vy", "alpha", "fade"):
+            arr = np.zeros(capacity, dtype=np.float32)
+            if old:
+                arr[:old] = getattr(self, name)[:old]
+            fields[name] = arr
+        radius = np.zeros(capacity, dtype=np.int32)
+        if old:
+            radius[:old] = self.radius[:old]
+        for name, arr in fields.items():
+            setattr(self, name, arr)
+        self.radius = radius
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.count = 0
+
+    def emit(self, x, y, radius, alpha=255, vx=0, vy=0, fade=180):
+        # Scalars or arrays; everything is broadcast to the same length.
+        # fade is alpha lost per second, velocities are px/s.
+        x, y, radius, alpha, vx, vy, fade = np.broadcast_arrays(x, y, radius, alpha, vx, vy, fade)
+        n = x.size
+        if self.count + n > len(self.x):
+            self._allocate(max(2 * len(self.x), self.count + n))
+        s = slice(self.count, self.count + n)
+        self.x[s] = x.ravel()
+        self.y[s] = y.ravel()
+        self.radius[s] = radius.ravel()
+        self.alpha[s] = alpha.ravel()
+        self.vx[s] = vx.ravel()
+        self.vy[s] = vy.ravel()
+        self.fade[s] = fade.ravel()
+        self.count += n
+
+    def update(self, dt_ms):
+        n = self.count
+        if not n:
+            return
+        dt = dt_ms / 1000
+        if self.gravity:
+            self.vy[:n] += self.gravity * dt
+        self.x[:n] += self.vx[:n] * dt
+        self.y[:n] += self.vy[:n] * dt
+        self.alpha[:n] -= self.fade[:n] * dt
+
+        # Compact the live particles to the front instead of removing one by one
+        alive = self.alpha[:n] > 0
+        live = int(alive.sum())
+        if live != n:
+            for arr in (self.x, self.y, self.vx, self.vy, self.alpha, self.fade, self.radius):
+                arr[:live] = arr[:n][alive]
+            self.count = live
+
+    def _sprite(self, key):
+        radius, level = divmod(key, ALPHA_LEVELS)
+        alpha = (level + 1) * 256 // ALPHA_LEVELS - 1
+        surf = pygame.Surface((radius * 2, radius * 2), pygame.SRCALPHA)
+        pygame.draw.circle(surf, (*self.color, alpha), (radius, radius), radius)
+        self.sprites[key] = surf
+        self.built += 1
+        return surf
+
+    def draw(self, surface):
+        n = self.count
+        if not n:
+            return
+        radius = self.radius[:n]
+        levels = np.clip(self.alpha[:n] * ALPHA_LEVELS // 256, 0, ALPHA_LEVELS - 1).astype(np.int32)
+        keys = (radius * ALPHA_LEVELS + levels).tolist()
+        xs = (self.x[:n] - radius).astype(np.int32).tolist()
+        ys = (self.y[:n] - radius).astype(np.int32).tolist()
+
+        sprites = self.sprites
+        for key in set(keys) - sprites.keys():
+            self._sprite(key)
+        surface.blits([(sprites[k], (x, y)) for k, x, y in zip(keys, xs, ys)], doreturn=False)
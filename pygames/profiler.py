@@ -0,0 +1,137 @@
+import json
+import time
+from collections import deque
+
+import pygame
+
+# Main loop stages, in the order they run
+STAGES = ("events", "update", "draw", "hud", "present", "idle")
+STAGE_COLORS = {
+    "events": (120, 200, 255),
+    "update": (255, 200, 80),
+    "draw": (140, 255, 140),
+    "hud": (255, 140, 220),
+    "present": (255, 110, 90),
+    "idle": (110, 110, 110),
+}
+PANEL_SIZE = (260, 190)
+TEXT_REFRESH_MS = 250
+
+
+def _noop(*args):
+    pass
+
+
+# --- Frame profiler ---
+# Times each stage of the main loop with perf_counter_ns. Shows a rolling
+# overlay and/or streams one sample per frame to a .csv or .jsonl file.
+# While both are off, begin_frame/mark/end_frame are no-op functions.
+class FrameProfiler:
+    def __init__(self, history=240):
+        self.history = history
+        self.samples = deque(maxlen=history)  # (total_ns, {stage: ns})
+        self.overlay = False
+        self.log = None
+        self.log_format = None
+        self.frame = 0
+        self.panel = None
+        self.font = None
+        self.text_lines = []
+        self.text_time = 0
+        self._refresh_enabled()
+
+    # --- Switching on and off ---
+    def _refresh_enabled(self):
+        self.enabled = self.overlay or self.log is not None
+        if self.enabled:
+            # Drop the instance-level no-ops so the real methods are found again
+            for name in ("begin_frame", "mark", "end_frame"):
+                self.__dict__.pop(name, None)
+            # Switched on mid-frame (F2): time the rest of this frame
+            self.begin_frame()
+        else:
+            self.begin_frame = self.mark = self.end_frame = _noop
+
+    def toggle_overlay(self):
+        self.overlay = not self.overlay
+        self._refresh_enabled()
+
+    def open_log(self, path):
+        self.log_format = "jsonl" if path.endswith(".jsonl") else "csv"
+        self.log = open(path, "w", buffering=1 << 16)
+        if self.log_format == "csv":
+            self.log.write(",".join(("frame", "total_us") + tuple(f"{s}_us" for s in STAGES)) + "\n")
+        self._refresh_enabled()
+
+    def close(self):
+        if self.log:
+            self.log.close()
+            self.log = None
+        self._refresh_enabled()
+
+    # --- Timing ---
+    def begin_frame(self):
+        self.start = self.last = time.perf_counter_ns()
+        self.current = dict.fromkeys(STAGES, 0)
+
+    def mark(self, stage):
+        # Charge the time since the previous mark to this stage
+        t = time.perf_counter_ns()
+        self.current[stage] += t - self.last
+        self.last = t
+
+    def end_frame(self):
+        total = self.last - self.start
+        self.samples.append((total, self.current))
+        self.frame += 1
+        if self.log:
+            stages = self.current
+            if self.log_format == "csv":
+                values = [self.frame, total // 1000] + [stages[s] // 1000 for s in STAGES]
+                self.log.write(",".join(map(str, values)) + "\n")
+            else:
+                record = {"frame": self.frame, "total_us": total // 1000}
+                record.update((f"{s}_us", stages[s] // 1000) for s in STAGES)
+                self.log.write(json.dumps(record) + "\n")
+
+    def averages(self):
+        if not self.samples:
+            return 0, {}
+        n = len(self.samples)
+        total = sum(t for t, _ in self.samples) / n / 1e6
+        stages = {s: sum(st[s] for _, st in self.samples) / n / 1e6 for s in STAGES}
+        return total, stages
+
+    # --- Overlay ---
+    def draw(self, renderer):
+        if not self.overlay:
+            return
+        if self.panel is None:
+            self.panel = pygame.Surface(PANEL_SIZE, pygame.SRCALPHA)
+            self.font = pygame.font.SysFont("Consolas,Courier New,monospace", 14)
+        panel = self.panel
+        panel.fill((0, 0, 0, 180))
+        w, h = PANEL_SIZE
+
+        # Rolling frame time graph, 33ms full scale, with a 16.7ms guide line
+        graph_h = 60
+        scale = graph_h / 33.3
+        guide_y = graph_h - int(16.7 * scale)
+        pygame.draw.line(panel, (90, 90, 90), (0, guide_y), (w, guide_y))
+        if len(self.samples) > 1:
+            step = w / (self.history - 1)
+            points = [(i * step, graph_h - min(graph_h, total / 1e6 * scale))
+                      for i, (total, _) in enumerate(self.samples)]
+            pygame.draw.lines(panel, (255, 255, 255), False, points)
+
+        now = pygame.time.get_ticks()
+        if now - self.text_time > TEXT_REFRESH_MS:
+            self.text_time = now
+            total, stages = self.averages()
+            self.text_lines = [self.font.render(f"frame {total:6.2f} ms", True, (255, 255, 255))]
+            self.text_lines += [self.font.render(f"{s:8} {stages.get(s, 0):6.2f} ms", True, STAGE_COLORS[s])
+                                for s in STAGES]
+        for i, line in enumerate(self.text_lines):
+            panel.blit(line, (6, graph_h + 6 + i * 17))
+
+        renderer.blit(panel, (renderer.screen.get_width() - w - 10, 10), volatile=True, native=True)
@@ -0,0 +1,181 @@
+import pygame
+
+from viewport import rescale, scaled_size
+
+# Past these limits a partial update costs more than a full flip
+MAX_DIRTY_RECTS = 64
+MAX_DIRTY_AREA = 0.6
+
+
+# --- Renderer ---
+# Collects the frame's draw calls and presents them either as a full redraw
+# (background + everything, then flip) or, in dirty mode, by diffing against
+# the previous frame: only regions whose contents changed are restored from
+# the background, redrawn and pushed with display.update(rects). Either way
+# consecutive blits reach the screen as one Surface.blits call.
+#
+# Drawing code works in logical units. With a viewport (viewport.py) items
+# are mapped to canvas pixels as they are recorded: positions are multiplied
+# by the viewport scale and surfaces swapped for their scaled copies.
+class Renderer:
+    def __init__(self, screen, dirty=False, view=None, scaler=None):
+        self.view = view
+        self.scaler = scaler
+        self.screen = view.canvas if view else screen
+        self.scale = view.scale if view else 1
+        self.dirty = dirty
+        self.background = None
+        self.prev_background = None
+        self.items = []
+        self.prev_items = []
+        self.prev_rects = []
+        self.full_redraw = True
+        self.stats = {"frames": 0, "full": 0, "partial": 0, "idle": 0, "pixels": 0, "blits": 0, "rescaled": 0}
+
+    def set_dirty(self, dirty):
+        self.dirty = dirty
+        self.full_redraw = True
+
+    def toggle(self):
+        self.set_dirty(not self.dirty)
+
+    def view_changed(self):
+        # The window was resized, went fullscreen or changed render scale
+        self.screen = self.view.canvas
+        self.scale = self.view.scale
+        self.full_redraw = True
+
+    # --- Recording ---
+    def begin(self, background=None):
+        self.items = []
+        if background is not None:
+            self.set_background(background)
+
+    def set_background(self, background):
+        if background is not None and self.scale != 1:
+            background = self.scaler.get(background, self.scale)
+        self.background = background
+
+    def blit(self, surf, dest, volatile=False, native=False):
+        # volatile: the surface is redrawn in place every frame, so never treat it as unchanged
+        # native: surf and dest are already in canvas pixels (snapshots, debug overlays)
+        if isinstance(dest, pygame.Rect):
+            dest = dest.topleft
+        stamp = self.stats["frames"] + 1 if volatile else 0
+        alpha = surf.get_alpha()
+        if self.scale != 1 and not native:
+            s = self.scale
+            # A volatile surface changes in place, so its scaled copy cannot be cached
+            if volatile:
+                surf = rescale(surf, scaled_size(surf.get_size(), s))
+                self.stats["rescaled"] += 1
+            else:
+                surf = self.scaler.get(surf, s)
+            dest = (dest[0] * s, dest[1] * s)
+        self.items.append((surf, (int(dest[0]), int(dest[1])), alpha, stamp))
+
+    def blits(self, blit_sequence, doreturn=False):
+        # Same call shape as Surface.blits so drawing code can target either;
+        # records the whole batch without a Python call per sprite
+        if self.scale == 1:
+            self.items.extend([(surf, (int(dest[0]), int(dest[1])), surf.get_alpha(), 0)
+                               for surf, dest in blit_sequence])
+            return
+        s = self.scale
+        get = self.scaler.get
+        self.items.extend([(get(surf, s), (int(dest[0] * s), int(dest[1] * s)), surf.get_alpha(), 0)
+                           for surf, dest in blit_sequence])
+
+    def rect(self, color, rect, border_radius=0, width=0):
+        if self.scale != 1:
+            s = self.scale
+            rect = pygame.Rect(rect)
+            rect = (int(rect.x * s), int(rect.y * s), round(rect.width * s), round(rect.height * s))
+            border_radius = round(border_radius * s)
+            width = max(1, round(width * s)) if width else 0
+        self.items.append((None, tuple(rect), (tuple(color), border_radius, width), 0))
+
+    # --- Presenting ---
+    def _item_rect(self, item):
+        surf, dest, extra, stamp = item
+        if surf is None:
+            return pygame.Rect(dest)
+        return pygame.Rect(dest, surf.get_size())
+
+    def _draw(self, items):
+        # Runs of blits go out in one Surface.blits call; a rect or an alpha change ends a run
+        screen = self.screen
+        batch = []
+        for surf, dest, extra, stamp in items:
+            if surf is None:
+                if batch:
+                    screen.blits(batch, doreturn=False)
+                    batch = []
+                color, radius, width = extra
+                pygame.draw.rect(screen, color, dest, width, border_radius=radius)
+                continue
+            # Pooled surfaces can be reused with different alphas in one frame
+            if surf.get_alpha() != extra:
+                if batch:
+                    screen.blits(batch, doreturn=False)
+                    batch = []
+                surf.set_alpha(extra)
+            batch.append((surf, dest))
+        if batch:
+            screen.blits(batch, doreturn=False)
+        self.stats["blits"] += len(items)
+
+    def _changed_rects(self, rects):
+        current = set(self.items)
+        previous = set(self.prev_items)
+        changed = [rect for item, rect in zip(self.items, rects) if item not in previous]
+        changed += [rect for item, rect in zip(self.prev_items, self.prev_rects) if item not in current]
+        # Drawing order changes without content changes are not detected (nothing does that yet)
+        bounds = self.screen.get_rect()
+        return [r for r in (rect.clip(bounds) for rect in changed) if r.width and r.height]
+
+    def _update(self, rects):
+        if self.view:
+            self.view.present(rects)
+        elif rects is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(rects)
+
+    def present(self):
+        stats = self.stats
+        stats["frames"] += 1
+        # Only the dirty mode diffs rects; switching to it starts with a full redraw anyway
+        rects = [self._item_rect(item) for item in self.items] if self.dirty else []
+        full = not self.dirty or self.full_redraw or self.background is not self.prev_background
+
+        if not full:
+            dirty = self._changed_rects(rects)
+            area = sum(r.width * r.height for r in dirty)
+            screen_area = self.screen.get_width() * self.screen.get_height()
+            if len(dirty) > MAX_DIRTY_RECTS or area > MAX_DIRTY_AREA * screen_area:
+                full = True
+            elif not dirty:
+                stats["idle"] += 1
+            else:
+                for region in dirty:
+                    self.screen.set_clip(region)
+                    self.screen.blit(self.background, region, region)
+                    self._draw([item for item, rect in zip(self.items, rects) if rect.colliderect(region)])
+                self.screen.set_clip(None)
+                self._update(dirty)
+                stats["partial"] += 1
+                stats["pixels"] += area
+
+        if full:
+            if self.background is not None:
+                self.screen.blit(self.background, (0, 0))
+            self._draw(self.items)
+            self._update(None)
+            self.full_redraw = False
+            stats["full"] += 1
+            stats["pixels"] += self.screen.get_width() * self.screen.get_height()
+
+        self.prev_items = self.items
+        self.prev_rects = rects
+        self.prev_background = self.background
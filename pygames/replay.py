@@ -0,0 +1,216 @@
+"""Replays: a run's seed, settings and key presses, re-simulated on demand.
+
+The simulation only changes state in fixed steps and on presses, so a run is
+fully described by the chart seed (or chart file), the judgement windows and
+every press as (step time, press time, lane). Replaying feeds the presses back
+at the same steps and must end on the same score, health and misses.
+
+    header | difficulty | chart path | presses (int32 step ms, float64 press ms, uint8 lane)
+
+    python replay.py info replays/run.fnfr
+    python replay.py verify replays/*.fnfr --jobs 4
+    python replay.py verify --jobs 4    # every replay the game recorded
+"""
+import argparse
+import glob
+import os
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from charts import LANES, load_chart
+from judge import JUDGEMENTS
+from simulation import MAX_CATCHUP_MS, STEP_MS, GameSimulation
+
+# Where the game records runs, unless FUNKIN_REPLAYS says otherwise
+REPLAYS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "replays")
+FORMAT_VERSION = 1
+MAGIC = b"FNFR"
+# magic, version, seed, windows, lane x positions, arrow size, height, hit y,
+# end time, score, health, misses, presses, difficulty length, chart path length
+HEADER = struct.Struct(f"<4sHxxQ{len(JUDGEMENTS)}H{LANES}HHHHxxiiiiIHH")
+INPUT_DTYPE = np.dtype([("step", "<i4"), ("time", "<f8"), ("lane", "u1")])  # 13 bytes per press
+
+
+# --- Data model ---
+class Replay:
+    def __init__(self, seed, difficulty, windows, geometry, inputs, result, chart_path=""):
+        self.seed = seed
+        self.difficulty = difficulty
+        self.windows = windows
+        self.lanes, self.arrow_size, self.height, self.hit_y = geometry
+        self.inputs = inputs  # structured array of INPUT_DTYPE in press order
+        self.end_ms, self.score, self.health, self.misses = result
+        self.chart_path = chart_path
+
+    @classmethod
+    def from_sim(cls, sim, chart_path=""):
+        inputs = np.array(sim.inputs, dtype=INPUT_DTYPE)
+        geometry = (list(sim.lanes), sim.arrow_size, sim.height, sim.hit_y)
+        result = (sim.time_ms, sim.score, sim.health, sim.misses)
+        return cls(sim.seed, sim.difficulty, dict(sim.windows), geometry, inputs, result, chart_path)
+
+    def __len__(self):
+        return len(self.inputs)
+
+    def make_sim(self):
+        sim = GameSimulation(self.lanes, self.arrow_size, self.height, self.hit_y, windows=self.windows)
+        chart = load_chart(self.chart_path) if self.chart_path else None
+        sim.reset(self.difficulty, chart, seed=self.seed)
+        return sim
+
+    def result(self):
+        return {"time_ms": self.end_ms, "score": self.score, "health": self.health, "misses": self.misses}
+
+
+# --- Playback ---
+class ReplayPlayer:
+    # Drives a simulation from the recorded presses instead of live input
+    def __init__(self, replay, sim=None):
+        self.replay = replay
+        self.sim = sim or replay.make_sim()
+        self.steps = replay.inputs["step"].tolist()
+        self.times = replay.inputs["time"].tolist()
+        self.lanes = replay.inputs["lane"].tolist()
+        self.pos = 0
+
+    def done(self):
+        return self.sim.game_over or (self.pos >= len(self.steps) and self.sim.time_ms >= self.replay.end_ms)
+
+    def press_due(self):
+        # Presses made on the current step; returns (lane, judgement) pairs
+        sim = self.sim
+        pressed = []
+        while self.pos < len(self.steps) and self.steps[self.pos] <= sim.time_ms:
+            lane = self.lanes[self.pos]
+            pressed.append((lane, sim.press(lane, self.times[self.pos])))
+            self.pos += 1
+        return pressed
+
+    def advance_to(self, clock_ms):
+        # Visual playback: like sim.advance_to, applying presses between steps
+        sim = self.sim
+        sim.accumulator += min(max(0, clock_ms - sim.now()), MAX_CATCHUP_MS)
+        pressed = self.press_due()
+        while sim.accumulator >= STEP_MS and not self.done():
+            sim.accumulator -= STEP_MS
+            sim.step()
+            pressed += self.press_due()
+        return pressed
+
+    def run(self):
+        # Headless fast-forward to the end of the recording
+        sim = self.sim
+        end_ms = self.replay.end_ms
+        for step, time_ms, lane in zip(self.steps, self.times, self.lanes):
+            while sim.time_ms < step and not sim.game_over:
+                sim.step()
+            sim.press(lane, time_ms)
+        while sim.time_ms < end_ms and not sim.game_over:
+            sim.step()
+        self.pos = len(self.steps)
+        return sim
+
+    def mismatches(self):
+        # Recorded values the re-simulation did not reproduce, as name -> (recorded, replayed)
+        sim = self.sim
+        replayed = {"time_ms": sim.time_ms, "score": sim.score, "health": sim.health, "misses": sim.misses}
+        return {k: (v, replayed[k]) for k, v in self.replay.result().items() if replayed[k] != v}
+
+
+# --- File format ---
+def save_replay(replay, path):
+    difficulty = (replay.difficulty or "").encode()
+    chart_path = replay.chart_path.encode()
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, replay.seed,
+                         *(replay.windows[name] for name in JUDGEMENTS),
+                         *replay.lanes, replay.arrow_size, replay.height, replay.hit_y,
+                         replay.end_ms, replay.score, replay.health, replay.misses,
+                         len(replay), len(difficulty), len(chart_path))
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        f.write(difficulty)
+        f.write(chart_path)
+        f.write(np.asarray(replay.inputs, dtype=INPUT_DTYPE).tobytes())
+    os.replace(tmp, path)
+
+
+def load_replay(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    fields = HEADER.unpack_from(data)
+    magic, version, seed = fields[:3]
+    if magic != MAGIC:
+        raise ValueError(f"{path}: not a replay")
+    if version > FORMAT_VERSION:
+        raise ValueError(f"{path}: replay version {version} is newer than supported")
+    n = len(JUDGEMENTS)
+    windows = dict(zip(JUDGEMENTS, fields[3:3 + n]))
+    lanes = list(fields[3 + n:3 + n + LANES])
+    arrow_size, height, hit_y, end_ms, score, health, misses, count, diff_len, chart_len = fields[3 + n + LANES:]
+    pos = HEADER.size
+    difficulty = data[pos:pos + diff_len].decode() or None
+    pos += diff_len
+    chart_path = data[pos:pos + chart_len].decode()
+    pos += chart_len
+    inputs = np.frombuffer(data, dtype=INPUT_DTYPE, count=count, offset=pos)
+    return Replay(seed, difficulty, windows, (lanes, arrow_size, height, hit_y), inputs,
+                  (end_ms, score, health, misses), chart_path)
+
+
+# --- Batch verification ---
+def verify(path):
+    # Re-simulate one replay; returns (path, mismatches, simulated ms, wall seconds)
+    start = time.perf_counter()
+    player = ReplayPlayer(load_replay(path))
+    player.run()
+    return path, player.mismatches(), player.sim.time_ms, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect and verify recorded replays")
+    sub = parser.add_subparsers(dest="command", required=True)
+    info = sub.add_parser("info", help="print a replay summary")
+    info.add_argument("path")
+    check = sub.add_parser("verify", help="re-simulate replays headless and compare the results")
+    check.add_argument("paths", nargs="*", help="default: every replay the game recorded")
+    check.add_argument("--jobs", type=int, default=1, help="worker processes")
+    args = parser.parse_args(argv)
+
+    if args.command == "info":
+        r = load_replay(args.path)
+        source = r.chart_path or f"generated, seed {r.seed}"
+        print(f"{r.difficulty}: {len(r)} presses over {r.end_ms / 1000:.1f} s ({source})")
+        print(f"score {r.score}, health {r.health}, misses {r.misses}, windows {r.windows}")
+        return 0
+
+    if not args.paths:
+        replays_dir = os.environ.get("FUNKIN_REPLAYS") or REPLAYS_DIR
+        args.paths = sorted(glob.glob(os.path.join(replays_dir, "*.fnfr")))
+        if not args.paths:
+            parser.error(f"no replays in {replays_dir}")
+    start = time.perf_counter()
+    if args.jobs > 1:
+        with ProcessPoolExecutor(args.jobs) as pool:
+            results = list(pool.map(verify, args.paths, chunksize=8))
+    else:
+        results = [verify(path) for path in args.paths]
+    elapsed = time.perf_counter() - start
+    failed = 0
+    for path, mismatches, sim_ms, seconds in results:
+        if mismatches:
+            failed += 1
+            detail = ", ".join(f"{k} recorded {a}, replayed {b}" for k, (a, b) in mismatches.items())
+            print(f"MISMATCH {path}: {detail}")
+    simulated = sum(r[2] for r in results) / 1000
+    print(f"{len(results) - failed}/{len(results)} replays match; "
+          f"{simulated:.0f} s of play re-simulated in {elapsed:.2f} s ({simulated / max(elapsed, 1e-9):.0f}x)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+from collections import deque
+
+from simulation import STEP_MS
+
+SNAPSHOT_MS = 50         # a snapshot every 5 steps; a rollback re-simulates at most that much extra
+ROLLBACK_WINDOW_MS = 2000  # inputs later than this are applied late instead of rolled back
+
+
+# --- Rollback ---
+# The opponent's game, simulated here from their inputs. It runs on the local
+# song time and predicts that they press nothing. When their inputs arrive
+# (late, by the network delay) it goes back to the last snapshot before them
+# and simulates forward again with them in place. Inputs carry the step they
+# were made on, as in a replay, so the result is exactly the opponent's own
+# simulation once their inputs are in; remote lag only delays the correction,
+# never the local frame.
+class RollbackSim:
+    def __init__(self, sim, window_ms=ROLLBACK_WINDOW_MS):
+        self.sim = sim
+        self.window_ms = window_ms
+        self.active = False  # a round has started
+        self.rollbacks = 0
+        self.max_rollback_ms = 0
+        self.late = 0        # inputs older than the window
+        self.desyncs = 0     # presses judged differently here than by the opponent
+        self.reset_round()
+
+    def reset_round(self):
+        self.inputs = []     # (step ms, press ms, lane), in the order they were made
+        self.expected = []   # the opponent's judgement of each (None: no note was close)
+        self.applied = 0     # inputs already pressed in sim
+        self.checked = 0     # inputs whose judgement was compared (on their first run)
+        self.snapshots = deque()  # (time ms, sim state, applied), oldest first
+        self.rollback_to = None
+        self.end_ms = None   # when the opponent's run ended, once they say so
+        self.quit = None     # why the opponent stopped playing ("left", "offline"), if they did
+
+    def reset(self, difficulty, seed, windows):
+        self.sim.windows = dict(windows)
+        self.sim.reset(difficulty, None, seed=seed)
+        self.reset_round()
+        self.active = True
+        self.snapshot()
+
+    def snapshot(self):
+        self.snapshots.append((self.sim.time_ms, self.sim.snapshot(), self.applied))
+
+    # --- Opponent input ---
+    def add(self, step, time_ms, lane, judgement=None):
+        self.inputs.append((step, time_ms, lane))
+        self.expected.append(judgement)
+        if step < self.sim.time_ms and (self.rollback_to is None or step < self.rollback_to):
+            self.rollback_to = step
+
+    def finish(self, time_ms):
+        # The opponent's run is over at time_ms; nothing is predicted past it
+        self.end_ms = time_ms
+        if time_ms < self.sim.time_ms and (self.rollback_to is None or time_ms < self.rollback_to):
+            self.rollback_to = time_ms
+
+    # --- Per frame ---
+    def advance(self, clock_ms):
+        if not self.active:
+            return
+        if self.rollback_to is not None:
+            self._rollback(self.rollback_to)
+            self.rollback_to = None
+        self._run_to(clock_ms if self.end_ms is None else min(clock_ms, self.end_ms))
+        # Snapshots older than the window are never needed again
+        while len(self.snapshots) > 1 and self.snapshots[1][0] <= self.sim.time_ms - self.window_ms:
+            self.snapshots.popleft()
+
+    def _rollback(self, step):
+        snapshots = self.snapshots
+        while len(snapshots) > 1 and snapshots[-1][0] > step:
+            snapshots.pop()
+        time_ms, state, applied = snapshots[-1]
+        if time_ms > step:
+            self.late += 1  # older than the oldest snapshot: pressed as soon as it can be
+        self.rollbacks += 1
+        self.max_rollback_ms = max(self.max_rollback_ms, self.sim.time_ms - time_ms)
+        self.sim.restore(state)
+        self.applied = applied
+
+    def _run_to(self, clock_ms):
+        sim = self.sim
+        inputs = self.inputs
+        while True:
+            # Presses made on this step, before stepping on, as ReplayPlayer does
+            while self.applied < len(inputs) and inputs[self.applied][0] <= sim.time_ms:
+                step, time_ms, lane = inputs[self.applied]
+                judgement = sim.press(lane, time_ms)
+                if self.applied == self.checked:
+                    self.desyncs += judgement != self.expected[self.applied]
+                    self.checked += 1
+                self.applied += 1
+            if sim.game_over or sim.time_ms + STEP_MS > clock_ms:
+                break
+            sim.step()
+            if sim.time_ms % SNAPSHOT_MS == 0:
+                self.snapshot()
+
+    def stats(self):
+        return {"rollbacks": self.rollbacks, "max_rollback_ms": self.max_rollback_ms,
+                "late": self.late, "desyncs": self.desyncs}
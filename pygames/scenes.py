@@ -0,0 +1,124 @@
+import time
+from collections import Counter
+
+import pygame
+
+from loader import asset_bytes
+
+MB = 1024 * 1024
+
+
+# --- Scenes ---
+# A scene lists the assets it draws with, owns the buttons that get its mouse
+# events and handles the rest of its input itself. The manager keeps a
+# reference count per asset: entering a scene takes references on its assets,
+# leaving drops them. Assets nobody references stay cached until the resident
+# total goes over the memory budget, then the least recently used are unloaded.
+class Scene:
+    def __init__(self, name, assets=(), ui=None, draw=None, handle=None, enter=None, leave=None, preload=()):
+        self.name = name
+        self.assets = list(assets)
+        self.ui = ui
+        self.draw = draw
+        self.handle = handle
+        self.enter = enter
+        self.leave = leave
+        self.preload = preload  # scenes that usually come next; loaded in the background on enter
+
+
+class SceneManager:
+    def __init__(self, loader, budget_bytes, mouse_pos=pygame.mouse.get_pos):
+        self.loader = loader
+        self.mouse_pos = mouse_pos  # in the same (logical) units as the buttons
+        self.budget = budget_bytes
+        self.scenes = {}
+        self.current = None
+        self.refs = Counter()  # asset name -> scenes (or keep()) holding it
+        self.last_used = {}    # asset name -> when its last reference was dropped
+        self.evicted = 0
+
+    @property
+    def name(self):
+        return self.current.name if self.current else None
+
+    def add(self, scene):
+        self.scenes[scene.name] = scene
+        self.loader.group(scene.name, scene.assets)
+        return scene
+
+    def keep(self, names):
+        # Assets every scene uses (sound effects, the menu song) are never unloaded
+        for name in names:
+            self.refs[name] += 1
+            self.loader.require(name)
+
+    def switch(self, name):
+        scene = self.scenes[name]
+        # References are taken before the old scene drops its own, so shared assets stay loaded
+        for asset in scene.assets:
+            self.refs[asset] += 1
+            self.loader.require(asset)  # usually preloaded; otherwise loads right here
+        old = self.current
+        if old:
+            if old.leave:
+                old.leave()
+            self.release(old.assets)
+        self.current = scene
+        if scene.ui:
+            scene.ui.enter(self.mouse_pos())
+        if scene.enter:
+            scene.enter()
+        now = time.monotonic()
+        for nxt in scene.preload:
+            self.loader.preload(nxt)
+            # Count a preload as a use, so the budget does not evict what was just asked for
+            for asset in self.scenes[nxt].assets:
+                if not self.refs[asset]:
+                    self.last_used[asset] = now
+        self.trim()
+
+    def release(self, names):
+        now = time.monotonic()
+        for name in names:
+            self.refs[name] -= 1
+            self.last_used[name] = now
+
+    def trim(self):
+        # Unload unreferenced assets, least recently used first, until under budget
+        resident = self.loader.resident_bytes()
+        if resident <= self.budget:
+            return
+        idle = [name for name in self.loader.assets if not self.refs[name]]
+        for name in sorted(idle, key=lambda name: self.last_used.get(name, 0)):
+            if resident <= self.budget:
+                break
+            resident -= self.loader.sizes[name]
+            self.loader.unload(name)
+            self.evicted += 1
+
+    # --- Per frame ---
+    def handle(self, event, now):
+        scene = self.current
+        if scene.ui and scene.ui.handle(event, now):
+            return
+        if scene.handle:
+            scene.handle(event)
+
+    def draw(self):
+        self.current.draw()
+
+    # --- Memory report ---
+    def report(self):
+        # Shared assets are counted in every scene that lists them
+        sizes = self.loader.sizes
+        lines = [f"  {'scene':<11} {'loaded':>7} {'assets':>10} {'buttons':>10}"]
+        for scene in self.scenes.values():
+            loaded = [name for name in scene.assets if name in sizes]
+            ui = sum(asset_bytes(surf) for surf in scene.ui.surfaces()) if scene.ui else 0
+            mark = "*" if scene is self.current else " "
+            lines.append(f"{mark} {scene.name:<11} {len(loaded):>3}/{len(scene.assets):<3} "
+                         f"{sum(sizes[name] for name in loaded) / MB:7.2f} MB {ui / MB:7.2f} MB")
+        idle = sum(size for name, size in sizes.items() if not self.refs[name])
+        lines.append(f"resident {self.loader.resident_bytes() / MB:.2f} MB ({idle / MB:.2f} MB unreferenced), "
+                     f"budget {self.budget / MB:.1f} MB, {self.evicted} unloaded")
+        return "\n".join(lines)
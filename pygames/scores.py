@@ -0,0 +1,265 @@
+"""Score store: every run, kept in SQLite and written off the frame loop.
+
+record() only queues a run; a writer thread commits the queue in batches, so
+the game never waits on the disk. The database is in WAL mode: each commit is
+atomic, and a crash or kill loses at most the runs still queued (milliseconds'
+worth), never the file. Queries use their own connection and read while the
+writer commits; runs still queued are merged into their results.
+
+    python scores.py top Hard -n 10
+    python scores.py history -n 20
+    python scores.py stats
+"""
+import argparse
+import atexit
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    played_at REAL NOT NULL,     -- unix time the run ended
+    difficulty TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    accuracy REAL,               -- NULL for scores imported from highscore.txt
+    duration_ms INTEGER,
+    perfect INTEGER, good INTEGER, bad INTEGER, miss INTEGER,
+    mean_offset REAL, stddev REAL,
+    chart TEXT NOT NULL DEFAULT '',  -- chart file; '' for a generated chart
+    seed INTEGER,
+    ended TEXT NOT NULL          -- game_over, quit or imported
+);
+CREATE INDEX IF NOT EXISTS runs_by_difficulty ON runs (difficulty, score DESC);
+CREATE INDEX IF NOT EXISTS runs_by_score ON runs (score DESC);
+CREATE INDEX IF NOT EXISTS runs_by_time ON runs (played_at DESC);
+"""
+COLUMNS = ("played_at", "difficulty", "score", "accuracy", "duration_ms", "perfect", "good", "bad", "miss",
+           "mean_offset", "stddev", "chart", "seed", "ended")
+INSERT = f"INSERT INTO runs ({', '.join(COLUMNS)}) VALUES ({', '.join(':' + c for c in COLUMNS)})"
+
+
+def run_from_sim(sim, ended, chart=""):
+    stats = sim.stats.as_dict()
+    return {
+        "played_at": time.time(),
+        "difficulty": sim.difficulty,
+        "score": sim.score,
+        "accuracy": stats["accuracy"],
+        "duration_ms": sim.time_ms,
+        "perfect": stats["perfect"], "good": stats["good"], "bad": stats["bad"], "miss": stats["miss"],
+        "mean_offset": stats["mean_offset"], "stddev": stats["stddev"],
+        "chart": chart,
+        "seed": sim.seed,
+        "ended": ended,
+    }
+
+
+def run_key(run):
+    # Identifies a run whether it is still queued or already read back from the database
+    return run["played_at"], run["difficulty"], run["score"]
+
+
+def _dict_row(cursor, row):
+    return {col[0]: value for col, value in zip(cursor.description, row)}
+
+
+def connect(path):
+    conn = sqlite3.connect(path)
+    conn.row_factory = _dict_row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")  # WAL commits survive a process crash; fsync per checkpoint
+    return conn
+
+
+# --- Store ---
+class ScoreStore:
+    def __init__(self, path, legacy=None, legacy_runs=None):
+        self.path = path
+        self.db = connect(path)  # queries, from the game thread
+        with self.db:
+            self.db.executescript(SCHEMA)
+        self.queue = queue.Queue()
+        self.pending = []  # queued runs not committed yet
+        self.lock = threading.Lock()
+        if not self.count():
+            if legacy_runs and os.path.exists(legacy_runs):
+                self.import_runs(legacy_runs)
+            if legacy and os.path.exists(legacy):
+                self.import_highscores(legacy)
+        self.writer = threading.Thread(target=self._write_loop, name="scores", daemon=True)
+        self.writer.start()
+        atexit.register(self.close)  # also flushes when the game dies on an exception
+
+    def import_runs(self, path):
+        # The old runs.txt ("Difficulty score=.. perfect=.. ..." per finished run) becomes one
+        # run per line; the file is renamed to runs.txt.imported since nothing writes it anymore
+        runs = []
+        played_at = os.path.getmtime(path)
+        with open(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                difficulty, *fields = line.split()
+                values = dict(field.partition("=")[::2] for field in fields)
+                run = dict.fromkeys(COLUMNS)
+                try:
+                    run.update((name, int(values[name])) for name in ("score", "perfect", "good", "bad", "miss"))
+                    run.update((name, float(values[name])) for name in ("accuracy", "mean_offset", "stddev"))
+                except (KeyError, ValueError):
+                    continue
+                run.update(played_at=played_at, difficulty=difficulty, chart="", ended="imported")
+                runs.append(run)
+        with self.db:
+            self.db.executemany(INSERT, runs)
+        os.replace(path, path + ".imported")
+
+    def import_highscores(self, path):
+        # The old highscore.txt ("Difficulty:score" lines) becomes one run per difficulty,
+        # unless runs.txt already had a run at least as good
+        runs = []
+        best = self.bests()
+        with open(path) as f:
+            for line in f:
+                difficulty, sep, score = line.strip().partition(":")
+                if sep and score.isdigit() and int(score) > best.get(difficulty, -1):
+                    run = dict.fromkeys(COLUMNS)
+                    run.update(played_at=os.path.getmtime(path), difficulty=difficulty, score=int(score),
+                               chart="", ended="imported")
+                    runs.append(run)
+        with self.db:
+            self.db.executemany(INSERT, runs)
+
+    # --- Writing ---
+    def record(self, run):
+        with self.lock:
+            self.pending.append(run)
+        self.queue.put(run)
+
+    def _write_loop(self):
+        conn = connect(self.path)
+        while True:
+            batch = [self.queue.get()]
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            runs = [run for run in batch if run is not None]
+            if runs:
+                try:
+                    with conn:  # one transaction per batch
+                        conn.executemany(INSERT, runs)
+                except sqlite3.Error as e:
+                    print(f"scores: could not save {len(runs)} run(s): {e}", file=sys.stderr)
+                with self.lock:
+                    done = set(map(id, runs))
+                    self.pending = [run for run in self.pending if id(run) not in done]
+            if stop:
+                break
+        conn.close()
+
+    def close(self):
+        if self.db is None:
+            return
+        self.queue.put(None)
+        self.writer.join()
+        self.db.close()
+        self.db = None
+
+    # --- Queries ---
+    # Queued runs are read before the database: a run the writer commits in between is
+    # then in both (and dropped from one), never in neither
+    def _pending(self, difficulty=None):
+        with self.lock:
+            return [run for run in self.pending if difficulty is None or run["difficulty"] == difficulty]
+
+    def _merge(self, pending, rows):
+        stored = set(map(run_key, rows))
+        return rows + [run for run in pending if run_key(run) not in stored]
+
+    def count(self):
+        return self.db.execute("SELECT COUNT(*) AS n FROM runs").fetchone()["n"]
+
+    def top(self, n=10, difficulty=None):
+        # Best runs, highest score first (earlier run first on ties)
+        pending = self._pending(difficulty)
+        if difficulty is None:
+            rows = self.db.execute("SELECT * FROM runs ORDER BY score DESC, played_at LIMIT ?", (n,))
+        else:
+            rows = self.db.execute("SELECT * FROM runs WHERE difficulty = ? ORDER BY score DESC, played_at LIMIT ?",
+                                   (difficulty, n))
+        runs = self._merge(pending, rows.fetchall())
+        return sorted(runs, key=lambda run: (-run["score"], run["played_at"]))[:n]
+
+    def history(self, n=20, difficulty=None):
+        # Latest runs first
+        pending = self._pending(difficulty)
+        if difficulty is None:
+            rows = self.db.execute("SELECT * FROM runs ORDER BY played_at DESC LIMIT ?", (n,))
+        else:
+            rows = self.db.execute("SELECT * FROM runs WHERE difficulty = ? ORDER BY played_at DESC LIMIT ?",
+                                   (difficulty, n))
+        runs = self._merge(pending, rows.fetchall())
+        return sorted(runs, key=lambda run: -run["played_at"])[:n]
+
+    def bests(self):
+        # {difficulty: best score}
+        pending = self._pending()
+        rows = self.db.execute("SELECT difficulty, MAX(score) AS score FROM runs GROUP BY difficulty")
+        best = {row["difficulty"]: row["score"] for row in rows}
+        for run in pending:
+            best[run["difficulty"]] = max(best.get(run["difficulty"], 0), run["score"])
+        return best
+
+    def stats(self):
+        # Per difficulty: runs, best, mean score and accuracy, total play time
+        rows = self.db.execute(
+            "SELECT difficulty, COUNT(*) AS runs, MAX(score) AS best, AVG(score) AS mean_score, "
+            "AVG(accuracy) AS accuracy, SUM(duration_ms) AS played_ms FROM runs GROUP BY difficulty")
+        return rows.fetchall()
+
+
+# --- Command line ---
+def format_run(rank, run):
+    accuracy = f"{run['accuracy']:.1%}" if run["accuracy"] is not None else "--"
+    duration = f"{run['duration_ms'] / 1000:.0f} s" if run["duration_ms"] is not None else "--"
+    when = time.strftime("%Y-%m-%d %H:%M", time.localtime(run["played_at"]))
+    return f"{rank:>3}. {run['difficulty']:7} {run['score']:>6} {accuracy:>6} {duration:>7}  {when}  {run['ended']}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the score store")
+    parser.add_argument("--db", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "scores.db"))
+    sub = parser.add_subparsers(dest="command", required=True)
+    top = sub.add_parser("top", help="best runs")
+    top.add_argument("difficulty", nargs="?")
+    top.add_argument("-n", type=int, default=10)
+    history = sub.add_parser("history", help="latest runs")
+    history.add_argument("difficulty", nargs="?")
+    history.add_argument("-n", type=int, default=20)
+    sub.add_parser("stats", help="totals per difficulty")
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.db):
+        parser.error(f"{args.db}: no scores yet")
+
+    store = ScoreStore(args.db)
+    if args.command == "stats":
+        for row in store.stats():
+            accuracy = f"{row['accuracy']:.1%}" if row["accuracy"] is not None else "--"
+            print(f"{row['difficulty']:7} {row['runs']:>5} runs, best {row['best']}, mean {row['mean_score']:.0f}, "
+                  f"accuracy {accuracy}, played {(row['played_ms'] or 0) / 60000:.0f} min")
+    else:
+        query = store.top if args.command == "top" else store.history
+        for rank, run in enumerate(query(args.n, args.difficulty), 1):
+            print(format_run(rank, run))
+    store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+import random
+from collections import deque
+
+from charts import ChartStream, empty_chart, generate_chart
+from judge import SCORES, WINDOWS_MS, RunStats, judge
+
+# --- Timing ---
+STEP_MS = 10           # length of one simulation step
+MAX_FRAME_MS = 250     # ignore longer hitches instead of fast-forwarding through them
+MAX_CATCHUP_MS = 2000  # when following the music clock, catch up on hitches up to this long
+
+# --- Playfield ---
+# Logical pixels, shared by the game, the tuner and netplay's harness
+LANE_X = [100, 200, 300, 400]  # left edge of each lane
+ARROW_SIZE = 80
+PLAYFIELD_HEIGHT = 800
+RECEPTOR_Y = PLAYFIELD_HEIGHT - 200  # top of the receptors
+HIT_Y = RECEPTOR_Y + ARROW_SIZE // 2 - 10  # a note is right on time when its top is here
+
+# --- Difficulty presets ---
+# Fall speeds are in pixels per second (the old per-frame speeds times 60)
+FALL_SPEEDS = {"Easy": 480, "Normal": 720, "Hard": 900}
+DEFAULT_FALL_SPEED = 420
+
+
+# --- Arrow state ---
+class Arrow:
+    __slots__ = ("x", "y", "prev_y", "index", "time")
+
+    def __init__(self, lane, index, y, time):
+        self.x = lane
+        self.y = y
+        self.prev_y = y
+        self.index = index
+        self.time = time  # when it should be hit, in simulation ms
+
+    def draw_y(self, alpha):
+        # Position between the last two steps, for smooth rendering
+        return self.prev_y + (self.y - self.prev_y) * alpha
+
+
+# --- Simulation ---
+class GameSimulation:
+    def __init__(self, lanes, arrow_size, height, hit_y, rng=None, windows=None, no_fail=False):
+        self.lanes = lanes
+        self.arrow_size = arrow_size
+        self.height = height
+        self.hit_y = hit_y
+        # The old geometric hit zone; notes are judged by time now, but its middle
+        # is still where a note sits when it is exactly on time
+        self.hit_top = hit_y - arrow_size
+        self.hit_bottom = hit_y + 20
+        self.target_y = (self.hit_top + self.hit_bottom) / 2
+        self.windows = dict(windows or WINDOWS_MS)
+        self.no_fail = no_fail  # misses are counted but cost no health (stress runs)
+        self.rng = rng or random.Random()
+        self.difficulty = None
+        self.fall_speed = DEFAULT_FALL_SPEED
+        self.reset(None)
+
+    def reset(self, difficulty, chart=None, seed=None):
+        # Without a chart, notes come from the seeded generator for the difficulty
+        if seed is None:
+            seed = self.rng.getrandbits(32)
+        if chart is None:
+            chart = generate_chart(difficulty, seed) if difficulty else empty_chart()
+        self.seed = seed
+        self.difficulty = difficulty
+        self.chart = chart
+        self.stream = ChartStream(chart)
+        self.fall_speed = chart.fall_speed or FALL_SPEEDS.get(difficulty, DEFAULT_FALL_SPEED)
+        # Notes are taken from the chart this far ahead, so they enter just above the screen
+        self.lookahead_ms = (self.target_y + self.arrow_size) / self.fall_speed * 1000
+        # One queue per lane, oldest (lowest on screen) arrow at the front
+        self.lane_arrows = [deque() for _ in self.lanes]
+        self.score = 0
+        self.health = 5
+        self.misses = 0
+        self.stats = RunStats()
+        self.inputs = []  # (step time, press time, lane) of every press, for replays
+        self.game_over = False
+        self.time_ms = 0
+        self.accumulator = 0
+
+    # --- Stepping ---
+    def update(self, dt_ms, max_ms=MAX_FRAME_MS):
+        # Run as many fixed steps as the elapsed time allows; returns how many ran
+        self.accumulator += min(dt_ms, max_ms)
+        steps = 0
+        while self.accumulator >= STEP_MS:
+            self.accumulator -= STEP_MS
+            if not self.game_over:
+                self.step()
+            steps += 1
+        return steps
+
+    def advance_to(self, clock_ms):
+        # Follow an external clock (the song position) instead of frame deltas
+        return self.update(max(0, clock_ms - (self.time_ms + self.accumulator)), MAX_CATCHUP_MS)
+
+    def alpha(self):
+        return self.accumulator / STEP_MS
+
+    def step(self):
+        self.time_ms += STEP_MS
+        dy = self.fall_speed * STEP_MS / 1000
+        for queue in self.lane_arrows:
+            for arrow in queue:
+                arrow.prev_y = arrow.y
+                arrow.y += dy
+            while queue and queue[0].y > self.height:
+                queue.popleft()
+                self.miss()
+                if self.game_over:
+                    return
+        self.spawn()
+
+    # --- Spawning ---
+    def add_arrow(self, lane_index, time_ms):
+        y = self.target_y - (time_ms - self.time_ms) * self.fall_speed / 1000
+        self.lane_arrows[lane_index].append(Arrow(self.lanes[lane_index], lane_index, y, time_ms))
+
+    def spawn(self):
+        # Pull in every chart note that is now within the look-ahead window
+        for time_ms, lane_index in self.stream.take_until(self.time_ms + self.lookahead_ms):
+            self.add_arrow(lane_index, time_ms)
+
+    def arrow_count(self):
+        return sum(len(queue) for queue in self.lane_arrows)
+
+    # --- Input ---
+    def now(self):
+        return self.time_ms + self.accumulator
+
+    def press(self, lane_index, time_ms=None):
+        # Judge a press at time_ms (simulation/song time) against the lane's notes.
+        # Returns the judgement, or None if no note was close enough to count.
+        if time_ms is None:
+            time_ms = self.now()
+        self.inputs.append((self.time_ms, time_ms, lane_index))
+        queue = self.lane_arrows[lane_index]
+        for i, arrow in enumerate(queue):
+            offset = time_ms - arrow.time
+            if offset > self.windows["Miss"]:
+                continue  # already missed, it is just still falling off screen
+            judgement = judge(offset, self.windows)
+            if judgement is None:
+                return None  # too early for anything in this lane
+            del queue[i]
+            if judgement == "Miss":
+                self.miss()
+            else:
+                self.score += SCORES[judgement]
+                self.stats.add(judgement, offset)
+            return judgement
+        return None
+
+    def miss(self):
+        self.misses += 1
+        self.stats.add("Miss")
+        if self.no_fail:
+            return
+        self.health -= 1
+        if self.health <= 0:
+            self.game_over = True
+
+    # --- Snapshots ---
+    def snapshot(self):
+        # Everything stepping and pressing change, for rollback (see rollback.py)
+        arrows = [[(a.x, a.index, a.y, a.prev_y, a.time) for a in queue] for queue in self.lane_arrows]
+        return (self.time_ms, self.accumulator, self.stream.pos, arrows, self.score, self.health,
+                self.misses, self.stats.copy(), len(self.inputs), self.game_over)
+
+    def restore(self, state):
+        (self.time_ms, self.accumulator, self.stream.pos, arrows, self.score, self.health,
+         self.misses, stats, inputs, self.game_over) = state
+        self.lane_arrows = [deque() for _ in self.lanes]
+        for queue, saved in zip(self.lane_arrows, arrows):
+            for x, index, y, prev_y, time_ms in saved:
+                arrow = Arrow(x, index, y, time_ms)
+                arrow.prev_y = prev_y
+                queue.append(arrow)
+        self.stats = stats.copy()  # the snapshot may be restored again
+        del self.inputs[inputs:]
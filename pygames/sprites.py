@@ -0,0 +1,47 @@
+import pygame
+
+
+# --- Sprite pre-bake helpers ---
+# These run once at load time so the frame loop only has to blit the result.
+
+def outlined(image, thickness=3, color=(0, 0, 0)):
+    # Same look as blitting a tinted copy at the 8 surrounding offsets, then the image on top
+    w, h = image.get_size()
+    result = pygame.Surface((w + 2 * thickness, h + 2 * thickness), pygame.SRCALPHA)
+    shadow = image.copy()
+    shadow.fill((*color, 255), special_flags=pygame.BLEND_RGBA_MULT)
+    for dx in [-thickness, 0, thickness]:
+        for dy in [-thickness, 0, thickness]:
+            if dx != 0 or dy != 0:
+                result.blit(shadow, (thickness + dx, thickness + dy))
+    result.blit(image, (thickness, thickness))
+    return result
+
+
+def round_corners(image, radius=12):
+    size = image.get_size()
+    mask = pygame.Surface(size, pygame.SRCALPHA)
+    pygame.draw.rect(mask, (255, 255, 255, 255), (0, 0, *size), border_radius=radius)
+    result = pygame.Surface(size, pygame.SRCALPHA)
+    result.blit(image, (0, 0))
+    result.blit(mask, (0, 0), special_flags=pygame.BLEND_RGBA_MULT)
+    return result
+
+
+def scaled(image, scale):
+    w, h = image.get_size()
+    return pygame.transform.smoothscale(image, (int(w * scale), int(h * scale)))
+
+
+class SpriteBank:
+    # Lazily built sprites, keyed by anything hashable
+    def __init__(self):
+        self.sprites = {}
+        self.built = 0
+
+    def get(self, key, build):
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            sprite = self.sprites[key] = build()
+            self.built += 1
+        return sprite
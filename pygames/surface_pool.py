@@ -0,0 +1,33 @@
+import pygame
+
+
+# --- Surface pool ---
+# Hands out persistent, pre-filled surfaces so static fills are not reallocated
+# every frame. Only the surface alpha changes between uses, so callers must
+# pass the alpha they want each time and blit the result right away.
+class SurfacePool:
+    def __init__(self):
+        self.surfaces = {}
+        self.created = 0
+        self.requests = 0
+
+    def _get(self, key, build):
+        self.requests += 1
+        surf = self.surfaces.get(key)
+        if surf is None:
+            surf = self.surfaces[key] = build()
+            self.created += 1
+        return surf
+
+    def overlay(self, size, color, alpha=None):
+        # Opaque fill blended with a per-surface alpha (dimming, flashes, fades)
+        def build():
+            surf = pygame.Surface(size)
+            surf.fill(color)
+            return surf
+        surf = self._get(("overlay", tuple(size), tuple(color)), build)
+        surf.set_alpha(alpha)
+        return surf
+
+    def stats(self):
+        return {"surfaces": len(self.surfaces), "created": self.created, "requests": self.requests}
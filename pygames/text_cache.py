@@ -0,0 +1,53 @@
+from collections import OrderedDict
+
+ALPHA_STEP = 15  # fades are quantised to 18 alpha levels so they can be cached too
+
+
+# --- Text render cache ---
+class TextCache:
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def render(self, font, text, color, antialias=True, alpha=None):
+        # Returns the same Surface for the same (font, text, color, antialias[, alpha]).
+        # Callers must not modify the returned surface.
+        if alpha is not None:
+            alpha = min(255, round(alpha / ALPHA_STEP) * ALPHA_STEP)
+            if alpha == 255:
+                alpha = None
+        key = (font, text, tuple(color), antialias, alpha)
+        surf = self.entries.get(key)
+        if surf is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return surf
+
+        self.misses += 1
+        if alpha is None:
+            surf = font.render(text, antialias, color)
+        else:
+            base = self.entries.get(key[:4] + (None,))
+            surf = base.copy() if base is not None else font.render(text, antialias, color)
+            surf.set_alpha(alpha)
+        self.entries[key] = surf
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return surf
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
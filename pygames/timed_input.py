@@ -0,0 +1,44 @@
+import time
+
+import pygame
+
+POLL_SLICE_S = 0.001
+
+
+# --- Timestamped input ---
+# pygame events carry no timestamp, so events are drained and stamped
+# (event.time_ns, perf_counter_ns) as soon as we see them. Besides the normal
+# once-per-frame drain, wait() replaces clock.tick() and keeps polling in 1ms
+# slices while the frame sleeps, so presses are stamped close to when they
+# happened instead of when the next frame starts.
+class TimedInput:
+    def __init__(self):
+        self.pending = []
+        self.last_frame_ns = time.perf_counter_ns()
+
+    def poll(self):
+        # The whole queue, so a key press never jumps ahead of a click or QUIT before it
+        events = pygame.event.get()
+        if events:
+            t = time.perf_counter_ns()
+            for event in events:
+                event.time_ns = t
+            self.pending.extend(events)
+
+    def events(self):
+        # Everything since the last call, in arrival order
+        self.poll()
+        events = self.pending
+        self.pending = []
+        return events
+
+    def wait(self, clock, fps):
+        # Same as clock.tick(fps), polling input while we wait
+        if fps:
+            deadline = self.last_frame_ns + 1_000_000_000 // fps
+            while time.perf_counter_ns() < deadline - 2_000_000:
+                self.poll()
+                time.sleep(POLL_SLICE_S)
+            self.poll()
+        clock.tick(fps)
+        self.last_frame_ns = time.perf_counter_ns()
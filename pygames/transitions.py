@@ -0,0 +1,71 @@
+import pygame
+
+
+# --- Screen transitions ---
+# A transition is just timed state: the main loop keeps handling input and
+# drawing the next scene while draw() puts the fade on top. Optional warm-up
+# jobs (pre-rendering the next scene's sprites, etc.) run one per frame while
+# it plays.
+class Transition:
+    def __init__(self, size, pool):
+        self.size = size
+        self.pool = pool
+        self.snapshot = pygame.Surface(size)
+        self.kind = None
+        self.start_time = 0
+        self.duration = 0
+        self.color = (0, 0, 0)
+        self.warmup = []
+
+    @property
+    def active(self):
+        return self.kind is not None
+
+    def _start(self, kind, now, duration, warmup):
+        self.kind = kind
+        self.start_time = now
+        self.duration = duration
+        self.warmup = list(warmup or [])
+
+    def fade_in(self, now, duration=300, color=(0, 0, 0), warmup=None):
+        # From a solid color to the scene underneath
+        self.color = color
+        self._start("fade_in", now, duration, warmup)
+
+    def fade_out(self, now, duration=300, color=(0, 0, 0), warmup=None):
+        # From the scene underneath to a solid color
+        self.color = color
+        self._start("fade_out", now, duration, warmup)
+
+    def crossfade(self, screen, now, duration=300, warmup=None):
+        # From whatever is on screen right now to the scene underneath. The snapshot
+        # is in screen pixels, which may differ from the logical size after a resize
+        if self.snapshot.get_size() != screen.get_size():
+            self.snapshot = pygame.Surface(screen.get_size())
+        self.snapshot.blit(screen, (0, 0))
+        self._start("crossfade", now, duration, warmup)
+
+    def progress(self, now):
+        if not self.duration:
+            return 1
+        return min(max((now - self.start_time) / self.duration, 0), 1)
+
+    def draw(self, renderer, now):
+        if self.kind is None:
+            return
+        if self.warmup:
+            self.warmup.pop(0)()
+
+        progress = self.progress(now)
+        if self.kind == "fade_out":
+            alpha = int(255 * progress)
+        else:
+            alpha = int(255 * (1 - progress))
+        if self.kind == "crossfade":
+            self.snapshot.set_alpha(alpha)
+            renderer.blit(self.snapshot, (0, 0), native=True)
+        else:
+            renderer.blit(self.pool.overlay(self.size, self.color, alpha), (0, 0))
+
+        if progress >= 1 and not self.warmup:
+            self.kind = None
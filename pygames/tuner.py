@@ -0,0 +1,149 @@
+"""Difficulty tuner: simulated players on generated charts, in parallel.
+
+Each configuration is a difficulty preset with its spawn rules and fall speed
+optionally overridden. A bot (bot.py) plays it many times on charts with
+different seeds; every configuration gets the same seeds, so differences come
+from the parameters and not from luck. The runs give a survival curve (share
+of runs still alive at each time) and a mean score curve per configuration:
+
+    python tuner.py --runs 500 --jobs 8
+    python tuner.py Hard --speeds 800 900 1000 --gap-scales 0.9 1 1.1 --out hard.csv
+    python tuner.py --timing-sd 45 --reaction-ms 300    # a weaker player
+"""
+import argparse
+import csv
+import itertools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from bot import Bot
+from charts import SPAWN_RULES, generate_chart
+from simulation import ARROW_SIZE, FALL_SPEEDS, HIT_Y, LANE_X, PLAYFIELD_HEIGHT, GameSimulation
+
+BOT_OPTIONS = ("timing_sd", "bias_ms", "reaction_ms", "reaction_sd", "repeat_ms", "lapse", "comfort_ms")
+
+
+# --- Runs ---
+def configurations(args):
+    # (difficulty, fall speed, gap range, double chance, burst chance) for every combination asked for
+    configs = []
+    for difficulty in args.difficulties:
+        rules = SPAWN_RULES[difficulty]
+        lo, hi = rules["gap"]
+        for speed, scale, double, burst in itertools.product(
+                args.speeds or [FALL_SPEEDS[difficulty]], args.gap_scales,
+                args.double or [rules["double"]], args.burst or [rules["burst"]]):
+            gap = (max(1, round(lo * scale)), max(1, round(hi * scale)))
+            configs.append((difficulty, speed, gap, double, burst))
+    return configs
+
+
+def run_one(task):
+    # One bot run; returns (config, survival ms, score samples, accuracy)
+    config, seed, bot_options, length_ms, sample_ms = task
+    difficulty, speed, gap, double, burst = config
+    sim = GameSimulation(LANE_X, ARROW_SIZE, PLAYFIELD_HEIGHT, HIT_Y)
+    chart = generate_chart(difficulty, seed, length_ms + 5000,
+                           {"gap": gap, "double": double, "burst": burst}, fall_speed=speed)
+    sim.reset(difficulty, chart, seed=seed)
+    samples = Bot(seed=seed, **bot_options).play(sim, length_ms, sample_ms)
+    return config, sim.time_ms if sim.game_over else length_ms, samples, sim.stats.accuracy
+
+
+def curves(results, length_ms, sample_ms):
+    # Per configuration: sample times, survival share and mean score at each
+    by_config = {}
+    for config, survived, samples, accuracy in results:
+        by_config.setdefault(config, []).append((survived, samples, accuracy))
+    times = np.arange(sample_ms, length_ms + 1, sample_ms)
+    out = {}
+    for config, runs in by_config.items():
+        survived = np.array([r[0] for r in runs])
+        # A run that ended keeps its final score for the rest of the curve
+        scores = np.array([s + [s[-1] if s else 0] * (len(times) - len(s)) for _, s, _ in runs])
+        out[config] = {
+            "times": times,
+            "survival": (survived[:, None] >= times[None, :]).mean(axis=0),
+            "score": scores.mean(axis=0),
+            "median_survival": float(np.median(survived)),
+            "accuracy": float(np.mean([r[2] for r in runs])),
+            "runs": len(runs),
+        }
+    return out
+
+
+def write_csv(path, table):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["difficulty", "fall_speed", "gap_min", "gap_max", "double", "burst",
+                         "time_s", "survival", "mean_score"])
+        for (difficulty, speed, gap, double, burst), c in table.items():
+            for t, alive, score in zip(c["times"], c["survival"], c["score"]):
+                writer.writerow([difficulty, speed, gap[0], gap[1], double, burst,
+                                 t / 1000, round(float(alive), 4), round(float(score), 1)])
+
+
+# --- Command line ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep difficulty parameters with a simulated player")
+    parser.add_argument("difficulties", nargs="*", help=f"any of {', '.join(SPAWN_RULES)} (default: all)")
+    parser.add_argument("--runs", type=int, default=200, help="bot runs per configuration")
+    parser.add_argument("--minutes", type=float, default=2, help="length of each run")
+    parser.add_argument("--sample-s", type=float, default=5, help="curve resolution")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--out", help="write the curves as CSV")
+    sweep = parser.add_argument_group("sweep (defaults: the preset's own value)")
+    sweep.add_argument("--speeds", type=float, nargs="+", help="fall speeds in px/s")
+    sweep.add_argument("--gap-scales", type=float, nargs="+", default=[1.0], help="multipliers of the spawn gaps")
+    sweep.add_argument("--double", type=float, nargs="+", help="chances of a double")
+    sweep.add_argument("--burst", type=float, nargs="+", help="chances of a burst")
+    player = parser.add_argument_group("bot")
+    player.add_argument("--timing-sd", type=float, default=30.0)
+    player.add_argument("--bias-ms", type=float, default=0.0)
+    player.add_argument("--reaction-ms", type=float, default=250.0)
+    player.add_argument("--reaction-sd", type=float, default=40.0)
+    player.add_argument("--repeat-ms", type=float, default=80.0)
+    player.add_argument("--lapse", type=float, default=0.01)
+    player.add_argument("--comfort-ms", type=float, default=800.0)
+    args = parser.parse_args(argv)
+    args.difficulties = args.difficulties or list(SPAWN_RULES)
+    for difficulty in args.difficulties:
+        if difficulty not in SPAWN_RULES:
+            parser.error(f"unknown difficulty {difficulty!r}")
+
+    length_ms = int(args.minutes * 60000)
+    sample_ms = int(args.sample_s * 1000)
+    bot_options = {name: getattr(args, name) for name in BOT_OPTIONS}
+    configs = configurations(args)
+    tasks = [(config, args.seed * 1_000_003 + i, bot_options, length_ms, sample_ms)
+             for config in configs for i in range(args.runs)]
+
+    start = time.perf_counter()
+    if args.jobs > 1:
+        with ProcessPoolExecutor(args.jobs) as pool:
+            results = list(pool.map(run_one, tasks, chunksize=max(1, len(tasks) // (args.jobs * 8))))
+    else:
+        results = [run_one(task) for task in tasks]
+    elapsed = time.perf_counter() - start
+
+    table = curves(results, length_ms, sample_ms)
+    print(f"{'difficulty':10} {'speed':>6} {'gap':>7} {'double':>6} {'burst':>5}  "
+          f"{'full run':>8} {'median':>7} {'score':>7} {'acc':>5}")
+    for (difficulty, speed, gap, double, burst), c in table.items():
+        print(f"{difficulty:10} {speed:6.0f} {gap[0]:3}-{gap[1]:<3} {double:6.2f} {burst:5.2f}  "
+              f"{c['survival'][-1]:8.0%} {c['median_survival'] / 1000:6.0f}s {c['score'][-1]:7.0f} {c['accuracy']:5.0%}")
+    simulated = sum(r[1] for r in results) / 1000
+    print(f"{len(results)} runs, {simulated / 3600:.1f} h of play simulated in {elapsed:.1f} s")
+    if args.out:
+        write_csv(args.out, table)
+        print(f"curves written to {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+import weakref
+from collections import OrderedDict
+
+import pygame
+
+SCALE_CACHE_MB = 128  # a 4K fullscreen background alone is about 14 MB
+MIN_RENDER_SCALE = 0.25
+
+
+def scaled_size(size, scale):
+    return max(1, round(size[0] * scale)), max(1, round(size[1] * scale))
+
+
+def rescale(surf, size):
+    # Colorkeyed surfaces keep exact key pixels with the plain scaler
+    if surf.get_colorkey() is not None:
+        return pygame.transform.scale(surf, size)
+    if surf.get_bitsize() < 24:
+        surf = surf.convert_alpha()
+    return pygame.transform.smoothscale(surf, size)
+
+
+# --- Viewport ---
+# The game is laid out in logical units on a fixed playfield (the original
+# 600x800). The viewport fits that playfield into the window, letterboxed,
+# at whatever size the window or fullscreen display has. With a render scale
+# below 1 the frame is drawn at a lower internal resolution and stretched to
+# the output on present, trading sharpness for fill rate on weak machines.
+class Viewport:
+    def __init__(self, logical_size, window_size=None, fullscreen=False, render_scale=1.0):
+        self.logical_size = logical_size
+        self.window_size = tuple(window_size or logical_size)
+        self.fullscreen = fullscreen
+        self.render_scale = min(max(render_scale, MIN_RENDER_SCALE), 1.0)
+        self.open()
+
+    def open(self):
+        if self.fullscreen:
+            self.window = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
+        else:
+            self.window = pygame.display.set_mode(self.window_size, pygame.RESIZABLE)
+        self.layout()
+
+    def layout(self):
+        ww, wh = self.window.get_size()
+        lw, lh = self.logical_size
+        self.fit = min(ww / lw, wh / lh)  # window pixels per logical unit
+        size = scaled_size(self.logical_size, self.fit)
+        self.rect = pygame.Rect(((ww - size[0]) // 2, (wh - size[1]) // 2), size)
+        self.window.fill((0, 0, 0))  # letterbox bars
+        pygame.display.flip()
+        self.output = self.window.subsurface(self.rect)
+        self.scale = self.fit * self.render_scale  # canvas pixels per logical unit
+        if self.render_scale < 1:
+            self.canvas = pygame.Surface(scaled_size(self.logical_size, self.scale)).convert()
+        else:
+            self.canvas = self.output
+
+    def resize(self, size):
+        # The window was resized by the user (VIDEORESIZE)
+        if self.fullscreen:
+            return
+        self.window_size = tuple(size)
+        self.window = pygame.display.get_surface()
+        self.layout()
+
+    def toggle_fullscreen(self):
+        self.fullscreen = not self.fullscreen
+        self.open()
+
+    def to_logical(self, pos):
+        return int((pos[0] - self.rect.x) / self.fit), int((pos[1] - self.rect.y) / self.fit)
+
+    def to_window(self, pos):
+        return round(self.rect.x + pos[0] * self.fit), round(self.rect.y + pos[1] * self.fit)
+
+    def present(self, rects=None):
+        # rects are canvas coordinates; None repaints the whole playfield
+        if self.canvas is not self.output:
+            pygame.transform.scale(self.canvas, self.rect.size, self.output)
+            pygame.display.update(self.rect)
+        elif rects is None:
+            pygame.display.update(self.rect)
+        else:
+            pygame.display.update([rect.move(self.rect.topleft) for rect in rects])
+
+
+# --- Scaled surface cache ---
+# Every surface the renderer draws at a scale other than 1 is looked up here.
+# Entries are keyed by the source surface and the output size, so switching
+# back to a resolution seen before reuses its surfaces; the least recently
+# used are dropped past capacity. Images loaded from files register a rebuild
+# function that decodes the source again at the output size, so backgrounds
+# and sprites stay sharp instead of being upscaled from the logical size.
+class ScaledCache:
+    def __init__(self, capacity_mb=SCALE_CACHE_MB):
+        self.capacity = capacity_mb * 1024 * 1024
+        # (id(surface), size) -> scaled surface. Keyed by id so the cache does not keep
+        # a source alive after its scene unloads it; its copies go when it is collected
+        self.entries = OrderedDict()
+        self.sizes = {}  # id(surface) -> sizes cached for it
+        self.bytes = 0
+        self.rebuilders = weakref.WeakKeyDictionary()  # surface -> rebuild(size)
+        self.hits = 0
+        self.misses = 0
+
+    def register(self, surf, rebuild):
+        # rebuild must not hold on to surf, or it is never collected
+        self.rebuilders[surf] = rebuild
+
+    def get(self, surf, scale):
+        size = scaled_size(surf.get_size(), scale)
+        key = (id(surf), size)
+        scaled = self.entries.get(key)
+        if scaled is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return scaled
+        self.misses += 1
+        rebuild = self.rebuilders.get(surf)
+        scaled = rebuild(size) if rebuild else rescale(surf, size)
+        if id(surf) not in self.sizes:
+            self.sizes[id(surf)] = set()
+            weakref.finalize(surf, self.discard, id(surf))
+        self.sizes[id(surf)].add(size)
+        self.entries[key] = scaled
+        self.bytes += size[0] * size[1] * scaled.get_bytesize()
+        while self.bytes > self.capacity and len(self.entries) > 1:
+            (old, old_size), dropped = self.entries.popitem(last=False)
+            self.sizes[old].discard(old_size)
+            self.bytes -= old_size[0] * old_size[1] * dropped.get_bytesize()
+        return scaled
+
+    def discard(self, surf_id):
+        # Drops every scaled copy of a source surface (called when it is collected)
+        for size in self.sizes.pop(surf_id, ()):
+            dropped = self.entries.pop((surf_id, size))
+            self.bytes -= size[0] * size[1] * dropped.get_bytesize()
+
+    def stats(self):
+        return {"entries": len(self.entries), "mb": round(self.bytes / 1024 / 1024, 1),
+                "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,89 @@
+import pygame
+
+POP_MS = 150     # how long a clicked button shows its popped look
+POP_SCALE = 1.1
+
+
+# --- Widgets ---
+# A button renders each of its looks (normal, hover, popped) once when it is
+# created, so drawing it is a single blit of a cached surface. Hover and clicks
+# come from mouse events, which only the active scene's group receives. The
+# blitted surface only changes when the state does, so the dirty-rect renderer
+# leaves an idle screen untouched.
+def button_surface(size, color, label, radius):
+    surf = pygame.Surface(size, pygame.SRCALPHA)
+    rect = surf.get_rect()
+    pygame.draw.rect(surf, color, rect, border_radius=radius)
+    surf.blit(label, label.get_rect(center=rect.center))
+    return surf.convert_alpha()
+
+
+class Button:
+    def __init__(self, rect, label, font, on_click, color=(255, 255, 255), hover_color=None,
+                 text_color=(0, 0, 0), radius=15, pop=True, on_hover=None):
+        self.rect = pygame.Rect(rect)
+        self.on_click = on_click
+        self.on_hover = on_hover
+        self.hovered = False
+        self.pop_until = 0
+        text = font.render(label, True, text_color)
+        self.normal = button_surface(self.rect.size, color, text, radius)
+        self.hover = button_surface(self.rect.size, hover_color, text, radius) if hover_color else self.normal
+        self.popped = None
+        self.pop_rect = self.rect
+        if pop:
+            # The popped look is the (hovered) button grown around its centre, label unscaled
+            self.pop_rect = pygame.Rect(0, 0, int(self.rect.width * POP_SCALE), int(self.rect.height * POP_SCALE))
+            self.pop_rect.center = self.rect.center
+            self.popped = button_surface(self.pop_rect.size, hover_color or color, text, radius)
+
+    def surfaces(self):
+        return {self.normal, self.hover, self.popped} - {None}
+
+    def set_hovered(self, hovered):
+        if hovered and not self.hovered and self.on_hover:
+            self.on_hover()
+        self.hovered = hovered
+
+    def handle(self, event, now):
+        # True if the event was used up by this button
+        if event.type == pygame.MOUSEMOTION:
+            self.set_hovered(self.rect.collidepoint(event.pos))
+        elif event.type == pygame.MOUSEBUTTONDOWN and self.rect.collidepoint(event.pos):
+            if self.popped:
+                self.pop_until = now + POP_MS
+            self.on_click()
+            return True
+        return False
+
+    def draw(self, renderer, now, alpha=None):
+        if now < self.pop_until:
+            surf, rect = self.popped, self.pop_rect
+        else:
+            surf, rect = (self.hover if self.hovered else self.normal), self.rect
+        surf.set_alpha(alpha)
+        renderer.blit(surf, rect)
+
+
+class WidgetGroup:
+    # The widgets of one scene
+    def __init__(self, *widgets):
+        self.widgets = list(widgets)
+
+    def enter(self, mouse_pos):
+        # The mouse may have moved while another scene had the events
+        for widget in self.widgets:
+            widget.set_hovered(widget.rect.collidepoint(mouse_pos))
+
+    def handle(self, event, now):
+        for widget in self.widgets:
+            if widget.handle(event, now):
+                return True
+        return False
+
+    def surfaces(self):
+        return set().union(*(widget.surfaces() for widget in self.widgets))
+
+    def draw(self, renderer, now, alpha=None):
+        for widget in self.widgets:
+            widget.draw(renderer, now, alpha)